@@ -0,0 +1,53 @@
+"""Compare the HTML text engines in extract_menu_items on the saved fixture pages.
+
+    python bench/bench_html_engines.py            # BENCH_REPEAT=20 by default
+
+Reports per page and engine: best-of-N parse time, peak Python memory
+(tracemalloc), candidate lines produced, items emitted and distinct
+(name, price) pairs among them.
+"""
+import os, sys, glob, time, tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "scripts"))
+import extract_menu_items as emi  # noqa: E402
+
+emi.STRUCTURED = False   # compare the line-scan engines, not the JSON-LD/microdata fast path
+
+FIXTURES = os.path.join(HERE, "fixtures")
+REPEAT = int(os.environ.get("BENCH_REPEAT", "20"))
+
+def measure(engine, html):
+    best = float("inf")
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        items = list(emi.yield_items_from_html(html, "fixture", engine=engine))
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    list(emi.yield_items_from_html(html, "fixture", engine=engine))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    lines = sum(1 for _ in emi.HTML_ENGINES[engine](html))
+    uniq = len({(it["item_name"], it["price"]) for it in items})
+    return best, peak, lines, len(items), uniq
+
+def main():
+    paths = sorted(glob.glob(os.path.join(FIXTURES, "*.html")))
+    print(f"{'page':<24}{'engine':<8}{'ms':>9}{'peak KB':>10}{'lines':>8}{'items':>8}{'uniq':>7}")
+    totals = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        for engine in emi.HTML_ENGINES:
+            best, peak, lines, items, uniq = measure(engine, html)
+            t = totals.setdefault(engine, [0.0, 0, 0, 0])
+            t[0] += best; t[1] = max(t[1], peak); t[2] += items; t[3] += uniq
+            print(f"{os.path.basename(path):<24}{engine:<8}{best*1000:>9.2f}{peak/1024:>10.0f}"
+                  f"{lines:>8}{items:>8}{uniq:>7}")
+    print()
+    for engine, (secs, peak, items, uniq) in totals.items():
+        print(f"{engine:<8} total {secs*1000:.2f} ms | max peak {peak/1024:.0f} KB | "
+              f"{items} items ({uniq} distinct)")
+
+if __name__ == "__main__":
+    main()
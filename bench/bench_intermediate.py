@@ -0,0 +1,76 @@
+"""Size and read speed of the menu_items snapshot as JSONL vs Parquet (columnar).
+
+    python bench/bench_intermediate.py               # BENCH_ITEMS=500000 by default
+    python bench/bench_intermediate.py data/menu_items.jsonl
+
+Items are synthetic (about 30 per menu URL, like real menus) unless a JSONL
+snapshot is given. Both formats are written through columnar.Writer into a
+temp dir; reads go through columnar.rows()/batches() the way the upsert
+scripts use them: all columns upsert_menu_items needs, and a two-column
+projection like upsert_price_bucket_by_host. Needs pyarrow.
+"""
+import os, sys, time, random, tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "scripts"))
+import columnar  # noqa: E402
+import upsert_menu_items  # noqa: E402
+from make_pdf_fixtures import DISHES  # noqa: E402
+
+N = int(os.environ.get("BENCH_ITEMS", "500000"))
+
+def synthetic(n):
+    rnd = random.Random(5)
+    adj = ["Classic", "Spicy", "House", "Grilled", "Crispy", "Smoked", "Garden", "Chef's"]
+    url = None
+    for i in range(n):
+        if i % 30 == 0:
+            url = f"https://www.restaurant-{rnd.randrange(10 ** 6)}.com/{rnd.choice(['menu', 'our-menu', 'food'])}"
+        kcal = rnd.choice([None, None, None, rnd.randint(150, 1400)])
+        yield {"item_name": f"{rnd.choice(adj)} {rnd.choice(DISHES)}", "item_desc": None,
+               "price": round(rnd.uniform(4, 45) * 4) / 4, "calories_kcal": kcal,
+               "calories_text": f"{kcal} cal" if kcal else None, "source_url": url}
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+def drain(it):
+    n = 0
+    for _ in it:
+        n += 1
+    return n
+
+def main():
+    if len(sys.argv) > 1:
+        items = list(columnar.rows(sys.argv[1], list(columnar.ITEMS)))
+    else:
+        items = list(synthetic(N))
+    tmp = tempfile.mkdtemp(prefix="fareware-columnar-")
+    results = {}
+    for fmt in ("jsonl", "parquet"):
+        path = os.path.join(tmp, fmt, "menu_items.jsonl")
+        os.makedirs(os.path.dirname(path))
+        def write():
+            with columnar.Writer(path, columnar.ITEMS, fmt=fmt) as w:
+                for it in items:
+                    w.write(it)
+        w_secs, _ = timed(write)
+        src = columnar.source(path)
+        r_secs, n = timed(lambda: drain(columnar.rows(path, upsert_menu_items.COLUMNS)))
+        p_secs, _ = timed(lambda: sum(len(c["source_url"]) for c in columnar.batches(path, ["source_url", "price"])))
+        results[fmt] = {"bytes": os.path.getsize(src), "write_s": w_secs, "read_s": r_secs, "proj_s": p_secs, "rows": n}
+
+    print(f"{len(items)} items ({'from ' + sys.argv[1] if len(sys.argv) > 1 else 'synthetic'}), "
+          f"row group {columnar.ROW_GROUP}:")
+    print(f"  {'':<8}{'MB':>9}{'write s':>10}{'read rows/s':>14}{'2-col rows/s':>15}")
+    for fmt, r in results.items():
+        print(f"  {fmt:<8}{r['bytes'] / 2 ** 20:>9.1f}{r['write_s']:>10.2f}"
+              f"{r['rows'] / r['read_s']:>14,.0f}{r['rows'] / r['proj_s']:>15,.0f}")
+    j, p = results["jsonl"], results["parquet"]
+    print(f"parquet: {j['bytes'] / p['bytes']:.1f}x smaller, rows read {j['read_s'] / p['read_s']:.1f}x faster, "
+          f"2-column projection {j['proj_s'] / p['proj_s']:.1f}x faster")
+
+if __name__ == "__main__":
+    main()
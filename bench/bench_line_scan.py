@@ -0,0 +1,94 @@
+"""Micro-benchmark for the per-line price/calorie scan (line_scan) vs the old
+findall/split/search/sub sequence it replaced.
+
+    python bench/bench_line_scan.py            # BENCH_REPEAT=50 by default
+
+Lines come from the HTML fixtures (blocks engine) plus synthetic menu lines;
+the run also checks both paths produce identical item rows.
+"""
+import os, re, sys, glob, time, random
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "scripts"))
+import line_scan  # noqa: E402
+import extract_menu_items as emi  # noqa: E402
+
+REPEAT = int(os.environ.get("BENCH_REPEAT", "50"))
+
+LEGACY_PRICE_RX = re.compile(r"\$\s*\d{1,3}(?:\.\d{1,2})?|\b\d{1,3}\.\d{2}\b")
+LEGACY_CAL_RX = re.compile(r'\b(cal(?:ories)?|kcal)\b[:\s]*([0-9]{2,4})', re.I)
+
+def legacy_norm_name(s):
+    if not s: return s
+    s = s.strip()
+    s = re.sub(r'\s*[-–—•·]+\s*', ' ', s)
+    s = re.sub(r'\s+', ' ', s)
+    return s[:160]
+
+def legacy_items(lines, url):
+    for t in lines:
+        prices = LEGACY_PRICE_RX.findall(t)
+        if not prices:
+            continue
+        name = legacy_norm_name(LEGACY_PRICE_RX.split(t, maxsplit=1)[0].strip(":-•–— "))
+        try:
+            p = float(prices[0].replace("$", ""))
+        except Exception:
+            continue
+        kcal = None; kcal_txt = None
+        m = LEGACY_CAL_RX.search(t)
+        if m:
+            kcal = int(m.group(2)); kcal_txt = m.group(0)
+        if name and p:
+            yield {"item_name": name, "item_desc": None, "price": p,
+                   "calories_kcal": kcal, "calories_text": kcal_txt, "source_url": url}
+
+def corpus():
+    lines = []
+    for path in sorted(glob.glob(os.path.join(HERE, "fixtures", "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            lines.extend(emi.html_texts_blocks(f.read()))
+    rnd = random.Random(3)
+    words = ["Grilled", "Chicken", "Salad", "Spicy", "Tuna", "Roll", "House", "Burger", "Soup", "of", "the", "Day"]
+    for _ in range(2000):
+        name = " ".join(rnd.choice(words) for _ in range(rnd.randint(1, 5)))
+        kind = rnd.random()
+        if kind < 0.4:
+            lines.append(f"{name} — ${rnd.randint(3, 40)}.{rnd.choice(['00', '50', '99'])}")
+        elif kind < 0.6:
+            lines.append(f"{name} {rnd.randint(3, 40)}.95 | {rnd.randint(120, 1500)} cal")
+        elif kind < 0.7:
+            lines.append(f"• {name} · Calories: {rnd.randint(90, 999)} · $ {rnd.randint(3, 40)}")
+        else:
+            lines.append(f"{name} with seasonal sides and house dressing")   # no price
+    return lines
+
+def timeit(fn, lines):
+    best = float("inf")
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        for _row in fn(lines, "bench"):
+            pass
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    lines = corpus()
+    # legacy left a trailing space when a name ended in "·"; that is the only intended difference
+    old = [dict(r, item_name=r["item_name"].strip()) for r in legacy_items(lines, "bench")]
+    new = list(line_scan.items_from_lines(lines, "bench"))
+    mismatches = sum(1 for a, b in zip(old, new) if a != b) + abs(len(old) - len(new))
+    t_old = timeit(legacy_items, lines)
+    t_new = timeit(line_scan.items_from_lines, lines)
+    n = len(lines)
+    print(f"{n} lines, {len(new)} items | mismatched rows vs legacy: {mismatches}")
+    print(f"legacy     {t_old*1e9/n:8.0f} ns/line")
+    print(f"line_scan  {t_new*1e9/n:8.0f} ns/line   ({t_old/t_new:.2f}x)")
+    if mismatches:
+        for a, b in zip(old, new):
+            if a != b:
+                print("  legacy:", a, "\n  new:   ", b)
+                break
+
+if __name__ == "__main__":
+    main()
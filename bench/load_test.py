@@ -0,0 +1,169 @@
+"""End-to-end load test of probe/discover → extract → upsert against local stand-ins.
+
+    python bench/load_test.py --sites 2000
+    python bench/load_test.py --sites 100000 --latency-ms 80 --workdir /tmp/lt
+
+Starts bench/origin_farm.py and bench/mock_postgrest.py (--lean) as
+subprocesses, then runs scripts/guess_menu_urls.py, discover_menu_urls.py,
+extract_menu_items.py and upsert_menu_items.py in a scratch working directory (its data/ is the run's
+state, cache and metrics) with SUPABASE_URL pointed at the mock. Nothing
+touches the network beyond loopback.
+
+A repeated run in the same --workdir reuses the ports recorded in its
+load_test.json (or --farm-port/--pg-port), so site URLs stay the same and the
+run exercises incremental extraction: unchanged pages and lastmod skips. The
+mock starts empty every time, so pass UPSERT_FULL=1 to land the whole snapshot
+rather than just this run's delta.
+
+Reported per stage: wall time and the counters from data/metrics.jsonl. Also
+menus found vs. menus the farm actually serves (from origin_farm.site_profile),
+rows landed in menu_items_v2 and the farm's request counters. The summary is
+written to <workdir>/load_test.json. Pipeline knobs (PROBE_CONCURRENCY,
+FETCH_WORKERS, UPSERT_IN_FLIGHT, ...) are read from the environment as usual
+and passed through.
+
+At 100k sites raise the open-file limit (ulimit -n) above PROBE_CONCURRENCY
+plus the farm's connections.
+"""
+import os, sys, json, time, socket, argparse, tempfile, subprocess
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = os.path.join(HERE, "..", "scripts")
+STAGES = ["guess_menu_urls", "discover_menu_urls", "extract_menu_items", "upsert_menu_items"]
+
+def free_port(port=0):
+    """`port` if it can be bound on loopback (0: any free one), else None."""
+    with socket.socket() as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)   # as the servers do: TIME_WAIT is no conflict
+        try:
+            s.bind(("127.0.0.1", port))
+        except OSError:
+            return None
+        return s.getsockname()[1]
+
+def last_ports(work):
+    """(farm, postgrest) ports of the previous run in this workdir, or (None, None)."""
+    try:
+        with open(os.path.join(work, "load_test.json")) as f:
+            ports = json.load(f).get("ports", {})
+    except (OSError, ValueError):
+        return None, None
+    return ports.get("farm"), ports.get("postgrest")
+
+def wait_ready(url, proc, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"{url}: server exited with {proc.returncode}")
+        try:
+            requests.get(url, headers={"apikey": "x"}, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    sys.exit(f"{url}: not ready after {timeout}s")
+
+def truth(n, farm_env):
+    """Sites by kind for the seeded restaurants (1 in 10 has no website), and ok sites with a sitemap."""
+    os.environ.update(farm_env)   # site_profile reads the same knobs as the farm
+    sys.path.insert(0, HERE)
+    from origin_farm import site_profile
+    kinds, in_sitemap = {}, 0
+    for i in range(n):
+        if i % 10:
+            p = site_profile(i)
+            kinds[p["kind"]] = kinds.get(p["kind"], 0) + 1
+            in_sitemap += p["kind"] == "ok" and bool(p["sitemap"])
+    return kinds, in_sitemap
+
+def last_metrics(path, script):
+    try:
+        with open(path) as f:
+            recs = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return {}
+    recs = [r for r in recs if r.get("script") == script]
+    return recs[-1] if recs else {}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--sites", type=int, default=1000, help="restaurants to seed (9 in 10 get a website)")
+    ap.add_argument("--workdir", help="scratch directory (default: a new temp dir)")
+    ap.add_argument("--latency-ms", type=float, default=50, help="mean origin latency")
+    ap.add_argument("--error-rate", type=float, default=0.01, help="origin 503 rate")
+    ap.add_argument("--dead-rate", type=float, default=0.03, help="share of tarpitted sites")
+    ap.add_argument("--tarpit-s", type=float, default=30, help="how long a dead site holds a request")
+    ap.add_argument("--pg-latency-ms", type=float, default=0, help="mock PostgREST latency")
+    ap.add_argument("--pg-error-rate", type=float, default=0, help="mock PostgREST 503 rate")
+    ap.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset to run")
+    ap.add_argument("--farm-port", type=int, help="origin farm port (default: the workdir's last one if free)")
+    ap.add_argument("--pg-port", type=int, help="mock PostgREST port (default: the workdir's last one if free)")
+    args = ap.parse_args()
+
+    work = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="fareware-load-"))
+    os.makedirs(os.path.join(work, "data"), exist_ok=True)
+    # site URLs carry the farm port: keeping it lets a repeated run re-check the same candidate URLs
+    # (unchanged pages, lastmod skips) instead of replacing every page in the workdir's state
+    last_farm, last_pg = last_ports(work)
+    farm_port = args.farm_port or (last_farm and free_port(last_farm)) or free_port()
+    pg_port = args.pg_port or (last_pg and free_port(last_pg)) or free_port()
+    if last_farm and farm_port != last_farm:
+        print(f"farm port {last_farm} of the last run is taken: every candidate URL changes this run")
+    farm_env = {"FARM_LATENCY_MS": str(args.latency_ms), "FARM_ERROR_RATE": str(args.error_rate),
+                "FARM_DEAD_RATE": str(args.dead_rate), "FARM_TARPIT_S": str(args.tarpit_s)}
+    env = dict(os.environ, **farm_env, MOCK_LATENCY_MS=str(args.pg_latency_ms), MOCK_ERROR_RATE=str(args.pg_error_rate),
+               SUPABASE_URL=f"http://127.0.0.1:{pg_port}", SUPABASE_SERVICE_ROLE_KEY="load-test",
+               NO_PROXY="127.0.0.0/8,localhost", METRICS_FILE=os.path.join(work, "data", "metrics.jsonl"))
+    env.pop("HTTP_PROXY", None); env.pop("http_proxy", None)
+
+    servers = [
+        subprocess.Popen([sys.executable, os.path.join(HERE, "origin_farm.py"), "--port", str(farm_port)], env=env),
+        subprocess.Popen([sys.executable, os.path.join(HERE, "mock_postgrest.py"), "--port", str(pg_port), "--lean",
+                          "--restaurants", str(args.sites), "--farm-port", str(farm_port)], env=env),
+    ]
+    summary = {"sites": args.sites, "workdir": work, "knobs": vars(args), "stages": {},
+               "ports": {"farm": farm_port, "postgrest": pg_port}}
+    try:
+        wait_ready(f"http://127.1.0.1:{farm_port}/_farm/stats", servers[0])
+        wait_ready(f"http://127.0.0.1:{pg_port}/rest/v1/restaurants?limit=1", servers[1])
+        print(f"farm :{farm_port}  postgrest :{pg_port}  workdir {work}")
+        for stage in args.stages.split(","):
+            t0 = time.time()
+            rc = subprocess.call([sys.executable, os.path.join(SCRIPTS, stage + ".py")], cwd=work, env=env)
+            wall = time.time() - t0
+            rec = last_metrics(env["METRICS_FILE"], stage)
+            summary["stages"][stage] = {"rc": rc, "wall_s": round(wall, 2), "peak_rss_mb": rec.get("peak_rss_mb"),
+                                        "counters": rec.get("counters", {})}
+            print(f"── {stage}: rc={rc} in {wall:.1f}s")
+            if rc:
+                break
+        r = requests.get(f"http://127.0.0.1:{pg_port}/rest/v1/menu_items_v2", timeout=30,
+                         params={"select": "id", "limit": "1"}, headers={"apikey": "x", "Prefer": "count=exact"})
+        summary["menu_items_v2_rows"] = int(r.headers["Content-Range"].rsplit("/", 1)[1])
+        summary["farm"] = requests.get(f"http://127.1.0.1:{farm_port}/_farm/stats", timeout=10).json()
+    finally:
+        for p in servers:
+            p.terminate()
+        for p in servers:
+            p.wait()
+
+    kinds, in_sitemap = truth(args.sites, farm_env)
+    probe = summary["stages"].get("guess_menu_urls", {}).get("counters", {})
+    found = sum(v for k, v in probe.items() if k.startswith("menus_found"))
+    discovered = summary["stages"].get("discover_menu_urls", {}).get("counters", {}).get("candidates", 0)
+    summary["truth"] = {"sites_by_kind": kinds, "menus_served": kinds.get("ok", 0), "menus_found": found,
+                        "menus_in_sitemaps": in_sitemap, "sitemap_candidates": discovered}
+    with open(os.path.join(work, "load_test.json"), "w") as f:
+        json.dump(summary, f, indent=1, sort_keys=True)
+
+    print(f"\n{args.sites} restaurants, {sum(kinds.values())} sites {kinds}")
+    for stage, s in summary["stages"].items():
+        print(f"  {stage:<22}{s['wall_s']:>9.1f} s  rss {s['peak_rss_mb']} MB")
+    print(f"  menus found {found} of {kinds.get('ok', 0)} served (MAX_HITS per site may exceed 1)")
+    print(f"  sitemap candidates {discovered} ({in_sitemap} served menus are in a sitemap; mirrors count twice)")
+    print(f"  menu_items_v2 rows {summary['menu_items_v2_rows']}")
+    print(f"  farm: {summary['farm']}")
+    print(f"summary → {os.path.join(work, 'load_test.json')}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Regenerate the PDF fixtures and their labels in fixtures/expected.json.
+
+    python bench/make_pdf_fixtures.py
+
+The PDFs are written by hand (Helvetica text objects placed with Tm), so no PDF
+library is needed. two_column_menu.pdf puts names and right-aligned prices in
+separate text objects across two columns, the layout that whole-document
+extract_text splits apart; the phone number and year on each page are noise.
+Labels for the HTML fixtures are maintained by hand; only PDF entries are
+rewritten here.
+"""
+import os, json, random
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, "fixtures")
+
+DISHES = [
+    "Caesar Salad", "Fish Tacos", "House Burger", "Pad Thai", "Tomato Soup", "Veggie Wrap",
+    "Chicken Wings", "Lamb Kofta", "Crab Cakes", "Beet Salad", "Pork Belly Bao", "Mushroom Toast",
+    "Short Rib", "Salmon Bowl", "Duck Confit", "Shrimp Grits", "Eggplant Parm", "Steak Frites",
+]
+
+def pdf_bytes(pages):
+    """pages: list of [(x, y, text)] in points on a US-letter page."""
+    objs = []
+    def add(body):
+        objs.append(body)
+        return len(objs)
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    contents = []
+    for texts in pages:
+        ops = " ".join(f"1 0 0 1 {x} {y} Tm ({t}) Tj" for x, y, t in texts)
+        stream = f"BT /F1 11 Tf {ops} ET".encode("latin-1")
+        contents.append(add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)))
+    parent = len(objs) + len(pages) + 1
+    kids = [add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (parent, c, font)) for c in contents]
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids)))
+    root = add(b"<< /Type /Catalog /Pages %d 0 R >>" % parent)
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, root, xref)
+    return bytes(out)
+
+def write_pdf(pages, path):
+    with open(path, "wb") as f:
+        f.write(pdf_bytes(pages))
+
+def two_column_menu():
+    rng = random.Random(7)
+    pages, labels = [], []
+    for page in range(3):
+        texts, y = [(50, 740, f"Lunch Menu - page {page + 1}")], 700
+        for i in range(0, len(DISHES), 2):
+            for x, name in ((50, DISHES[i]), (320, DISHES[i + 1])):
+                name = f"{name} {page + 1}" if page else name
+                price = rng.choice([6, 8.5, 9.75, 11, 12.5, 14, 16.25, 18, 22])
+                texts += [(x, y, name), (x + 200, y, f"{price:.2f}")]
+                labels.append([name, float(price)])
+            y -= 36
+        texts += [(50, 60, "Call 773.555.0142 to order"), (400, 60, "Since 2011")]
+        pages.append(texts)
+    return pages, labels
+
+def write_expected(expected, path):
+    """One labeled [name, price] per line so diffs stay readable."""
+    with open(path, "w") as f:
+        f.write("{\n")
+        for i, (name, items) in enumerate(sorted(expected.items())):
+            body = ",\n".join("  " + json.dumps(it) for it in items)
+            f.write(f" {json.dumps(name)}: [\n{body}\n ]{',' if i < len(expected) - 1 else ''}\n")
+        f.write("}\n")
+
+def main():
+    path = os.path.join(FIXTURES, "expected.json")
+    with open(path) as f:
+        expected = json.load(f)
+    pages, labels = two_column_menu()
+    write_pdf(pages, os.path.join(FIXTURES, "two_column_menu.pdf"))
+    expected["two_column_menu.pdf"] = labels
+    write_expected(expected, path)
+    print(f"wrote two_column_menu.pdf ({len(labels)} labeled items)")
+
+if __name__ == "__main__":
+    main()
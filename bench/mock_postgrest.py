@@ -0,0 +1,338 @@
+"""In-memory stand-in for the Supabase PostgREST endpoints the pipeline uses.
+
+    python bench/mock_postgrest.py --port 54321 --restaurants 1000 --farm-port 8900
+
+Point the scripts at it with SUPABASE_URL=http://127.0.0.1:54321 and any
+SUPABASE_SERVICE_ROLE_KEY. Implemented for /rest/v1/<table>:
+
+  GET     select=, column filters (eq neq gt gte lt lte in is like, not. prefix),
+          order= (several keys, nullsfirst/nullslast), limit/offset, Range
+          header; Content-Range with an exact total under Prefer: count=exact
+  POST    JSON object or array. With Prefer: resolution=merge-duplicates the
+          rows are upserted on the on_conflict columns (default: primary key);
+          without it a duplicate key is a 409. A batch that hits the same key
+          twice fails as a whole like Postgres does (ON CONFLICT cannot affect
+          a row twice). Prefer: return=representation|minimal
+  PATCH   filters required; updates matching rows
+  DELETE  filters required
+
+Writes are validated and applied atomically per request. Tables are
+schemaless except for `id` (serial), their unique keys and NOT NULL columns
+(see TABLES). --lean keeps only ids and key columns of menu_items_v2, which is
+enough for load tests at 100k-site scale. MOCK_LATENCY_MS and MOCK_ERROR_RATE
+add per-request delay and random 503s. Seeded restaurants point at the
+origin farm (origin_farm.site_url).
+"""
+import os, re, random, asyncio, argparse, bisect
+from aiohttp import web
+
+LATENCY = float(os.environ.get("MOCK_LATENCY_MS", "0")) / 1000
+ERROR_RATE = float(os.environ.get("MOCK_ERROR_RATE", "0"))
+
+TABLES = {
+    # name: (unique keys besides id, NOT NULL columns)
+    "restaurants": ((("name_norm", "lat_round", "lon_round"),), ()),
+    "menu_items_v2": ((("restaurant_id", "item_name", "price", "source_url"),), ("restaurant_id", "item_name")),
+}
+RESERVED = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+class PgError(Exception):
+    def __init__(self, status, code, message):
+        super().__init__(message)
+        self.status, self.code, self.message = status, code, message
+
+class Table:
+    def __init__(self, name, unique=(), required=(), lean=False):
+        self.name = name
+        self.rows = {}       # id -> row
+        self.ids = []        # ascending ids for keyset scans (lazily pruned of deleted ids)
+        self.next_id = 1
+        self.unique = {cols: {} for cols in unique}
+        self.required = required
+        self.lean = lean
+        self.keep = {"id", *(c for cols in unique for c in cols)}
+
+    def key_index(self, cols):
+        if cols == ("id",):
+            return None
+        if cols not in self.unique:
+            raise PgError(400, "42P10", f"there is no unique or exclusion constraint matching the ON CONFLICT specification ({','.join(cols)})")
+        return self.unique[cols]
+
+    def find(self, cols, row):
+        if cols == ("id",):
+            rid = row.get("id")
+            return rid if rid in self.rows else None
+        return self.unique[cols].get(tuple(row.get(c) for c in cols))
+
+    def _index(self, rid, row, add=True):
+        for cols, idx in self.unique.items():
+            k = tuple(row.get(c) for c in cols)
+            if None in k: continue
+            if add: idx[k] = rid
+            elif idx.get(k) == rid: del idx[k]
+
+    def _store(self, row):
+        return {k: v for k, v in row.items() if k in self.keep} if self.lean else row
+
+    def write(self, rows, on_conflict, merge):
+        """Validate a whole batch, then apply it; returns the written rows."""
+        cols = tuple(on_conflict) if on_conflict else ("id",)
+        self.key_index(cols)
+        seen = set()
+        for r in rows:
+            if isinstance(r.get("id"), str) and r["id"].isdigit():
+                r["id"] = int(r["id"])   # PostgREST casts to the column type
+            for c in self.required:
+                if r.get(c) is None:
+                    raise PgError(400, "23502", f'null value in column "{c}" of relation "{self.name}" violates not-null constraint')
+            if "price" in r and r["price"] is not None and not isinstance(r["price"], (int, float)):
+                raise PgError(400, "22P02", f'invalid input syntax for type numeric: "{r["price"]}"')
+            k = tuple(r.get(c) for c in cols)
+            if None not in k:
+                if k in seen:
+                    raise PgError(500, "21000", "ON CONFLICT DO UPDATE command cannot affect row a second time")
+                seen.add(k)
+            if not merge and None not in k and self.find(cols, r) is not None:
+                raise PgError(409, "23505", f'duplicate key value violates unique constraint "{self.name}_{"_".join(cols)}_key"')
+        out = []
+        for r in rows:
+            rid = self.find(cols, r) if None not in tuple(r.get(c) for c in cols) else None
+            if rid is not None:
+                old = self.rows[rid]
+                self._index(rid, old, add=False)
+                new = {**old, **self._store(r), "id": rid}
+            else:
+                rid = r.get("id") or self.next_id
+                self.next_id = max(self.next_id, rid + 1)
+                new = {**self._store(r), "id": rid}
+                if self.ids and rid < self.ids[-1]: bisect.insort(self.ids, rid)
+                else: self.ids.append(rid)
+            self.rows[rid] = new
+            self._index(rid, new)
+            out.append(new)
+        return out
+
+    def update(self, rows, body):
+        for r in rows:
+            self._index(r["id"], r, add=False)
+            r.update(self._store(body))
+            self._index(r["id"], r)
+        return rows
+
+    def delete(self, rows):
+        for r in rows:
+            self._index(r["id"], r, add=False)
+            del self.rows[r["id"]]
+        return rows
+
+# --- query parsing ---
+
+def coerce(arg, sample):
+    if isinstance(sample, bool):
+        return arg == "true"
+    if isinstance(sample, (int, float)):
+        try: return float(arg)
+        except ValueError: return arg
+    return arg
+
+IN_ITEM_RX = re.compile(r'\s*(?:"((?:[^"\\]|\\.)*)"|([^,]*?))\s*(?:,|$)')
+
+def in_values(arg):
+    """Values of an `in.(…)` list; double-quoted values may hold commas and parens, with \\ escapes."""
+    inner = arg[1:-1] if arg.startswith("(") and arg.endswith(")") else arg
+    out = []
+    for m in IN_ITEM_RX.finditer(inner):
+        if m.group(1) is not None:
+            out.append(re.sub(r"\\(.)", r"\1", m.group(1)))
+        elif m.group(2):
+            out.append(m.group(2))
+        if m.end() == len(inner):
+            break
+    return out
+
+def compile_filter(col, expr):
+    neg = expr.startswith("not.")
+    if neg: expr = expr[4:]
+    op, _, arg = expr.partition(".")
+    if op == "is":
+        want = {"null": None, "true": True, "false": False}[arg]
+        test = lambda v: v is want if want is None else v == want
+    elif op == "in":
+        items = set(in_values(arg))
+        nums = set()
+        for a in items:
+            try: nums.add(float(a))
+            except ValueError: pass
+        test = lambda v: v is not None and (str(v) in items or (isinstance(v, (int, float)) and v in nums))
+    elif op == "like":
+        rx = re.compile("^" + re.escape(arg).replace(r"\*", ".*").replace("%", ".*") + "$")
+        test = lambda v: v is not None and bool(rx.match(str(v)))
+    elif op in ("eq", "neq", "gt", "gte", "lt", "lte"):
+        def test(v, op=op):
+            if v is None: return False
+            a = coerce(arg, v)
+            try:
+                return {"eq": v == a, "neq": v != a, "gt": v > a, "gte": v >= a, "lt": v < a, "lte": v <= a}[op]
+            except TypeError:
+                return False
+    else:
+        raise PgError(400, "PGRST100", f"unknown operator {op!r} in {col}={expr}")
+    return (lambda r: not test(r.get(col))) if neg else (lambda r: test(r.get(col)))
+
+def select_rows(table, query):
+    filters = [(c, v) for c, v in query.items() if c not in RESERVED]
+    rows = None
+    # fast paths on the primary key: keyset pages (id=gt.N) and bulk PATCH (id=in.(...))
+    for c, v in filters:
+        if c != "id": continue
+        if v.startswith("gt.") and v[3:].isdigit():
+            start = bisect.bisect_right(table.ids, int(v[3:]))
+            rows = (table.rows[i] for i in table.ids[start:] if i in table.rows)
+        elif v.startswith("in.(") and all(a.strip().isdigit() for a in v[4:-1].split(",")):
+            rows = sorted((table.rows[int(a)] for a in set(v[4:-1].split(",")) if int(a) in table.rows),
+                          key=lambda r: r["id"])
+        else:
+            continue
+        filters = [f for f in filters if f != (c, v)]
+        break
+    if rows is None:
+        rows = iter(table.rows.values())
+    preds = [compile_filter(c, v) for c, v in filters]
+    rows = [r for r in rows if all(p(r) for p in preds)]
+    order = query.get("order")
+    if order:
+        for term in reversed(order.split(",")):
+            col, *mods = term.split(".")
+            desc = "desc" in mods
+            nulls_first = "nullsfirst" in mods or (desc and "nullslast" not in mods)
+            present = sorted((r for r in rows if r.get(col) is not None), key=lambda r: r[col], reverse=desc)
+            missing = [r for r in rows if r.get(col) is None]
+            rows = missing + present if nulls_first else present + missing
+    return rows
+
+def project(rows, select):
+    if not select or select == "*":
+        return rows
+    cols = [c.strip() for c in select.split(",")]
+    return [{c: r.get(c) for c in cols} for r in rows]
+
+# --- HTTP ---
+
+def error(e):
+    return web.json_response({"code": e.code, "message": e.message, "details": None, "hint": None}, status=e.status)
+
+def prefer(request):
+    out = {}
+    for part in request.headers.get("Prefer", "").split(","):
+        k, _, v = part.strip().partition("=")
+        if k: out[k] = v
+    return out
+
+def make_app(restaurants=0, farm_port=8900, lean=False, seed=0):
+    tables = {name: Table(name, unique, required, lean=lean and name == "menu_items_v2")
+              for name, (unique, required) in TABLES.items()}
+    if restaurants:
+        from origin_farm import site_url
+        rnd = random.Random(seed)
+        tables["restaurants"].write([{
+            "name": f"Restaurant {i}", "name_norm": f"restaurant {i}",
+            "lat_round": round(rnd.uniform(25, 49), 4), "lon_round": round(rnd.uniform(-124, -67), 4),
+            "website": site_url(i, farm_port) if i % 10 else None,   # 1 in 10 without a website
+            "price_bucket": None, "status": "active",
+        } for i in range(restaurants)], None, False)
+
+    @web.middleware
+    async def faults(request, handler):
+        if "apikey" not in request.headers:
+            return web.json_response({"message": "No API key found in request"}, status=401)
+        if LATENCY:
+            await asyncio.sleep(random.expovariate(1 / LATENCY))
+        if ERROR_RATE and random.random() < ERROR_RATE:
+            return web.json_response({"message": "injected failure"}, status=503)
+        try:
+            return await handler(request)
+        except PgError as e:
+            return error(e)
+
+    def table_of(request):
+        name = request.match_info["table"]
+        if name not in tables:
+            raise PgError(404, "42P01", f'relation "public.{name}" does not exist')
+        return tables[name]
+
+    async def get(request):
+        t = table_of(request)
+        q = request.query
+        rows = select_rows(t, q)
+        total = len(rows)
+        start = int(q.get("offset", 0))
+        end = total if "limit" not in q else min(total, start + int(q["limit"]))
+        rng = request.headers.get("Range", "")
+        m = re.fullmatch(r"(\d+)-(\d*)", rng.strip())
+        if m:
+            start = start + int(m.group(1))
+            end = min(end, start + (int(m.group(2)) - int(m.group(1)) + 1 if m.group(2) else total))
+        page = project(rows[start:end], q.get("select"))
+        counted = prefer(request).get("count") == "exact"
+        span = f"{start}-{start + len(page) - 1}" if page else "*"
+        headers = {"Content-Range": f"{span}/{total if counted else '*'}"}
+        status = 206 if counted and page and len(page) < total else 200
+        return web.json_response(page, status=status, headers=headers)
+
+    async def post(request):
+        t = table_of(request)
+        try:
+            body = await request.json()
+        except ValueError:
+            raise PgError(400, "PGRST102", "Empty or invalid json")
+        rows = body if isinstance(body, list) else [body]
+        p = prefer(request)
+        conflict = request.query.get("on_conflict")
+        merge = p.get("resolution") == "merge-duplicates"
+        out = t.write(rows, conflict.split(",") if conflict else None, merge)
+        if p.get("return") == "representation":
+            return web.json_response(project(out, request.query.get("select")), status=201)
+        return web.Response(status=201)
+
+    def filtered(request, t):
+        q = {k: v for k, v in request.query.items() if k not in RESERVED}
+        if not q:
+            raise PgError(400, "21000", "UPDATE/DELETE requires a WHERE clause")
+        return select_rows(t, q)
+
+    async def patch(request):
+        t = table_of(request)
+        rows = t.update(filtered(request, t), await request.json())
+        headers = {"Content-Range": f"0-{len(rows) - 1}/*" if rows else "*/*"}
+        if prefer(request).get("return") == "representation":
+            return web.json_response(rows, headers=headers)
+        return web.Response(status=204, headers=headers)
+
+    async def delete(request):
+        t = table_of(request)
+        rows = t.delete(filtered(request, t))
+        if prefer(request).get("return") == "representation":
+            return web.json_response(rows)
+        return web.Response(status=204)
+
+    app = web.Application(middlewares=[faults], client_max_size=64 * 1024 * 1024)
+    app["tables"] = tables
+    app.router.add_get("/rest/v1/{table}", get)
+    app.router.add_post("/rest/v1/{table}", post)
+    app.router.add_patch("/rest/v1/{table}", patch)
+    app.router.add_delete("/rest/v1/{table}", delete)
+    return app
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--port", type=int, default=54321)
+    ap.add_argument("--restaurants", type=int, default=0, help="seed this many restaurants")
+    ap.add_argument("--farm-port", type=int, default=8900, help="origin farm port used in seeded websites")
+    ap.add_argument("--lean", action="store_true", help="keep only ids and key columns of menu_items_v2")
+    args = ap.parse_args()
+    web.run_app(make_app(args.restaurants, args.farm_port, args.lean), host="127.0.0.1", port=args.port,
+                access_log=None)
+
+if __name__ == "__main__":
+    main()
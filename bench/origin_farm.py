@@ -0,0 +1,227 @@
+"""Synthetic farm of restaurant websites for end-to-end load tests.
+
+    python bench/origin_farm.py --port 8900
+
+Site i lives at http://127.A.B.C:<port>/ (site_url); every address in
+127.0.0.0/8 reaches loopback on Linux, so each site is its own host to the
+prober, the circuit breaker and the per-domain gates while one process serves
+them all. The server listens on 0.0.0.0 so those addresses reach it, and
+refuses clients that are not on loopback.
+
+Each site's shape is a pure function of (FARM_SEED, i), see site_profile():
+
+  ok        homepage, a menu page (HTML in one of three layouts, or a PDF) at a
+            guessable path from guess_menu_urls.PATHS or at an unguessable one
+            reachable only through a homepage link, for some sites mirrored at
+            a second guessable path; 404 elsewhere
+            (FARM_JS_RATE of HTML menus are a script shell that loads the
+            items from <path>.json, for headless-render tests)
+  nomenu    homepage only
+  catchall  answers every path with the homepage (soft 404)
+  dead      tarpit: holds the request for FARM_TARPIT_S, then 504
+
+FARM_SITEMAP_RATE of ok/nomenu sites publish a sitemap with lastmod dates:
+either /sitemap.xml found by convention, or a robots.txt Sitemap: line to an
+index of a gzipped page sitemap and a blog sitemap. Their robots.txt disallows
+/private/, which the sitemap lists a draft menu under. Other sites 404 robots.txt.
+
+Some sites refuse HEAD with 405. Responses carry an ETag and honor
+If-None-Match. Every request waits an exponential delay with mean
+FARM_LATENCY_MS and fails with 503 at FARM_ERROR_RATE. GET /_farm/stats
+returns request counters.
+"""
+import os, gzip, json, random, asyncio, hashlib, argparse, ipaddress
+from functools import lru_cache
+from aiohttp import web
+from make_pdf_fixtures import DISHES, pdf_bytes
+
+SEED = os.environ.get("FARM_SEED", "0")
+LATENCY = float(os.environ.get("FARM_LATENCY_MS", "50")) / 1000
+ERROR_RATE = float(os.environ.get("FARM_ERROR_RATE", "0.01"))
+TARPIT_S = float(os.environ.get("FARM_TARPIT_S", "30"))
+RATES = {   # site kinds; the remainder is "ok"
+    "dead": float(os.environ.get("FARM_DEAD_RATE", "0.03")),
+    "catchall": float(os.environ.get("FARM_CATCHALL_RATE", "0.05")),
+    "nomenu": float(os.environ.get("FARM_NOMENU_RATE", "0.15")),
+}
+PDF_RATE = float(os.environ.get("FARM_PDF_RATE", "0.2"))
+LINK_RATE = float(os.environ.get("FARM_LINK_RATE", "0.6"))
+HEAD405_RATE = float(os.environ.get("FARM_HEAD405_RATE", "0.05"))
+MIRROR_RATE = float(os.environ.get("FARM_MIRROR_RATE", "0.3"))
+JS_RATE = float(os.environ.get("FARM_JS_RATE", "0.1"))
+SITEMAP_RATE = float(os.environ.get("FARM_SITEMAP_RATE", "0.6"))
+
+GUESSABLE = ["/menu", "/menus", "/our-menu", "/food", "/dinner", "/lunch", "/brunch"]
+HIDDEN = ["/eat/menu-2024", "/s/our-food-and-drink", "/pages/carta", "/menu-1"]
+ADJ = ["Classic", "Spicy", "House", "Grilled", "Crispy", "Smoked", "Garden", "Chef's", "Braised", "Roasted"]
+
+def site_url(i, port):
+    a, rest = divmod(i, 254 * 256)
+    b, c = divmod(rest, 254)
+    return f"http://127.{a + 1}.{b}.{c + 1}:{port}"
+
+def site_index(host):
+    ip = ipaddress.ip_address(host.split(":")[0])
+    _, a, b, c = ip.packed
+    return (a - 1) * 254 * 256 + b * 254 + (c - 1)
+
+@lru_cache(maxsize=1 << 16)
+def site_profile(i):
+    rnd = random.Random(f"{SEED}:{i}")
+    x, kind = rnd.random(), "ok"
+    for k, rate in RATES.items():
+        if x < rate:
+            kind = k
+            break
+        x -= rate
+    linked = rnd.random() < LINK_RATE
+    pdf = rnd.random() < PDF_RATE
+    path = rnd.choice(HIDDEN if linked and rnd.random() < 0.5 else GUESSABLE)
+    if pdf: path = "/pdfs/menu.pdf" if not linked else path + ".pdf"
+    items = [(f"{rnd.choice(ADJ)} {rnd.choice(DISHES)}", round(rnd.uniform(4, 45) * 4) / 4)
+             for _ in range(rnd.randint(8, 60))]
+    p = {"kind": kind, "menu_path": path, "linked": linked, "pdf": pdf,
+         "head_405": rnd.random() < HEAD405_RATE, "layout": rnd.randrange(3),
+         "items": list(dict(items).items())}   # names unique within a site
+    # the same menu also served at a second guessable path
+    p["mirror"] = rnd.choice([g for g in GUESSABLE if g != path]) if rnd.random() < MIRROR_RATE else None
+    p["js"] = not pdf and rnd.random() < JS_RATE   # HTML shell; items arrive from <menu_path>.json
+    p["sitemap"] = (rnd.choice(["plain", "index"]) if rnd.random() < SITEMAP_RATE else None)
+    p["lastmod"] = f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"
+    return p
+
+def homepage(i, p):
+    links = ['<a href="/about">About</a>', '<a href="/contact">Contact</a>']
+    if p["kind"] in ("ok", "catchall") and p["linked"]:
+        links.insert(0, f'<a href="{p["menu_path"]}">{"Menu (PDF)" if p["pdf"] else "Our Menu"}</a>')
+    return (f"<!DOCTYPE html><html><head><title>Restaurant {i}</title></head><body>"
+            f"<nav>{' '.join(links)}</nav><h1>Welcome to Restaurant {i}</h1>"
+            f"<p>Open daily 11.00 - 22.00. Call 555.0{i % 1000:03d}.</p></body></html>")
+
+JS_SHELL = ("<!DOCTYPE html><html><head><title>Menu</title></head><body><h1>Menu</h1><ul id=\"menu\">"
+            "<li>Loading…</li></ul><script>fetch(location.pathname + '.json').then(r => r.json()).then(items => "
+            "{document.getElementById('menu').innerHTML = items.map(([n, p]) => "
+            "`<li><strong>${n}</strong> — $${p.toFixed(2)}</li>`).join('')})</script></body></html>")
+
+def menu_html(i, p):
+    if p["js"]:
+        return JS_SHELL
+    rows = []
+    for name, price in p["items"]:
+        if p["layout"] == 0:
+            rows.append(f"<li><strong>{name}</strong> — ${price:.2f}</li>")
+        elif p["layout"] == 1:
+            rows.append(f'<tr><td class="name">{name}</td><td class="price">{price:.2f}</td></tr>')
+        else:
+            rows.append(f'<div class="menu-item"><div class="menu-item-title">{name}</div>'
+                        f'<div class="menu-item-price"><span>$</span>{price:.2f}</div></div>')
+    body = "".join(rows)
+    wrap = {0: f"<ul>{body}</ul>", 1: f"<table>{body}</table>", 2: f'<div class="menu">{body}</div>'}[p["layout"]]
+    return f"<!DOCTYPE html><html><head><title>Menu</title></head><body><h1>Menu</h1>{wrap}</body></html>"
+
+@lru_cache(maxsize=2048)
+def menu_pdf(i):
+    p = site_profile(i)
+    pages, y, texts = [], 700, [(50, 740, f"Restaurant {i}")]
+    for n, (name, price) in enumerate(p["items"]):
+        x = 50 if n % 2 == 0 else 320
+        texts += [(x, y, name), (x + 200, y, f"{price:.2f}")]
+        if n % 2: y -= 30
+        if y < 80:
+            pages.append(texts)
+            texts, y = [], 700
+    pages.append(texts)
+    return pdf_bytes(pages)
+
+def urlset(base, entries):
+    urls = "".join(f"<url><loc>{base}{path}</loc><lastmod>{lastmod}</lastmod></url>" for path, lastmod in entries)
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>').encode()
+
+def sitemap_for(p, path, base):
+    """(content-type, body) of a robots.txt or sitemap path, or None."""
+    if path == "/robots.txt":
+        index = f"Sitemap: {base}/sitemap_index.xml\n" if p["sitemap"] == "index" else ""
+        return "text/plain", f"User-agent: *\nDisallow: /private/\n{index}".encode()
+    pages = [("/", p["lastmod"]), ("/about", "2024-03-01"), ("/contact", "2024-03-01")]
+    if p["kind"] == "ok":
+        pages += [(p["menu_path"], p["lastmod"]), ("/private/menu-draft", p["lastmod"])]
+        if p["mirror"]: pages.append((p["mirror"], p["lastmod"]))
+    posts = [(f"/blog/{n}-new-dinner-specials", "2025-06-01") for n in range(3)]
+    if p["sitemap"] == "plain" and path == "/sitemap.xml":
+        return "application/xml", urlset(base, pages + posts)
+    if p["sitemap"] == "index" and path == "/sitemap_index.xml":
+        maps = "".join(f"<sitemap><loc>{base}{m}</loc><lastmod>{p['lastmod']}</lastmod></sitemap>"
+                       for m in ("/sitemap-posts.xml", "/sitemap-pages.xml.gz"))
+        return "application/xml", ('<?xml version="1.0" encoding="UTF-8"?><sitemapindex '
+                                   f'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{maps}</sitemapindex>').encode()
+    if p["sitemap"] == "index" and path == "/sitemap-pages.xml.gz":
+        return "application/gzip", gzip.compress(urlset(base, pages), mtime=0)
+    if p["sitemap"] == "index" and path == "/sitemap-posts.xml":
+        return "application/xml", urlset(base, posts)
+    return None
+
+def page_for(i, path, base=""):
+    """(status, content-type, body) for a path on site i."""
+    p = site_profile(i)
+    if p["kind"] == "catchall" or path in ("/", "/about", "/contact"):
+        return 200, "text/html", homepage(i, p).encode()
+    if p["sitemap"] and p["kind"] in ("ok", "nomenu"):
+        found = sitemap_for(p, path, base)
+        if found:
+            return (200, *found)
+    if p["kind"] == "ok" and p["js"] and path in (p["menu_path"] + ".json", f'{p["mirror"]}.json'):
+        return 200, "application/json", json.dumps(p["items"]).encode()
+    if p["kind"] == "ok" and path in (p["menu_path"], p["mirror"]):
+        if p["pdf"]:
+            return 200, "application/pdf", menu_pdf(i)
+        return 200, "text/html", menu_html(i, p).encode()
+    return 404, "text/html", b"<h1>Not found</h1>"
+
+def make_app():
+    stats = {"requests": 0, "bytes": 0, "by_status": {}, "tarpitted": 0, "injected_errors": 0}
+
+    async def handle(request):
+        if not (request.remote or "").startswith("127."):
+            return web.Response(status=403)
+        if request.path == "/_farm/stats":
+            return web.json_response(stats)
+        stats["requests"] += 1
+        try:
+            i = site_index(request.host)
+        except ValueError:
+            return web.Response(status=421, text="unknown site")
+        p = site_profile(i)
+        if p["kind"] == "dead":
+            stats["tarpitted"] += 1
+            await asyncio.sleep(TARPIT_S)
+            return web.Response(status=504)
+        if LATENCY:
+            await asyncio.sleep(random.expovariate(1 / LATENCY))
+        if ERROR_RATE and random.random() < ERROR_RATE:
+            stats["injected_errors"] += 1
+            return web.Response(status=503)
+        if request.method == "HEAD" and p["head_405"]:
+            return web.Response(status=405)
+        status, ct, body = page_for(i, request.path, f"http://{request.host}")
+        etag = '"%s"' % hashlib.md5(body).hexdigest()[:16]
+        stats["by_status"][status] = stats["by_status"].get(status, 0) + 1
+        if status == 200 and request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        if request.method != "HEAD":
+            stats["bytes"] += len(body)
+        return web.Response(status=status, body=body, content_type=ct, headers={"ETag": etag})
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handle)
+    return app
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--port", type=int, default=8900)
+    ap.add_argument("--host", default="0.0.0.0")
+    args = ap.parse_args()
+    web.run_app(make_app(), host=args.host, port=args.port, access_log=None, backlog=4096)
+
+if __name__ == "__main__":
+    main()
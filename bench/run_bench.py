@@ -0,0 +1,140 @@
+"""Offline benchmark of the extraction hot paths against the labeled fixture corpus.
+
+    python bench/run_bench.py                 # compare with bench/baseline.json
+    python bench/run_bench.py --update        # accept the current numbers as the baseline
+    python bench/run_bench.py --quality-only  # skip timing checks (e.g. on a different machine)
+
+Every fixture in bench/fixtures (HTML and PDF) goes through the same
+extractors the pipeline uses. Reported: pages/s and items/s for the full
+extractor, best-of-N time per stage (HTML text blocks, PDF layout, line scan,
+norm_name, median), peak RSS, and per fixture the yield (labeled items found)
+and precision (extracted items that are labeled) against fixtures/expected.json.
+An extracted item matches a label when the prices are equal and its name
+starts with the labeled name (descriptions may still be glued on).
+
+The run exits 1 when yield or precision drops at all, or when throughput, a
+stage time or peak RSS is worse than the baseline by more than BENCH_TOLERANCE.
+Timings are only comparable on the machine that wrote the baseline.
+"""
+import os, sys, json, glob, time, resource
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "scripts"))
+import extract_menu_items as emi  # noqa: E402
+import line_scan, pdf_lines  # noqa: E402
+
+FIXTURES = os.path.join(HERE, "fixtures")
+EXPECTED = os.path.join(FIXTURES, "expected.json")
+BASELINE = os.path.join(HERE, "baseline.json")
+REPEAT = int(os.environ.get("BENCH_REPEAT", "10"))
+TOLERANCE = float(os.environ.get("BENCH_TOLERANCE", "0.25"))
+NOISE_MS = 0.05   # stage times below this are too small to compare
+
+def best_of(fn):
+    best = float("inf")
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def load(path):
+    if path.endswith(".pdf"):
+        with open(path, "rb") as f:
+            return f.read()
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+def extract(name, body):
+    if name.endswith(".pdf"):
+        return list(emi.yield_items_from_pdf(body, name))
+    return list(emi.yield_items_from_html(body, name))
+
+def quality(items, labels):
+    """(yield, precision) over distinct (name, price) pairs."""
+    found = {(it["item_name"].lower(), it["price"]) for it in items}
+    want = {(n.lower(), p) for n, p in labels}
+    def matches(f, w): return f[1] == w[1] and f[0].startswith(w[0])
+    hit = sum(1 for w in want if any(matches(f, w) for f in found))
+    good = sum(1 for f in found if any(matches(f, w) for w in want))
+    return hit / max(len(want), 1), good / max(len(found), 1)
+
+def run():
+    with open(EXPECTED) as f:
+        expected = json.load(f)
+    paths = sorted(glob.glob(os.path.join(FIXTURES, "*.html")) + glob.glob(os.path.join(FIXTURES, "*.pdf")))
+    stages = {"html_text": 0.0, "pdf_layout": 0.0, "line_scan": 0.0, "norm_name": 0.0, "median": 0.0}
+    total = 0.0; n_items = 0; fixtures = {}
+    for path in paths:
+        name = os.path.basename(path)
+        body = load(path)
+        secs, items = best_of(lambda: extract(name, body))
+        total += secs; n_items += len(items)
+        if name.endswith(".pdf"):
+            t, lines = best_of(lambda: list(pdf_lines.pdf_lines(body)))
+            stages["pdf_layout"] += t
+        else:
+            t, lines = best_of(lambda: list(emi.HTML_ENGINES[emi.HTML_ENGINE](body)))
+            stages["html_text"] += t
+        stages["line_scan"] += best_of(lambda: list(line_scan.items_from_lines(lines, name)))[0]
+        names = [it["item_name"] for it in items]
+        stages["norm_name"] += best_of(lambda: [line_scan.norm_name(s) for s in names])[0]
+        stages["median"] += best_of(lambda: emi.median_price(items))[0]
+        y, p = quality(items, expected.get(name, []))
+        fixtures[name] = {"items": len(items), "yield": round(y, 4), "precision": round(p, 4),
+                          "ms": round(secs * 1000, 3)}
+    return {
+        "pages_per_s": round(len(paths) / total, 1),
+        "items_per_s": round(n_items / total, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages_ms": {k: round(v * 1000, 3) for k, v in stages.items()},
+        "fixtures": fixtures,
+    }
+
+def compare(cur, base, timing=True):
+    """Print the run next to the baseline; return the list of regressions."""
+    bad = []
+    def row(label, now, then, worse):
+        flag = ""
+        if then is not None and worse:
+            flag = "  REGRESSION"
+            bad.append(label)
+        print(f"  {label:<34}{now:>12}{then if then is not None else '-':>12}{flag}")
+    print(f"  {'':<34}{'now':>12}{'baseline':>12}")
+    for k in ("pages_per_s", "items_per_s"):
+        then = base.get(k)
+        row(k, cur[k], then, timing and then is not None and cur[k] < then * (1 - TOLERANCE))
+    then = base.get("peak_rss_mb")
+    row("peak_rss_mb", cur["peak_rss_mb"], then, timing and then is not None and cur["peak_rss_mb"] > then * (1 + TOLERANCE))
+    for k, now in cur["stages_ms"].items():
+        then = base.get("stages_ms", {}).get(k)
+        row(f"stage {k} ms", now, then, timing and then is not None and now > max(then * (1 + TOLERANCE), then + NOISE_MS))
+    for name, f in cur["fixtures"].items():
+        old = base.get("fixtures", {}).get(name, {})
+        for k in ("yield", "precision"):
+            then = old.get(k)
+            row(f"{name} {k}", f[k], then, then is not None and f[k] < then - 1e-9)
+    return bad
+
+def main():
+    args = set(sys.argv[1:])
+    cur = run()
+    print(f"{len(cur['fixtures'])} fixtures, best of {REPEAT}:")
+    for name, f in cur["fixtures"].items():
+        print(f"  {name:<26}{f['ms']:>9.2f} ms{f['items']:>6} items  yield {f['yield']:.3f}  precision {f['precision']:.3f}")
+    if "--update" in args or not os.path.exists(BASELINE):
+        with open(BASELINE, "w") as f:
+            json.dump(cur, f, indent=1, sort_keys=True)
+            f.write("\n")
+        print(f"baseline written → {BASELINE}")
+        return
+    with open(BASELINE) as f:
+        base = json.load(f)
+    bad = compare(cur, base, timing="--quality-only" not in args)
+    if bad:
+        print(f"\nFAIL: {len(bad)} regression(s) vs baseline (tolerance {TOLERANCE:.0%}): {', '.join(bad)}")
+        sys.exit(1)
+    print("\nOK: no regressions vs baseline")
+
+if __name__ == "__main__":
+    main()
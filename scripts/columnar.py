@@ -0,0 +1,132 @@
+"""Optional Parquet copies of the inter-stage snapshot files.
+
+INTERMEDIATE_FORMAT picks what extract_menu_items writes for menu_items and
+menu_prices: "jsonl" (default, one json.dumps per line), "parquet" (row groups
+of ROW_GROUP rows, zstd, URL and bucket columns dictionary-encoded) or "both"
+(Parquet for the pipeline, JSONL alongside for jq/grep). The upsert scripts
+read through rows()/batches(), which take the .parquet file next to the .jsonl
+whenever it is at least as new, and read only the columns asked for, one row
+group at a time.
+
+pyarrow is only needed when Parquet is written or read.
+"""
+import os, json
+
+FORMAT = os.environ.get("INTERMEDIATE_FORMAT", "jsonl")   # "jsonl" | "parquet" | "both"
+ROW_GROUP = int(os.environ.get("INTERMEDIATE_ROW_GROUP", "65536"))
+
+# column -> arrow type; listed order is the file order
+ITEMS = {"item_name": "string", "item_desc": "string", "price": "float64", "calories_kcal": "int64",
+         "calories_text": "string", "source_url": "string"}
+PRICES = {"menu_url": "string", "median_price": "float64", "price_bucket": "string"}
+DICTIONARY = ["source_url", "menu_url", "price_bucket"]
+
+def parquet_path(path):
+    return os.path.splitext(path)[0] + ".parquet"
+
+def source(path):
+    """The file to read for a .jsonl snapshot path: its Parquet twin when present and not older."""
+    pq_path = parquet_path(path)
+    if os.path.exists(pq_path) and (not os.path.exists(path) or os.path.getmtime(pq_path) >= os.path.getmtime(path)):
+        return pq_path
+    return path
+
+def exists(path):
+    return os.path.exists(source(path))
+
+class Writer:
+    """Write dict rows to `path` (.jsonl) and/or its .parquet twin per FORMAT; replaced atomically on close.
+
+        with columnar.Writer(OUT, columnar.ITEMS) as w:
+            for item in items: w.write(item)
+    """
+    def __init__(self, path, columns, fmt=None):
+        fmt = fmt or FORMAT
+        if fmt not in ("jsonl", "parquet", "both"):
+            raise ValueError(f"INTERMEDIATE_FORMAT must be jsonl, parquet or both, not {fmt!r}")
+        self.path, self.columns, self.n = path, columns, 0
+        self.jsonl = open(path + ".tmp", "w") if fmt != "parquet" else None
+        self.pq = None
+        if fmt != "jsonl":
+            import pyarrow as pa, pyarrow.parquet as pq
+            self.schema = pa.schema([(c, getattr(pa, t)()) for c, t in columns.items()])
+            self.pq = pq.ParquetWriter(parquet_path(path) + ".tmp", self.schema, compression="zstd",
+                                       use_dictionary=[c for c in columns if c in DICTIONARY])
+            self.buf, self.pending = {c: [] for c in columns}, 0
+
+    def write(self, row):
+        if self.jsonl:
+            self.jsonl.write(json.dumps(row) + "\n")
+        if self.pq:
+            for c, col in self.buf.items():
+                col.append(row.get(c))
+            self.pending += 1
+            if self.pending >= ROW_GROUP:
+                self._flush()
+        self.n += 1
+
+    def _flush(self):
+        import pyarrow as pa
+        if self.pending:
+            self.pq.write_table(pa.Table.from_pydict(self.buf, schema=self.schema), row_group_size=ROW_GROUP)
+            self.buf, self.pending = {c: [] for c in self.columns}, 0
+
+    def close(self):
+        if self.jsonl:
+            self.jsonl.close()
+            os.replace(self.path + ".tmp", self.path)
+        if self.pq:
+            self._flush()
+            self.pq.close()
+            os.replace(parquet_path(self.path) + ".tmp", parquet_path(self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:   # leave the previous snapshot in place
+            if self.jsonl: self.jsonl.close()
+            if self.pq: self.pq.close()
+
+def count(path):
+    """Row count of the snapshot at `path` (Parquet metadata, or a newline count)."""
+    src = source(path)
+    if src.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(src).metadata.num_rows
+    n = 0
+    with open(src, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            n += chunk.count(b"\n")
+    return n
+
+def batches(path, columns, size=ROW_GROUP):
+    """Yield {column: [values]} chunks of the snapshot at `path`, projected to `columns`."""
+    src = source(path)
+    if src.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(src).iter_batches(batch_size=size, columns=list(columns)):
+            yield batch.to_pydict()
+        return
+    with open(src) as f:
+        chunk = {c: [] for c in columns}
+        n = 0
+        for line in f:
+            row = json.loads(line)
+            for c, col in chunk.items():
+                col.append(row.get(c))
+            n += 1
+            if n == size:
+                yield chunk
+                chunk = {c: [] for c in columns}; n = 0
+        if n:
+            yield chunk
+
+def rows(path, columns):
+    """Yield the snapshot's rows as dicts holding only `columns`."""
+    for chunk in batches(path, columns):
+        cols = list(chunk)
+        for values in zip(*(chunk[c] for c in cols)):
+            yield dict(zip(cols, values))
@@ -0,0 +1,122 @@
+"""Client-side near-duplicate filter for menu items before they are upserted.
+
+The same menu is often reachable as /menu, /menus and /food, and HTML pages
+repeat an item with cosmetic differences (case, punctuation, dashes). The
+server's unique key (restaurant_id, item_name, price, source_url) keeps all of
+those, so without this filter they are sent and conflict-resolved again on
+every run. Two checks run on the stream of snapshot items (grouped by
+source_url, as extract_menu_items writes them):
+
+  page  the page's content hash (its set of normalized name+price keys); a
+        page whose hash was already seen on the same registrable host is
+        dropped whole
+  item  a normalized name+price key already seen on the same registrable host
+        is dropped; the first URL to carry it keeps it
+
+DEDUP_INDEX picks how seen item keys are held:
+
+  exact  a set of 64-bit key hashes (default; ~70 bytes per distinct item)
+  bloom  a Bloom filter sized for the run (DEDUP_FP false-positive rate,
+         ~3.6 bytes per item at 1e-6) for runs too large for the set; a false
+         positive drops a distinct item, so expect about DEDUP_FP x items lost
+  off    no filtering
+
+    d = dedup.Dedup(expected=n)
+    for it in d.filter(items): ...
+    print(d.summary())
+"""
+import os, re, math, hashlib
+from itertools import groupby
+from line_scan import norm_name
+from domains import site_key
+
+INDEX = os.environ.get("DEDUP_INDEX", "exact")   # "exact" | "bloom" | "off"
+FP_RATE = float(os.environ.get("DEDUP_FP", "1e-6"))
+
+_PUNCT = re.compile(r"[^\w\s]+")
+
+def item_key(name, price):
+    """Normalized name + price in cents: "Caesar Salad —" and "caesar salad" at 9.5 agree."""
+    name = " ".join(_PUNCT.sub(" ", norm_name(name or "").casefold()).split())
+    return f"{name}\x1f{round((price or 0) * 100)}"
+
+class Bloom:
+    """Fixed-size Bloom filter over strings (double hashing on one blake2b digest)."""
+    def __init__(self, expected, fp=FP_RATE):
+        expected = max(int(expected), 1)
+        self.m = max(64, int(-expected * math.log(fp) / math.log(2) ** 2))
+        self.k = max(1, round(self.m / expected * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+
+    def add(self, s):
+        """Insert s; True if it was (probably) present already."""
+        d = hashlib.blake2b(s.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(d[:8], "little"), int.from_bytes(d[8:], "little") | 1
+        bits, m, present = self.bits, self.m, True
+        for i in range(self.k):
+            b = (h1 + i * h2) % m
+            byte, mask = b >> 3, 1 << (b & 7)
+            if not bits[byte] & mask:
+                present = False
+                bits[byte] |= mask
+        return present
+
+class _Exact:
+    def __init__(self):
+        self.seen = set()
+
+    def add(self, s):
+        h = hash(s)
+        if h in self.seen:
+            return True
+        self.seen.add(h)
+        return False
+
+class Dedup:
+    def __init__(self, index=INDEX, expected=0, fp=FP_RATE):
+        self.index = index
+        if index == "bloom":
+            self.items = Bloom(expected or 1_000_000, fp)
+        elif index in ("exact", "off"):
+            self.items = _Exact()
+        else:
+            raise ValueError(f"DEDUP_INDEX must be exact, bloom or off, not {index!r}")
+        self.pages = set()   # (host, content hash); one entry per page
+        self.stats = {"items_in": 0, "items_out": 0, "pages_in": 0, "pages_collapsed": 0,
+                      "items_in_collapsed_pages": 0, "items_near_dup": 0}
+
+    def filter(self, items):
+        """Yield the items that survive both checks; items must arrive grouped by source_url."""
+        st = self.stats
+        for url, group in groupby(items, key=lambda it: it["source_url"]):
+            page = list(group)
+            st["pages_in"] += 1
+            st["items_in"] += len(page)
+            if self.index == "off":
+                st["items_out"] += len(page)
+                yield from page
+                continue
+            host = site_key(url or "")
+            keys = [item_key(it.get("item_name"), it.get("price")) for it in page]
+            digest = hashlib.blake2b("\n".join(sorted(set(keys))).encode(), digest_size=16).digest()
+            if (host, digest) in self.pages:
+                st["pages_collapsed"] += 1
+                st["items_in_collapsed_pages"] += len(page)
+                continue
+            self.pages.add((host, digest))
+            for it, k in zip(page, keys):
+                if self.items.add(f"{host}\x1e{k}"):
+                    st["items_near_dup"] += 1
+                    continue
+                st["items_out"] += 1
+                yield it
+
+    def ratio(self):
+        """Items in per item kept (1.0 = nothing removed)."""
+        return self.stats["items_in"] / max(self.stats["items_out"], 1)
+
+    def summary(self):
+        st = self.stats
+        return (f"dedup ({self.index}): {st['items_in']} items → {st['items_out']} ({self.ratio():.2f}x) | "
+                f"{st['pages_collapsed']}/{st['pages_in']} pages collapsed ({st['items_in_collapsed_pages']} items), "
+                f"{st['items_near_dup']} near-duplicate items")
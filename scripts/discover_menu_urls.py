@@ -0,0 +1,307 @@
+"""Menu candidates from robots.txt and sitemaps, under a per-site URL budget.
+
+    python scripts/discover_menu_urls.py
+
+Per site: robots.txt is fetched once and honored (RFC 9309: a 4xx means no
+rules, a 5xx or no answer means stay away this run; Crawl-delay stretches the
+domain's request spacing). Its Sitemap: lines are followed, or /sitemap.xml
+when there are none. Sitemaps are parsed as they stream in (lxml pull parser,
+gzip inflated on the fly) so a 50 MB urlset never sits in memory; sitemap
+indexes are followed, menu-looking child sitemaps first, up to MAX_SITEMAPS.
+
+Same-site URLs that robots allows are ranked: a menu word in the path is
+required, PDFs and recently modified pages rank up, blog/news/event paths and
+deep paths rank down, and anything under MIN_SCORE is dropped. The best
+PER_SITE per site go to data/menu_candidates.jsonl with their lastmod (UTC
+ISO; a date-only lastmod counts as the end of that day), which
+extract_menu_items uses to skip pages not modified since their items were
+last confirmed.
+"""
+import os, json, zlib, time, heapq, asyncio, aiohttp
+from contextlib import aclosing
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+from lxml import etree
+import host_health, metrics, supa
+from domains import registrable
+from guess_menu_urls import (HostGate, trace_config, normalize_site, MENU_WORDS, UA, HOST_ERRORS, GET_TIMEOUT,
+                             CONCURRENCY, PER_HOST, HOST_INTERVAL, SITE_WINDOW)
+
+OUT = "data/menu_candidates.jsonl"
+
+PER_SITE     = int(os.environ.get("DISCOVER_PER_SITE", "5"))          # candidates written per site
+MAX_SITEMAPS = int(os.environ.get("DISCOVER_MAX_SITEMAPS", "10"))     # sitemap files fetched per site
+MAX_URLS     = int(os.environ.get("DISCOVER_MAX_URLS", "50000"))      # sitemap entries read per site
+MAX_BYTES    = int(os.environ.get("DISCOVER_MAX_MB", "50")) * 2**20   # per sitemap, uncompressed (protocol limit)
+RECENT_DAYS  = float(os.environ.get("DISCOVER_RECENT_DAYS", "180"))   # lastmod this fresh ranks up
+MIN_SCORE    = float(os.environ.get("DISCOVER_MIN_SCORE", "2"))       # below: a menu word in a blog/news path
+ROBOTS_MAX_BYTES = 500 * 1024
+SITEMAP_TIMEOUT  = aiohttp.ClientTimeout(total=60, sock_read=15)
+
+NOISE = ("/blog", "/news", "/post", "/tag/", "/category/", "/author/", "/event", "/press", "/career", "/job", "/gift")
+
+def parse_lastmod(s):
+    """W3C datetime → aware UTC datetime, or None. A bare date means the end of that day."""
+    s = (s or "").strip()
+    try:
+        dt = datetime.fromisoformat(s)
+    except ValueError:
+        return None
+    if len(s) == 10:
+        dt += timedelta(days=1)
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).astimezone(timezone.utc)
+
+def score(url, lastmod, now):
+    """Rank of a page URL as a menu candidate; None when the path has no menu word."""
+    path = urlparse(url).path.lower()
+    words = sum(w in path for w in MENU_WORDS)
+    if not words:
+        return None
+    s = 3 + words + ("menu" in path)
+    if path.endswith(".pdf"): s += 1
+    if lastmod and (now - lastmod).days <= RECENT_DAYS: s += 1
+    if any(n in path for n in NOISE): s -= 3
+    return s - 0.25 * max(0, path.rstrip("/").count("/") - 2)
+
+def sitemap_priority(entry):
+    loc, lastmod = entry
+    path = urlparse(loc).path.lower()
+    return (not any(w in path for w in MENU_WORDS), any(n in path for n in NOISE),
+            -(lastmod.timestamp() if lastmod else 0))
+
+async def fetch_robots(session, base):
+    """(RobotFileParser, outcome) for the site, read once."""
+    rp = RobotFileParser(base + "/robots.txt")
+    health = host_health.default()
+    t0 = time.monotonic()
+    status, body = None, b""
+    try:
+        async with session.get(rp.url, allow_redirects=True, timeout=GET_TIMEOUT) as resp:
+            status = resp.status
+            if status == 200 and "html" not in resp.headers.get("content-type", "").lower():
+                body = await resp.content.read(ROBOTS_MAX_BYTES)
+            resp.close()
+        health.success(base, time.monotonic() - t0)
+    except HOST_ERRORS:
+        health.failure(base)
+    except Exception:
+        pass
+    if body:
+        rp.parse(body.decode("utf-8", "replace").splitlines())
+        outcome = "rules"
+    elif status is not None and status < 500 and status != 429:
+        rp.parse([])   # missing, forbidden or served as a soft-404 page: no rules
+        outcome = "none"
+    else:
+        rp.disallow_all = True
+        outcome = "unreachable"
+    metrics.inc("robots", outcome=outcome)
+    return rp, outcome
+
+async def sitemap_entries(session, url):
+    """Yield ("sitemap" | "url", loc, lastmod text) while the sitemap at url streams in."""
+    async with session.get(url, allow_redirects=True, timeout=SITEMAP_TIMEOUT) as resp:
+        resp.raise_for_status()
+        if "html" in resp.headers.get("content-type", "").lower():   # soft 404
+            resp.close()
+            return
+        parser = etree.XMLPullParser(events=("end",), resolve_entities=False, no_network=True)
+        inflate, size = None, 0
+        async for chunk in resp.content.iter_chunked(1 << 16):
+            if inflate is None:   # .xml.gz served as application/gzip (a Content-Encoding is undone by aiohttp)
+                inflate = zlib.decompressobj(wbits=31) if chunk[:2] == b"\x1f\x8b" else False
+            data = inflate.decompress(chunk) if inflate else chunk
+            size += len(data)
+            parser.feed(data)
+            for _, el in parser.read_events():
+                kind = etree.QName(el).localname
+                if kind not in ("url", "sitemap"):
+                    continue
+                fields = {etree.QName(c).localname: (c.text or "").strip() for c in el if isinstance(c.tag, str)}
+                el.clear()
+                while el.getprevious() is not None:   # drop finished siblings; memory stays flat
+                    del el.getparent()[0]
+                if fields.get("loc"):
+                    yield kind, fields["loc"], fields.get("lastmod")
+            if size > MAX_BYTES:
+                resp.close()
+                return
+        if inflate and not inflate.eof:
+            raise zlib.error("truncated gzip stream")   # a cut-off sitemap would read as a complete one
+
+async def discover_site(session, base, gate, slots):
+    """Ranked sitemap candidates for one site: (records, counters).
+
+    counters["failed"] is set when the site could not be read this run (robots.txt
+    unreachable, open circuit, a sitemap that errored); its previous candidates are kept."""
+    health = host_health.default()
+    st = {"sitemaps": 0, "entries": 0, "disallowed": 0, "sitemap_errors": 0, "failed": 0}
+    if not health.allow(base):
+        st["failed"] = 1
+        return [], st
+    async with gate:
+        async with slots:
+            rp, outcome = await fetch_robots(session, base)
+    if outcome == "unreachable":
+        st["failed"] = 1
+        return [], st
+    delay = rp.crawl_delay(UA["User-Agent"])
+    if delay:
+        gate.interval = max(gate.interval, float(delay))
+    agent = UA["User-Agent"]
+    site = registrable(urlparse(base).hostname or "")
+    host = urlparse(base).netloc
+    listed = []
+    for u in rp.site_maps() or []:
+        try:
+            listed.append(urljoin(rp.url, u))   # Sitemap: may be relative
+        except ValueError:   # e.g. an unbalanced [ in the host
+            st["sitemap_errors"] += 1
+    queue = [(u, None) for u in listed] or [(urljoin(base, "/sitemap.xml"), None)]
+    seen_maps, seen_urls, best = set(), set(), []   # best: min-heap of (rank, tiebreaks..., record)
+    now = datetime.now(timezone.utc)
+
+    while queue and st["sitemaps"] < MAX_SITEMAPS and st["entries"] < MAX_URLS and health.allow(base):
+        url, _ = queue.pop(0)
+        if url in seen_maps:
+            continue
+        seen_maps.add(url)
+        if url not in listed and urlparse(url).netloc == host and not rp.can_fetch(agent, url):
+            st["disallowed"] += 1
+            continue
+        st["sitemaps"] += 1
+        children = []
+        t0 = time.monotonic()
+        try:
+            # domain gate before a global slot; aclosing: a break closes the response
+            async with gate, slots, aclosing(sitemap_entries(session, url)) as entries:
+                async for kind, loc, lastmod in entries:
+                    lm = parse_lastmod(lastmod)
+                    if kind == "sitemap":
+                        children.append((urljoin(url, loc), lm))
+                        continue
+                    if st["entries"] >= MAX_URLS:
+                        break
+                    st["entries"] += 1
+                    loc = urljoin(url, loc).split("#", 1)[0]
+                    p = urlparse(loc)
+                    if loc in seen_urls or p.scheme not in ("http", "https") or registrable(p.hostname or "") != site:
+                        continue
+                    seen_urls.add(loc)
+                    rank = score(loc, lm, now)
+                    if rank is None or rank < MIN_SCORE:
+                        continue
+                    if not rp.can_fetch(agent, loc):
+                        st["disallowed"] += 1
+                        continue
+                    rec = {"root": base, "menu_url": loc, "lastmod": lm.isoformat() if lm else None,
+                           "score": rank, "via": "sitemap"}
+                    item = (rank, lm.timestamp() if lm else 0, -len(loc), loc, rec)   # loc is unique: rec is never compared
+                    if len(best) < PER_SITE:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+            health.success(url, time.monotonic() - t0)
+            metrics.inc("sitemaps", kind="index" if children else "urlset")
+        except aiohttp.ClientResponseError as e:
+            if e.status != 404:   # a missing /sitemap.xml is normal
+                st["sitemap_errors"] += 1
+            metrics.inc("sitemaps", kind="missing" if e.status == 404 else "error")
+        except HOST_ERRORS:
+            health.failure(url)
+            st["sitemap_errors"] += 1
+            metrics.inc("sitemaps", kind="error")
+        except (etree.XMLSyntaxError, zlib.error):
+            st["sitemap_errors"] += 1
+            metrics.inc("sitemaps", kind="invalid")
+        except (aiohttp.ClientError, ValueError):   # bad URL, broken body: this sitemap only, never the run
+            st["sitemap_errors"] += 1
+            metrics.inc("sitemaps", kind="error")
+        queue.extend(sorted(children, key=sitemap_priority))
+    st["failed"] = int(bool(st["sitemap_errors"]) or not health.allow(base))
+    return [rec for *_, rec in sorted(best, reverse=True)], st
+
+def load_previous():
+    """{root: [records]} from the last run's output."""
+    prev = {}
+    try:
+        with open(OUT) as f:
+            for line in f:
+                rec = json.loads(line)
+                prev.setdefault(rec["root"], []).append(rec)
+    except (OSError, ValueError, KeyError):
+        pass
+    return prev
+
+async def run(sites, f):
+    slots = asyncio.Semaphore(CONCURRENCY)
+    gates = {}
+    previous = load_previous()
+    totals = {"sitemaps": 0, "entries": 0, "disallowed": 0, "sitemap_errors": 0, "failed": 0, "carried": 0,
+              "candidates": 0, "sites_with": 0}
+    conn = aiohttp.TCPConnector(limit=CONCURRENCY, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(headers=UA, connector=conn, trace_configs=[trace_config()]) as session:
+        pending, bases = set(), {}
+
+        def drain(done):
+            for t in done:
+                recs, st = t.result()
+                base = bases.pop(t)
+                for k, v in st.items():
+                    totals[k] += v
+                if st["failed"] and not recs:
+                    # a transient failure must not drop the site's menus: extract removes pages missing here
+                    recs = previous.get(base, [])
+                    totals["carried"] += len(recs)
+                for rec in recs:
+                    f.write(json.dumps(rec) + "\n")
+                totals["candidates"] += len(recs)
+                totals["sites_with"] += bool(recs)
+                metrics.inc("candidates", len(recs))
+
+        for n, base in enumerate(sites, 1):
+            if not base: continue
+            if len(pending) >= SITE_WINDOW:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                drain(done)
+            dom = registrable(urlparse(base).hostname or "") or base
+            metrics.inc("sites")
+            gate = gates.setdefault(dom, HostGate(PER_HOST, HOST_INTERVAL))
+            task = asyncio.create_task(discover_site(session, base, gate, slots))
+            bases[task] = base
+            pending.add(task)
+            if n % 500 == 0:
+                print(f"scheduled {n} sites, {totals['sitemaps']} sitemaps, {totals['candidates']} candidates so far …")
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            drain(done)
+    metrics.inc("sitemap_entries", totals["entries"])
+    metrics.inc("robots_disallowed", totals["disallowed"])
+    metrics.inc("candidates_carried", totals["carried"])
+    host_health.default().save()
+    print(host_health.default().summary())
+    return totals
+
+def main():
+    os.makedirs("data", exist_ok=True)
+    metrics.start("discover_menu_urls")
+
+    rows = supa.client().select("restaurants", "website", website="not.is.null")
+    sites = sorted({normalize_site(row.get("website")) for row in rows if row.get("website")})
+    if not sites:
+        print("No websites found. Consider running website enrichment first.")
+        return
+
+    print(f"Reading robots.txt and sitemaps of {len(sites)} sites (up to {MAX_SITEMAPS} sitemaps, "
+          f"{PER_SITE} candidates per site; {CONCURRENCY} in flight, {PER_HOST}/domain every {HOST_INTERVAL}s) …")
+    with open(OUT + ".tmp", "w") as f:
+        t = asyncio.run(run(sites, f))
+    os.replace(OUT + ".tmp", OUT)   # extract_menu_items drops pages missing from its candidates: never leave a partial file
+    print(f"{t['sitemaps']} sitemaps ({t['sitemap_errors']} failed), {t['entries']} entries, "
+          f"{t['disallowed']} skipped by robots.txt → {t['candidates']} candidates on {t['sites_with']} sites "
+          f"({t['carried']} kept from the last run for {t['failed']} sites that could not be read)")
+    print(f"Wrote: {OUT}")
+
+if __name__ == "__main__":
+    main()
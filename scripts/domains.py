@@ -0,0 +1,83 @@
+"""Registrable-domain helpers and the host → restaurant-id index.
+
+tldextract is configured never to touch the network: it reads the suffix list
+from PSL_FILE if present, else the snapshot bundled inside tldextract. Lookups
+are memoized. The restaurant index is persisted to INDEX_PATH and rebuilt
+only when the restaurants table looks different (row count / max id), when it
+is older than INDEX_MAX_AGE, or after a script that edits websites calls
+invalidate_index().
+"""
+import os, json, time
+from functools import lru_cache
+from urllib.parse import urlparse
+import tldextract
+
+PSL_FILE = os.environ.get("PSL_FILE", "data/public_suffix_list.dat")
+INDEX_PATH = os.environ.get("RESTAURANT_INDEX", "data/restaurant_index.json")
+INDEX_MAX_AGE = float(os.environ.get("RESTAURANT_INDEX_MAX_AGE_H", "24")) * 3600
+
+_extract = tldextract.TLDExtract(
+    suffix_list_urls=(f"file://{os.path.abspath(PSL_FILE)}",) if os.path.exists(PSL_FILE) else (),
+    cache_dir=None,
+    fallback_to_snapshot=True,
+)
+
+@lru_cache(maxsize=1 << 16)
+def registrable(host: str) -> str:
+    host = (host or "").strip().lower().rsplit("@", 1)[-1]
+    if host.startswith("["):   # IPv6 literal
+        return host
+    host = host.split(":", 1)[0].rstrip(".")
+    ex = _extract(host)
+    return ".".join([p for p in [ex.domain, ex.suffix] if p])
+
+def host_of(u: str) -> str:
+    try: return urlparse(u).netloc
+    except Exception: return ""
+
+def site_key(url: str) -> str:
+    """Registrable domain of a URL, e.g. https://www.joes.co.uk/menu → joes.co.uk."""
+    return registrable(host_of(url))
+
+def same_org(a: str, b: str) -> bool:
+    return registrable(a) == registrable(b)
+
+# --- host → restaurant ids ---
+
+def _fingerprint(db):
+    count = db.count("restaurants", website="not.is.null")
+    resp = db.request("GET", "restaurants", params={"select": "id", "order": "id.desc", "limit": 1})
+    resp.raise_for_status()
+    rows = resp.json()
+    return [count, rows[0]["id"] if rows else None]
+
+def build_index(db):
+    ids_by_host = {}
+    for row in db.select("restaurants", "id,website", website="not.is.null"):
+        h = site_key(row.get("website") or "")
+        if h: ids_by_host.setdefault(h, []).append(row["id"])
+    return ids_by_host
+
+def restaurant_index(db=None, rebuild=False):
+    """{registrable host: [restaurant ids]}, from disk when the table has not changed."""
+    import supa
+    db = db or supa.client()
+    fp = _fingerprint(db)
+    if not rebuild and os.path.exists(INDEX_PATH):
+        try:
+            with open(INDEX_PATH) as f:
+                saved = json.load(f)
+            if saved.get("fingerprint") == fp and time.time() - saved.get("built_at", 0) < INDEX_MAX_AGE:
+                return saved["hosts"]
+        except (OSError, ValueError, KeyError):
+            pass
+    hosts = build_index(db)
+    os.makedirs(os.path.dirname(INDEX_PATH) or ".", exist_ok=True)
+    with open(INDEX_PATH + ".tmp", "w") as f:
+        json.dump({"fingerprint": fp, "built_at": time.time(), "hosts": hosts}, f)
+    os.replace(INDEX_PATH + ".tmp", INDEX_PATH)
+    return hosts
+
+def invalidate_index():
+    try: os.remove(INDEX_PATH)
+    except FileNotFoundError: pass
@@ -1,28 +1,21 @@
-import csv, os, requests
-from dotenv import load_dotenv
-
-load_dotenv(".env")
-URL = os.environ["SUPABASE_URL"].rstrip("/")
-KEY = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
+import csv, os
+import metrics, supa
 
+metrics.start("export_missing_websites")
 OUT = "data/missing_websites.csv"
 os.makedirs("data", exist_ok=True)
 
-res = requests.get(
-    f"{URL}/rest/v1/restaurants",
-    headers={"apikey": KEY, "Authorization": f"Bearer {KEY}"},
-    params={"select":"id,name,addr,city,state,postcode,website",
-            "website":"is.null","order":"name.asc"},
-    timeout=60,
-)
-res.raise_for_status()
-rows = res.json()
+FIELDS = ["id","name","addr","city","state","postcode","website"]
+# Range-offset pages need a total order: chain names repeat, so id breaks the ties
+rows = supa.client().select("restaurants", ",".join(FIELDS), order="name.asc,id.asc", website="is.null")
 
+n = 0
 with open(OUT, "w", newline="") as f:
-    w = csv.DictWriter(f, fieldnames=["id","name","addr","city","state","postcode","website"])
+    w = csv.DictWriter(f, fieldnames=FIELDS)
     w.writeheader()
     for r in rows:
         r["website"] = ""
         w.writerow(r)
+        n += 1
 
-print(f"Wrote {len(rows)} rows to {OUT}")
+print(f"Wrote {n} rows to {OUT}")
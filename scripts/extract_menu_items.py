@@ -1,135 +1,85 @@
-import os, json, re, io, time, requests, tldextract
-from urllib.parse import urlparse
+import os, json, time, hashlib, requests
+from datetime import datetime
+from concurrent.futures import wait, FIRST_COMPLETED
 from bs4 import BeautifulSoup
-from pdfminer.high_level import extract_text as pdf_extract_text
 from dotenv import load_dotenv
+import http_cache, host_health, metrics, parse_pool, html_blocks, line_scan, extract_state, pdf_lines, columnar, render_pool, structured_menu
+from line_scan import PRICE_RX
+from domains import same_org, host_of
+from price_stats import bucket, median_price  # per-page outlier filter shared with the batch stats
 
 load_dotenv(".env")
 
 CANDS = [
-    "data/menu_candidates.jsonl",
-    "data/menu_candidates_guessed.jsonl",
+    "data/menu_candidates.jsonl",           # discover_menu_urls (sitemaps; carries lastmod)
+    "data/menu_candidates_guessed.jsonl",   # guess_menu_urls (probed paths)
 ]
 OUT = "data/menu_items.jsonl"
+PRICES_OUT = "data/menu_prices.jsonl"
+DELTA_OUT = "data/menu_items_delta.jsonl"   # {"op": "add"|"remove", ...item}, appended until upsert_menu_items applies it
 
 UA = {"User-Agent": "FareWare/0.1 (+contact: send.ishan@gmail.com)"}
-PRICE_RX = re.compile(r"\$\s*\d{1,3}(?:\.\d{1,2})?|\b\d{1,3}\.\d{2}\b")
-BAD_HOSTS = (
-    "toasttab.com","square.site","doordash.com","ubereats.com",
-    "grubhub.com","olo.com","chownow.com","opentable.com","resy.com",
+# Known 3rd-party ordering hosts we SKIP (JS heavy / no inline prices)
+THIRDPARTY = (
+    "toasttab.com", "square.site", "tryotter.com", "clover.com",
+    "ubereats.com", "doordash.com", "grubhub.com", "olo.com",
+    "chownow.com", "opentable.com", "resy.com", "ezcater.com",
 )
 
-# --- Calories capture (we keep them) ---
-CAL_PAIR_RX  = re.compile(r'\b(cal(?:ories)?|kcal)\b[:\s]*([0-9]{2,4})', re.I)
-
-def registrable(host:str)->str:
-    ex=tldextract.extract(host or "")
-    return ".".join([p for p in [ex.domain, ex.suffix] if p])
-
-def host_of(u:str)->str:
-    try: return urlparse(u).netloc
-    except: return ""
+HTML_ENGINE = os.environ.get("HTML_ENGINE", "blocks")       # "blocks" (single pass) | "select" (legacy)
+PDF_TIMEOUT = float(os.environ.get("PDF_TIMEOUT_S", "60"))   # per-document parse budget
+PARSER_VERSION = "4"                                         # bump to re-parse pages whose bytes did not change
+FULL = os.environ.get("EXTRACT_FULL") == "1"                 # ignore stored fingerprints this run
+STRUCTURED = os.environ.get("STRUCTURED_DATA", "1") != "0"   # schema.org JSON-LD/microdata before the line scan
 
 def fetch(url):
+    """(body, html, content-type); a non-HTML body is its cached file path when there is one."""
     try:
-        r=requests.get(url,headers=UA,timeout=25,allow_redirects=True)
+        r=http_cache.get(url,headers=UA,timeout=25,max_bytes=pdf_lines.MAX_BYTES)
         if r.status_code!=200: return None, None, None
-        ct=r.headers.get("content-type","").lower()
-        return r.content, r.text if "html" in ct else None, ct
-    except: return None, None, None
-
-def norm_name(s: str) -> str:
-    """Clean up bullets/dashes/extra spaces but DO NOT strip calories here."""
-    if not s: return s
-    s = s.strip()
-    s = re.sub(r'\s*[-–—•·]+\s*', ' ', s)  # bullets/dashes → space
-    s = re.sub(r'\s+', ' ', s)            # collapse spaces
-    return s[:160]                         # safety cap
-
-def yield_items_from_html(html, url):
+        ct=r.content_type
+        if "html" in ct: return r.content, r.text, ct
+        return r.path or r.content, None, ct
+    except requests.RequestException: return None, None, None   # incl. HostDown: circuit open
+
+def is_item_line(t):
+    """A price with some name-like text in front of it."""
+    m=PRICE_RX.search(t)
+    return bool(m) and any(c.isalpha() for c in t[:m.start()])
+
+def html_texts_select(html):
+    # legacy: every matching element, nested containers included
     soup=BeautifulSoup(html,"lxml")
-    texts=[]
     for el in soup.select("h1,h2,h3,h4,h5,h6,li,p,span,div"):
         t=" ".join(el.get_text(" ",strip=True).split())
         if 3<=len(t)<=180:
-            texts.append(t)
-
-    for t in texts:
-        prices=PRICE_RX.findall(t)
-        if not prices:
-            continue
-
-        # name (before first price)
-        parts=PRICE_RX.split(t, maxsplit=1)
-        raw_name=parts[0].strip(":-•–— ")
-        name=norm_name(raw_name)
+            yield t
 
-        # price
-        try:
-            p=float(prices[0].replace("$",""))
-        except:
-            continue
+def html_texts_blocks(html):
+    for t, _tag in html_blocks.text_blocks(html, complete=is_item_line, min_len=3, max_len=180):
+        yield t
 
-        # calories (keep them)
-        kcal=None; kcal_txt=None
-        m = CAL_PAIR_RX.search(t)
-        if m:
-            try:
-                kcal = int(m.group(2))
-                kcal_txt = m.group(0)
-            except:
-                kcal = None
-                kcal_txt = m.group(0)
-
-        if name and p:
-            yield {
-                "item_name": name,
-                "item_desc": None,
-                "price": p,
-                "calories_kcal": kcal,
-                "calories_text": kcal_txt,
-                "source_url": url
-            }
-
-def yield_items_from_pdf(bin_content, url):
-    text = pdf_extract_text(io.BytesIO(bin_content)) or ""
-    lines=[ln.strip() for ln in text.splitlines() if ln.strip()]
-    for ln in lines:
-        prices=PRICE_RX.findall(ln)
-        if not prices:
-            continue
+HTML_ENGINES = {"blocks": html_texts_blocks, "select": html_texts_select}
 
-        raw_name = PRICE_RX.split(ln, maxsplit=1)[0].strip(":-•–— ")
-        name = norm_name(raw_name)
+def html_items(html, url, engine=None):
+    """(items, path): embedded schema.org menu data when the page has it ("jsonld" | "microdata"),
+    else the heuristic line scan over text blocks ("html")."""
+    if STRUCTURED:
+        rows, path = structured_menu.items(html, url)
+        if rows: return rows, path
+    texts=HTML_ENGINES[engine or HTML_ENGINE](html)
+    # calories are kept in the row; one scan per line finds name, prices and kcal
+    return list(line_scan.items_from_lines(texts, url)), "html"
 
-        # price
-        try:
-            p=float(prices[0].replace("$",""))
-        except:
-            continue
+def yield_items_from_html(html, url, engine=None):
+    yield from html_items(html, url, engine)[0]
 
-        # calories
-        kcal=None; kcal_txt=None
-        m = CAL_PAIR_RX.search(ln)
-        if m:
-            try:
-                kcal = int(m.group(2))
-                kcal_txt = m.group(0)
-            except:
-                kcal = None
-                kcal_txt = m.group(0)
-
-        if name and p:
-            yield {
-                "item_name": name,
-                "item_desc": None,
-                "price": p,
-                "calories_kcal": kcal,
-                "calories_text": kcal_txt,
-                "source_url": url
-            }
+def yield_items_from_pdf(source, url):
+    # source: path or bytes; pages are laid out one at a time, names paired with right-aligned prices
+    yield from line_scan.items_from_lines(pdf_lines.pdf_lines(source), url)
 
 def read_candidates():
+    """(root, menu_url, lastmod epoch | None) per distinct candidate URL, first file first."""
     seen=set()
     for path in CANDS:
         if not os.path.exists(path): continue
@@ -137,39 +87,181 @@ def read_candidates():
             for line in f:
                 try: j=json.loads(line)
                 except: continue
+                root=(j.get("root") or "").strip()
                 url =(j.get("menu_url") or "").strip()
                 if not url or url in seen: continue
                 seen.add(url)
-                yield url
+                try: lastmod=datetime.fromisoformat(j["lastmod"]).timestamp()
+                except (KeyError, TypeError, ValueError): lastmod=None
+                yield root, url, lastmod
 
-def main():
-    os.makedirs("data", exist_ok=True)
-    out_f=open(OUT,"w")
-    total=0; kept=0
+def parse_page(url, html, pdf):
+    """Parser worker: returns (url, items, (kind, seconds), ok). Runs in a pool process and never raises;
+    ok is False when the parse timed out or failed, so the caller keeps the page's stored items."""
+    t0=time.perf_counter()
+    kind="html" if html is not None else "pdf"
+    try:
+        with metrics.profiled(url, "parse"):
+            if html is not None:
+                items, kind = html_items(html, url)
+                return url, items, (kind, time.perf_counter()-t0), True
+            with parse_pool.time_limit(PDF_TIMEOUT):
+                return url, list(yield_items_from_pdf(pdf, url)), (kind, time.perf_counter()-t0), True
+    except parse_pool.Timeout:
+        print(f"pdf parse timed out after {PDF_TIMEOUT:.0f}s: {url}")
+    except Exception as e:
+        print(f"parse failed {url}: {e!r}")
+    return url, [], (kind, time.perf_counter()-t0), False
+
+def parser_tag():
+    return f"{PARSER_VERSION}:{HTML_ENGINE}"
 
-    for url in read_candidates():
-        total+=1
+def fingerprint(body):
+    # parser settings are part of the fingerprint so a new engine/version re-parses everything;
+    # RENDER is not: turning it on re-checks only the pages that yielded nothing (see fetched_pages)
+    h=hashlib.sha256(parser_tag().encode())
+    if isinstance(body, str):   # spooled file: hash it in chunks
+        with open(body, "rb") as f:
+            for chunk in iter(lambda: f.read(1<<16), b""):
+                h.update(chunk)
+    else:
+        h.update(body)
+    return h.hexdigest()
+
+def fetched_pages(counts, state, hashes):
+    """Network side of the pipeline: yields (url, html, pdf path|bytes) parse jobs for changed pages."""
+    for root, url, lastmod in read_candidates():
+        counts["total"]+=1
+        # 1) skip obvious third-party ordering systems
         h=host_of(url)
-        if any(h.endswith(b) for b in BAD_HOSTS): 
+        if any(h.endswith(tp) for tp in THIRDPARTY):
+            continue
+        # 2) prefer same-organization domain only
+        if root:
+            rhost=host_of(root)
+            if rhost and not same_org(h, rhost):
+                continue
+        # 3) already checkpointed by an interrupted run
+        if state.done_this_run(url):
+            counts["resumed"]+=1
+            continue
+        # with RENDER=1 a page stored with no items is parsed again even if unchanged (the render cache
+        # makes repeats cheap); pages that have items keep them whether or not they were rendered
+        recheck=render_pool.ENABLED and state.empty(url)
+        # 4) sitemap says the page has not changed since we last confirmed its items: no request at all
+        if not FULL and not recheck and lastmod and state.fresh(url, lastmod):
+            counts["unchanged"]+=1; counts["lastmod"]+=1
+            metrics.inc("not_fetched", reason="lastmod")
+            state.mark_seen(url)
             continue
 
-        bin_content, html, ct = fetch(url)
+        # 5) fetch; unchanged bytes keep their stored items (parsing happens in the pool)
+        with metrics.timer("fetch"), metrics.profiled(url, "fetch"):
+            bin_content, html, ct = fetch(url)
         if not bin_content:
+            state.mark_seen(url)   # transient failure: keep what we had
+            continue
+        fp=fingerprint(bin_content)
+        if not FULL and not (recheck and html) and state.unchanged(url, fp):
+            counts["unchanged"]+=1
+            state.mark_seen(url, confirmed=True)
             continue
+        hashes[url]=fp
+        yield url, html, (None if html else bin_content)
+        time.sleep(0.05)
 
-        if html:
-            for item in yield_items_from_html(html, url):
-                out_f.write(json.dumps(item)+"\n"); kept+=1
-        else:
-            for item in yield_items_from_pdf(bin_content, url):
-                out_f.write(json.dumps(item)+"\n"); kept+=1
+def write_delta(f, op, items):
+    for it in items:
+        f.write(json.dumps({"op": op, **it})+"\n")
 
-        if kept and kept%50==0:
-            print(f"wrote {kept} items…")
-        time.sleep(0.05)
+def export_snapshot(state):
+    """Rewrite the full items/prices files (JSONL and/or Parquet, see columnar) from the state store."""
+    with columnar.Writer(OUT, columnar.ITEMS) as items:
+        for item in state.iter_items():
+            items.write(item)
+    with columnar.Writer(PRICES_OUT, columnar.PRICES) as prices:
+        for url, med in state.iter_prices():
+            prices.write({"menu_url": url, "median_price": med, "price_bucket": bucket(med)})
+    return items.n, prices.n
+
+def main():
+    """Fetch + parse each changed candidate once; checkpoint it, emit item deltas, then snapshot."""
+    os.makedirs("data", exist_ok=True)
+    metrics.start("extract_menu_items")
+    state=extract_state.ExtractState(parser=parser_tag())
+    state.begin()
+    if state.resumed:
+        print(f"Resuming interrupted run {state.run_id} …")
+    delta_f=open(DELTA_OUT, "a")   # ops not yet applied by upsert_menu_items stay ahead of this run's
+    counts={"total":0, "resumed":0, "unchanged":0, "lastmod":0, "failed":0}; hashes={}
+    pages=0; added_n=0; removed_n=0
+    # HTML pages whose static parse found nothing go to the headless pool (RENDER=1); url -> Future of the DOM
+    render=render_pool.default(UA["User-Agent"]) if render_pool.ENABLED else None
+    rendering={}
+    paths={}   # pages by extraction path: jsonld | microdata | html | pdf
+
+    def record(url, items):
+        nonlocal pages, added_n, removed_n
+        pages+=1
+        with metrics.timer("state"):
+            current, added, removed = state.diff(url, items)
+            write_delta(delta_f, "remove", removed)
+            write_delta(delta_f, "add", added)
+            delta_f.flush()   # deltas hit disk before the checkpoint; a replay only repeats them
+            state.record(url, hashes.pop(url), current, median_price(items))
+        added_n+=len(added); removed_n+=len(removed)
+        if pages%50==0:
+            print(f"parsed {pages} pages: +{added_n} / -{removed_n} items…")
+
+    def rendered(done):
+        for url in [u for u, fut in rendering.items() if fut in done]:
+            dom=rendering.pop(url).result()
+            items, path = html_items(dom, url) if dom else ([], "html")
+            metrics.inc("items", len(items), kind="rendered")
+            metrics.inc("pages", kind="rendered", path=path)
+            record(url, items)
+
+    for url, items, (kind, secs), ok in parse_pool.imap(parse_page, fetched_pages(counts, state, hashes)):
+        metrics.observe("stage_seconds", secs, stage="parse", kind=kind)
+        if not ok:
+            # like a failed fetch: keep the stored items and hash so the next run tries again
+            hashes.pop(url)
+            state.mark_seen(url)
+            counts["failed"]+=1
+            metrics.inc("parse_failed", kind=kind)
+            continue
+        metrics.inc("items", len(items), kind=kind)
+        paths[kind]=paths.get(kind, 0)+1
+        if render and kind=="html" and not items:
+            if len(rendering) >= render.size*2:
+                rendered(wait(rendering.values(), return_when=FIRST_COMPLETED).done)
+            rendering[url]=render.submit(url, hashes[url])
+            continue
+        record(url, items)
+        if rendering:
+            rendered({fut for fut in rendering.values() if fut.done()})
 
-    out_f.close()
-    print(f"Checked {total} pages | wrote {kept} items to {OUT}")
+    if rendering:
+        rendered(wait(rendering.values()).done)
+    if render:
+        render.close()
+        print(render.summary())
+    gone=state.finish()
+    write_delta(delta_f, "remove", gone)
+    removed_n+=len(gone)
+    delta_f.close()
+    with metrics.timer("snapshot"):
+        kept, derived = export_snapshot(state)
+    state.close()
+    host_health.default().save()
+    print(f"Checked {counts['total']} pages | parsed {pages}, unchanged {counts['unchanged']} "
+          f"({counts['lastmod']} by sitemap lastmod, not fetched), "
+          f"parse failures kept {counts['failed']}, resumed past {counts['resumed']} | delta +{added_n}/-{removed_n} → {DELTA_OUT}")
+    print(f"Pages by path: {dict(sorted(paths.items()))}")
+    print(f"Snapshot ({columnar.FORMAT}): {kept} items → {OUT} | {derived} price pages → {PRICES_OUT}")
+    print(host_health.default().summary())
+    if not derived:
+        print("No prices found — next step: fill more first-party websites (CSV enrichment) or set RENDER=1 to render JS pages headless.")
 
 if __name__=="__main__":
     main()
@@ -0,0 +1,146 @@
+"""SQLite state for incremental, resumable menu extraction.
+
+Per URL we keep the content hash of the last parsed body, when its stored
+items were last confirmed against the page (parsed, or fetched unchanged), the
+parser settings that produced them, its median price and the item rows. A run is a row in
+`runs`; every candidate handled in a run is stamped with that run id and
+committed immediately, so an interrupted run resumes by skipping URLs already
+stamped. Pages whose hash is unchanged keep their stored items without being
+re-parsed. When the items of a page change, the difference is returned as
+add/remove deltas for downstream upserts (an item whose description or
+calories changed is re-added). A page whose sitemap lastmod is
+not newer than its last confirmation (under the same parser) is not fetched
+at all, see fresh().
+"""
+import os, json, time, sqlite3
+
+STATE_DB = os.environ.get("EXTRACT_STATE_DB", "data/extract_state.db")
+
+SCHEMA = """
+create table if not exists runs (
+  id integer primary key,
+  started_at real not null,
+  finished_at real
+);
+create table if not exists pages (
+  url text primary key,
+  content_hash text,
+  processed_at real,
+  item_count integer not null default 0,
+  median_price real,
+  seen_run integer,
+  parser text
+);
+create table if not exists items (
+  url text not null,
+  key text not null,
+  row text not null,
+  primary key (url, key)
+);
+"""
+
+def item_key(item):
+    # matches the upsert conflict target (restaurant_id is joined later)
+    return json.dumps([item.get("item_name"), item.get("price")])
+
+class ExtractState:
+    def __init__(self, path=STATE_DB, parser=None):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        if "parser" not in {r[1] for r in self.db.execute("pragma table_info(pages)")}:
+            self.db.execute("alter table pages add column parser text")   # databases from before lastmod skips
+        self.parser = parser   # parser settings tag stored with each parsed page
+        self.run_id = None
+        self.resumed = False
+
+    def begin(self):
+        """Resume the last unfinished run, or start a new one."""
+        row = self.db.execute("select id from runs where finished_at is null order by id desc limit 1").fetchone()
+        if row:
+            self.run_id, self.resumed = row[0], True
+        else:
+            cur = self.db.execute("insert into runs(started_at) values (?)", (time.time(),))
+            self.run_id, self.resumed = cur.lastrowid, False
+            self.db.commit()
+        return self.run_id
+
+    def done_this_run(self, url):
+        row = self.db.execute("select seen_run from pages where url=?", (url,)).fetchone()
+        return bool(row) and row[0] == self.run_id
+
+    def unchanged(self, url, content_hash):
+        row = self.db.execute("select content_hash from pages where url=?", (url,)).fetchone()
+        return bool(row) and row[0] == content_hash
+
+    def empty(self, url):
+        """True if the page was parsed and produced no items."""
+        row = self.db.execute("select item_count from pages where url=? and content_hash is not null", (url,)).fetchone()
+        return bool(row) and row[0] == 0
+
+    def fresh(self, url, lastmod):
+        """True if the stored items were confirmed at or after `lastmod` (epoch) by the current parser."""
+        row = self.db.execute("select processed_at, parser from pages where url=? and content_hash is not null",
+                              (url,)).fetchone()
+        return bool(row) and row[0] is not None and row[0] >= lastmod and row[1] == self.parser
+
+    def mark_seen(self, url, confirmed=False):
+        """Checkpoint a URL whose stored items stay as they are (unchanged or fetch failed).
+
+        confirmed: the page was fetched and its bytes matched, so processed_at moves to now."""
+        if confirmed:
+            self.db.execute("update pages set seen_run=?, processed_at=? where url=?", (self.run_id, time.time(), url))
+        else:
+            self.db.execute(
+                "insert into pages(url, seen_run) values (?,?) on conflict(url) do update set seen_run=excluded.seen_run",
+                (url, self.run_id))
+        self.db.commit()
+
+    def diff(self, url, items):
+        """Compare freshly parsed items to the stored ones: (current, added, removed).
+
+        `current` is keyed by item_key, first occurrence wins. An item whose key is
+        stored but whose other fields (description, calories) changed counts as added."""
+        new = {}
+        for it in items:
+            new.setdefault(item_key(it), it)
+        old = dict(self.db.execute("select key,row from items where url=?", (url,)).fetchall())
+        added = [new[k] for k in new if k not in old or json.loads(old[k]) != new[k]]
+        removed = [json.loads(old[k]) for k in old if k not in new]
+        return new, added, removed
+
+    def record(self, url, content_hash, new, median):
+        """Checkpoint a parsed page with its current items (as returned by diff)."""
+        old = [k for (k,) in self.db.execute("select key from items where url=?", (url,))]
+        with self.db:
+            self.db.execute(
+                "insert into pages(url, content_hash, processed_at, item_count, median_price, seen_run, parser) "
+                "values (?,?,?,?,?,?,?) on conflict(url) do update set content_hash=excluded.content_hash, "
+                "processed_at=excluded.processed_at, item_count=excluded.item_count, "
+                "median_price=excluded.median_price, seen_run=excluded.seen_run, parser=excluded.parser",
+                (url, content_hash, time.time(), len(new), median, self.run_id, self.parser))
+            self.db.executemany("delete from items where url=? and key=?", [(url, k) for k in old if k not in new])
+            self.db.executemany("insert or replace into items(url,key,row) values (?,?,?)",
+                                [(url, k, json.dumps(it)) for k, it in new.items()])
+
+    def finish(self):
+        """Drop pages no longer among the candidates; return their items as removals."""
+        gone = [u for (u,) in self.db.execute(
+            "select url from pages where seen_run is null or seen_run<>?", (self.run_id,))]
+        removed = []
+        with self.db:
+            for url in gone:
+                removed.extend(json.loads(r) for (r,) in self.db.execute("select row from items where url=?", (url,)))
+                self.db.execute("delete from items where url=?", (url,))
+                self.db.execute("delete from pages where url=?", (url,))
+            self.db.execute("update runs set finished_at=? where id=?", (time.time(), self.run_id))
+        return removed
+
+    def iter_items(self):
+        for (row,) in self.db.execute("select row from items order by url, rowid"):
+            yield json.loads(row)
+
+    def iter_prices(self):
+        yield from self.db.execute("select url, median_price from pages where median_price is not null order by url")
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,160 @@
+"""Address geocoding with a persistent cache and pluggable backends.
+
+Results are cached in SQLite by normalized address, including misses
+(negative entries expire after NEGATIVE_TTL so they get retried eventually).
+Transport errors are never cached. Backends:
+
+  nominatim  public nominatim.openstreetmap.org, 1 request/second, 1 at a time
+  local      self-hosted Nominatim at GEOCODER_URL, no pacing, GEOCODER_CONCURRENCY at once
+  stub       no network: deterministic fake coordinates for load tests (never cached)
+"""
+import os, re, time, sqlite3, hashlib, threading, requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+
+BACKEND = os.environ.get("GEOCODER", "nominatim")
+GEOCODER_URL = os.environ.get("GEOCODER_URL", "http://localhost:8080")
+CONCURRENCY = int(os.environ.get("GEOCODER_CONCURRENCY", "16"))
+CACHE_DB = os.environ.get("GEOCODE_CACHE_DB", "data/geocode_cache.db")
+NEGATIVE_TTL = float(os.environ.get("GEOCODE_NEGATIVE_TTL_D", "30")) * 86400
+UA = "FareWare/0.1 (contact: send.ishan@gmail.com)"
+
+_PUNCT = re.compile(r"[^\w#\s]")
+
+class LookupFailed(Exception):
+    """The geocoding service could not answer (transport or HTTP error), as opposed to "no match"."""
+
+def normalize_address(addr):
+    """Case/punctuation/whitespace-insensitive cache key."""
+    return " ".join(_PUNCT.sub(" ", (addr or "").lower()).split())
+
+class RateLimiter:
+    """At most `rate` starts per second across threads (rate<=0: unlimited)."""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+
+    def wait(self):
+        if not self.interval: return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_at)
+            self.next_at = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+class Nominatim:
+    def __init__(self, base, rate, concurrency):
+        self.url = base.rstrip("/") + "/search"
+        self.limiter = RateLimiter(rate)
+        self.concurrency = concurrency
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = UA
+        self.cacheable = True
+
+    def lookup(self, addr):
+        """(lat, lon) or None when the service has no match; raises on transport errors."""
+        self.limiter.wait()
+        r = self.session.get(self.url, params={"q": addr, "format": "json", "limit": 1}, timeout=30)
+        r.raise_for_status()
+        j = r.json()
+        if not j: return None
+        return float(j[0]["lat"]), float(j[0]["lon"])
+
+class Stub:
+    concurrency = 64
+    cacheable = False
+
+    def lookup(self, addr):
+        h = int(hashlib.sha1(addr.encode()).hexdigest()[:12], 16)
+        return 25.0 + (h % 2_400_000) / 100_000, -124.0 + (h // 2_400_000 % 5_700_000) / 100_000
+
+def backend(name=BACKEND):
+    if name == "nominatim":
+        return Nominatim("https://nominatim.openstreetmap.org", rate=0.9, concurrency=1)
+    if name == "local":
+        return Nominatim(GEOCODER_URL, rate=0, concurrency=CONCURRENCY)
+    if name == "stub":
+        return Stub()
+    raise ValueError(f"unknown GEOCODER {name!r} (nominatim|local|stub)")
+
+class GeocodeCache:
+    def __init__(self, path=CACHE_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("""create table if not exists geocodes (
+            addr text primary key, lat real, lon real, found integer not null, fetched_at real not null)""")
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """(hit, coords): coords is None for a cached miss."""
+        with self.lock:
+            row = self.db.execute("select lat, lon, found, fetched_at from geocodes where addr=?", (key,)).fetchone()
+        if not row: return False, None
+        lat, lon, found, at = row
+        if not found:
+            return (time.time() - at < NEGATIVE_TTL), None
+        return True, (lat, lon)
+
+    def put(self, key, coords):
+        with self.lock:
+            self.db.execute("insert or replace into geocodes values (?,?,?,?,?)",
+                            (key, *(coords or (None, None)), int(coords is not None), time.time()))
+            self.db.commit()
+
+class Geocoder:
+    def __init__(self, backend_name=BACKEND, cache=None):
+        self.backend = backend(backend_name)
+        self.cache = cache or GeocodeCache()
+        self.stats = {"cached": 0, "cached_miss": 0, "looked_up": 0, "not_found": 0, "errors": 0}
+        metrics.track("geocode", self.stats)
+
+    def geocode(self, addr, strict=False):
+        """(lat, lon) or (None, None); with strict, a failed lookup raises LookupFailed instead."""
+        key = normalize_address(addr)
+        if not key: return None, None
+        hit, coords = self.cache.get(key)
+        if hit:
+            self.stats["cached" if coords else "cached_miss"] += 1
+            return coords or (None, None)
+        try:
+            with metrics.timer("geocode_lookup", backend=type(self.backend).__name__.lower()):
+                coords = self.backend.lookup(addr)
+        except (requests.RequestException, ValueError) as e:
+            self.stats["errors"] += 1
+            print(f"geocode error ({e.__class__.__name__}) for {addr!r}")
+            if strict:
+                raise LookupFailed(f"{addr!r}: {e!r}") from e
+            return None, None
+        self.stats["looked_up"] += 1
+        if coords is None: self.stats["not_found"] += 1
+        if self.backend.cacheable:
+            self.cache.put(key, coords)
+        return coords or (None, None)
+
+    def stream(self, pairs, window=None, strict=False):
+        """Lazily geocode (payload, addr) pairs; yields (payload, (lat, lon)) in input order.
+
+        At most `window` lookups are queued ahead of the consumer, and an address
+        already in flight is not looked up twice. With strict, the pair whose
+        lookup failed raises LookupFailed when its turn comes."""
+        window = window or self.backend.concurrency * 4
+        with ThreadPoolExecutor(self.backend.concurrency) as ex:
+            queue = deque()
+            inflight = {}
+            def pop():
+                payload, key, fut = queue.popleft()
+                if inflight.get(key) is fut: del inflight[key]
+                return payload, fut.result()
+            for payload, addr in pairs:
+                key = normalize_address(addr)
+                fut = inflight.get(key)
+                if fut is None:
+                    fut = inflight[key] = ex.submit(self.geocode, addr, strict)
+                queue.append((payload, key, fut))
+                while len(queue) >= window or (queue and queue[0][2].done()):
+                    yield pop()
+            while queue:
+                yield pop()
@@ -1,10 +1,9 @@
-import os, requests, json, time
+import os, json, secrets, asyncio, aiohttp
+import lxml.html
+import time
+import http_cache, host_health, metrics, supa
+from domains import registrable
 from urllib.parse import urljoin, urlparse
-from dotenv import load_dotenv
-
-load_dotenv(".env")
-URL = os.environ["SUPABASE_URL"].rstrip("/")
-KEY = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
 
 # Common menu paths to probe
 PATHS = [
@@ -14,8 +13,27 @@ PATHS = [
 ]
 
 OUT = "data/menu_candidates_guessed.jsonl"
+PATH_STATS = "data/probe_path_stats.json"   # {path: [hits, tries]} across runs; orders PATHS
 UA = {"User-Agent": "FareWare/0.1 (+contact: send.ishan@gmail.com)"}
 
+# Politeness: many domains in parallel, but each origin only sees a trickle
+CONCURRENCY   = int(os.environ.get("PROBE_CONCURRENCY", "64"))        # probes in flight overall
+PER_HOST      = int(os.environ.get("PROBE_PER_HOST", "2"))            # probes in flight per registrable domain
+HOST_INTERVAL = float(os.environ.get("PROBE_HOST_INTERVAL", "0.5"))   # min seconds between probe starts per domain
+SITE_WINDOW   = CONCURRENCY * 4                                       # sites scheduled at once (bounds memory)
+
+# Adaptive probing: homepage links first, stop once a site has given up its menus
+MENU_WORDS = ("menu", "food", "dinner", "lunch", "brunch", "breakfast", "drinks", "dining", "carta")
+MAX_LINKS = int(os.environ.get("PROBE_MAX_LINKS", "6"))          # homepage links probed per site
+MAX_HITS  = int(os.environ.get("PROBE_MAX_HITS", "2"))           # menus per site before we stop
+HOME_MAX_BYTES = 512 * 1024
+HEAD_REFUSED = (403, 405, 501)
+HOST_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)   # count against the host's circuit
+CANARY_PREFIX = "fareware-canary-"
+
+HEAD_TIMEOUT = aiohttp.ClientTimeout(total=10)
+GET_TIMEOUT  = aiohttp.ClientTimeout(total=15)
+
 def normalize_site(u: str) -> str:
     u = (u or "").strip()
     if not u: return ""
@@ -24,45 +42,247 @@ def normalize_site(u: str) -> str:
     p = urlparse(u)
     return f"{p.scheme}://{p.netloc}"
 
+class HostGate:
+    """Per-domain connection cap plus minimum spacing between probe starts."""
+    def __init__(self, conns, interval):
+        self.sem = asyncio.Semaphore(conns)
+        self.interval = interval
+        self.next_at = 0.0
+
+    async def __aenter__(self):
+        await self.sem.acquire()
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self.next_at)   # reserve the next slot before sleeping
+        self.next_at = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def __aexit__(self, *exc):
+        self.sem.release()
+
+def trace_config():
+    """aiohttp hooks that time DNS lookups and new connections (TCP + TLS)."""
+    def timed(stage):
+        async def on_start(session, ctx, params):
+            setattr(ctx, stage, time.perf_counter())
+        async def on_end(session, ctx, params):
+            metrics.observe("stage_seconds", time.perf_counter() - getattr(ctx, stage), stage=stage)
+        return on_start, on_end
+    tc = aiohttp.TraceConfig()
+    dns_start, dns_end = timed("dns")
+    conn_start, conn_end = timed("connect")
+    tc.on_dns_resolvehost_start.append(dns_start)
+    tc.on_dns_resolvehost_end.append(dns_end)
+    tc.on_connection_create_start.append(conn_start)
+    tc.on_connection_create_end.append(conn_end)
+    return tc
+
+def is_menu_ct(ct):
+    return ("text/html" in ct) or ct.endswith("/pdf") or ("pdf" in ct)
+
+async def probe(session, url, cache=None):
+    """Return the content-type of a reachable URL, or None.
+
+    With a cache, fresh entries skip the network, stale ones are revalidated,
+    and bodies we had to GET anyway are stored for the extractors."""
+    entry = cache.lookup(url) if cache else None
+    if entry and entry.fresh(cache.fresh_ttl):
+        cache.stats["hit"] += 1
+        return entry.content_type
+    cond = cache.conditional_headers(entry) if cache else {}
+    health = host_health.default()
+    t0 = time.monotonic()
+    try:
+        # HEAD first (cheap); GET only if the server refuses HEAD or omits the content-type
+        async with session.head(url, headers=cond, allow_redirects=True, timeout=HEAD_TIMEOUT) as resp:
+            status, ct = resp.status, resp.headers.get("content-type")
+        if status in HEAD_REFUSED or (ct is None and status < 300):
+            async with session.get(url, headers=cond, allow_redirects=True, timeout=GET_TIMEOUT) as resp:
+                status, ct = resp.status, resp.headers.get("content-type")
+                if cache and status == 200 and is_menu_ct((ct or "").lower()):
+                    cache.store(url, await resp.read(), ct,
+                                resp.headers.get("etag"), resp.headers.get("last-modified"))
+                    cache.stats["miss"] += 1
+                else:
+                    resp.close()   # headers were all we wanted; drop the body unread
+    except HOST_ERRORS as e:
+        health.failure(url)
+        metrics.inc("probe_errors", host=registrable(urlparse(url).hostname or ""), kind=type(e).__name__)
+        return None
+    except Exception:
+        return None
+    health.success(url, time.monotonic() - t0)
+    metrics.observe("probe_seconds", time.monotonic() - t0, host=registrable(urlparse(url).hostname or ""))
+    if status == 304 and entry:
+        cache.touch(url)
+        cache.stats["revalidated"] += 1
+        return entry.content_type
+    if status >= 400: return None
+    return (ct or "").lower()
+
+def ranked_paths(stats):
+    """PATHS by smoothed historical hit rate; untried paths keep their listed order."""
+    def rate(p):
+        hits, tries = stats.get(p, (0, 0))
+        return (hits + 1) / (tries + 2)
+    return sorted(PATHS, key=rate, reverse=True)
+
+def load_path_stats():
+    try:
+        with open(PATH_STATS) as f:
+            return {p: tuple(v) for p, v in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+
+def save_path_stats(stats):
+    with open(PATH_STATS + ".tmp", "w") as f:
+        json.dump(stats, f, sort_keys=True)
+    os.replace(PATH_STATS + ".tmp", PATH_STATS)
+
+def harvest_links(html, page_url):
+    """Same-site links whose href or anchor text looks like a menu, in page order."""
+    try:
+        doc = lxml.html.fromstring(html)
+    except (ValueError, lxml.etree.ParserError):
+        return []
+    site = registrable(urlparse(page_url).hostname or "")
+    links = []
+    for a in doc.iter("a"):
+        href = (a.get("href") or "").strip()
+        if not href or href.startswith(("#", "mailto:", "tel:", "javascript:")): continue
+        url = urljoin(page_url, href).split("#", 1)[0]
+        p = urlparse(url)
+        if p.scheme not in ("http", "https") or registrable(p.hostname or "") != site: continue
+        if p.path.rstrip("/") in ("", urlparse(page_url).path.rstrip("/")): continue
+        text = (p.path + " " + a.text_content()).lower()
+        if any(w in text for w in MENU_WORDS) and url not in links:
+            links.append(url)
+            if len(links) >= MAX_LINKS: break
+    return links
+
+async def fetch_home(session, base):
+    """(html, final url) of the homepage, truncated to HOME_MAX_BYTES; ("", base) on failure."""
+    health = host_health.default()
+    t0 = time.monotonic()
+    try:
+        async with session.get(base, allow_redirects=True, timeout=GET_TIMEOUT) as resp:
+            health.success(base, time.monotonic() - t0)
+            if resp.status >= 400 or "html" not in resp.headers.get("content-type", "").lower():
+                return "", base
+            body = await resp.content.read(HOME_MAX_BYTES)
+            resp.close()   # don't drain the rest of a huge page
+            return body.decode(resp.charset or "utf-8", "replace"), str(resp.url)
+    except HOST_ERRORS:
+        health.failure(base)
+    except Exception:
+        pass
+    return "", base
+
+async def probe_site(session, base, gate, slots, cache, stats):
+    """Probe one site: menu links from the homepage first, then PATHS by past hit rate.
+
+    Stops once MAX_HITS menus are found. A site that answers a random path with
+    HTML serves 200 for everything, so blind path guesses there are skipped.
+    Once the host's circuit is open the remaining URLs are dropped unsent.
+    Returns (records, requests made)."""
+    health = host_health.default()
+    async def gated(fn, *args):
+        async with gate:           # wait for the domain first so we never sit on a global slot
+            async with slots:
+                return await fn(*args)
+
+    if not health.allow(base):
+        return [], 0
+    html, home = await gated(fetch_home, session, base)
+    canary = urljoin(base, f"/{CANARY_PREFIX}{secrets.token_hex(6)}")
+    catch_all = is_menu_ct(await gated(probe, session, canary) or "")
+    n = 2
+    found, seen = [], set()
+
+    async def try_urls(urls, via):
+        nonlocal n
+        for i in range(0, len(urls), PER_HOST):
+            if len(found) >= MAX_HITS or not health.allow(base): return
+            wave = [(u, p) for u, p in urls[i:i + PER_HOST] if u not in seen]
+            seen.update(u for u, _ in wave)
+            cts = await asyncio.gather(*(gated(probe, session, u, cache) for u, _ in wave))
+            n += len(wave)
+            for (url, path), ct in zip(wave, cts):
+                hit = ct is not None and is_menu_ct(ct)
+                if path:
+                    hits, tries = stats.get(path, (0, 0))
+                    stats[path] = (hits + hit, tries + 1)
+                if hit:
+                    found.append({"root": base, "menu_url": url, "content_type": ct, "via": via})
+
+    if html:
+        await try_urls([(u, None) for u in harvest_links(html, home)], "link")
+    if not catch_all:
+        await try_urls([(urljoin(base, p), p) for p in ranked_paths(stats)], "path")
+    return found, n
+
+async def run(sites, f):
+    slots = asyncio.Semaphore(CONCURRENCY)
+    cache = http_cache.default() if http_cache.ENABLED else None
+    gates = {}
+    stats = load_path_stats()
+    total = 0
+    hits = 0
+    scheduled = 0
+    conn = aiohttp.TCPConnector(limit=CONCURRENCY, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(headers=UA, connector=conn, trace_configs=[trace_config()]) as session:
+        pending = set()
+
+        def drain(done):
+            nonlocal hits, total
+            for t in done:
+                found, n = t.result()
+                total += n
+                metrics.inc("probes", n)
+                for rec in found:
+                    f.write(json.dumps(rec) + "\n")
+                    metrics.inc("menus_found", via=rec["via"])
+                    hits += 1
+
+        for base in sites:
+            if not base: continue
+            if len(pending) >= SITE_WINDOW:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                drain(done)
+            dom = registrable(urlparse(base).hostname or "") or base
+            metrics.inc("sites")
+            gate = gates.setdefault(dom, HostGate(PER_HOST, HOST_INTERVAL))
+            pending.add(asyncio.create_task(probe_site(session, base, gate, slots, cache, stats)))
+            scheduled += 1
+            if scheduled % 500 == 0:
+                print(f"scheduled {scheduled} sites, {total} probes, {hits} hits so far …")
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            drain(done)
+    save_path_stats(stats)
+    host_health.default().save()
+    print(host_health.default().summary())
+    if cache:
+        print(f"cache: {cache.stats}")
+    return total, hits
+
 def main():
     os.makedirs("data", exist_ok=True)
+    metrics.start("guess_menu_urls")
 
     # Pull all websites from DB
-    r = requests.get(
-        f"{URL}/rest/v1/restaurants",
-        headers={"apikey": KEY, "Authorization": f"Bearer {KEY}"},
-        params={"select": "website", "website": "not.is.null"},
-        timeout=60
-    )
-    r.raise_for_status()
-    sites = sorted({normalize_site(row.get("website")) for row in r.json() if row.get("website")})
+    rows = supa.client().select("restaurants", "website", website="not.is.null")
+    sites = sorted({normalize_site(row.get("website")) for row in rows if row.get("website")})
     if not sites:
         print("No websites found. Consider running website enrichment first.")
         return
 
-    print(f"Testing {len(sites)} sites × {len(PATHS)} paths …")
-    total = 0
-    hits = 0
+    print(f"Testing {len(sites)} sites (homepage links, then up to {len(PATHS)} paths) "
+          f"({CONCURRENCY} in flight, {PER_HOST}/domain every {HOST_INTERVAL}s) …")
     with open(OUT, "w") as f:
-        for base in sites:
-            if not base: continue
-            for path in PATHS:
-                total += 1
-                url = urljoin(base, path)
-                try:
-                    # HEAD first (cheap), fallback to GET if server refuses HEAD
-                    resp = requests.head(url, headers=UA, timeout=10, allow_redirects=True)
-                    if resp.status_code >= 400 or ('content-type' not in resp.headers):
-                        resp = requests.get(url, headers=UA, timeout=15, allow_redirects=True)
-                    if resp.status_code < 400:
-                        ct = resp.headers.get("content-type","").lower()
-                        if ("text/html" in ct) or ct.endswith("/pdf") or ("pdf" in ct):
-                            f.write(json.dumps({"root": base, "menu_url": url, "content_type": ct}) + "\n")
-                            hits += 1
-                except Exception:
-                    pass
-                time.sleep(0.1)  # gentle pacing
-    print(f"Probed {total} URLs → found {hits} candidate menu pages")
+        total, hits = asyncio.run(run(sites, f))
+    print(f"Probed {total} URLs ({total / len(sites):.1f}/site) → found {hits} candidate menu pages")
     print(f"Wrote: {OUT}")
 
 if __name__ == "__main__":
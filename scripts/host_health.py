@@ -0,0 +1,89 @@
+"""Per-host circuit breaker shared by the fetchers and the prober.
+
+Hosts are keyed by registrable domain. FAIL_THRESHOLD consecutive connect
+failures or timeouts open the circuit: further URLs on that host are skipped
+without touching the network until the cool-down passes. Requests are then
+let through again (half-open): a success closes the circuit, while the first
+failure reopens it with the cool-down doubled, up to MAX_COOLDOWN. Open
+circuits are persisted to STATE_PATH, so a host that was dead in the last run
+is not retried until its cool-down is over. HTTP error statuses are answers,
+not failures, and never count against a host.
+"""
+import os, json, time, threading
+import metrics
+from domains import site_key
+
+STATE_PATH = os.environ.get("HOST_HEALTH_PATH", "data/host_health.json")
+FAIL_THRESHOLD = int(os.environ.get("HOST_FAIL_THRESHOLD", "3"))
+COOLDOWN = float(os.environ.get("HOST_COOLDOWN_H", "6")) * 3600
+MAX_COOLDOWN = 7 * 86400
+SLOW_S = float(os.environ.get("HOST_SLOW_S", "8"))   # a response slower than this marks the host slow
+ENABLED = os.environ.get("HOST_BREAKER", "1") != "0"
+
+class HostHealth:
+    def __init__(self, path=STATE_PATH, threshold=FAIL_THRESHOLD, cooldown=COOLDOWN):
+        self.path = path
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.hosts = {}   # host -> {"fails", "opens", "open_until"}
+        self.failed, self.slow, self.skipped_hosts = set(), set(), set()
+        self.stats = {"skipped": 0, "failures": 0, "opened": 0}
+        try:
+            with open(path) as f:
+                self.hosts = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def allow(self, url):
+        """False while the host's circuit is open; counts the skip."""
+        if not ENABLED: return True
+        host = site_key(url)
+        with self.lock:
+            h = self.hosts.get(host)
+            if not h or h.get("open_until", 0) <= time.time():
+                return True
+            self.stats["skipped"] += 1
+            self.skipped_hosts.add(host)
+            return False
+
+    def success(self, url, elapsed=0.0):
+        host = site_key(url)
+        with self.lock:
+            self.hosts.pop(host, None)
+            if elapsed > SLOW_S:
+                self.slow.add(host)
+                metrics.inc("slow_responses", host=host)
+
+    def failure(self, url):
+        """Record a connect failure/timeout; opens the circuit at the threshold."""
+        host = site_key(url)
+        with self.lock:
+            self.stats["failures"] += 1
+            self.failed.add(host)
+            h = self.hosts.setdefault(host, {"fails": 0, "opens": 0, "open_until": 0})
+            h["fails"] += 1
+            if h["fails"] >= self.threshold and h["open_until"] <= time.time():
+                h["open_until"] = time.time() + min(MAX_COOLDOWN, self.cooldown * 2 ** h["opens"])
+                h["opens"] += 1
+                self.stats["opened"] += 1
+
+    def summary(self):
+        return (f"hosts: {len(self.failed)} failed, {self.stats['opened']} circuits opened, "
+                f"{len(self.skipped_hosts)} skipped ({self.stats['skipped']} URLs), {len(self.slow)} slow")
+
+    def save(self):
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path + ".tmp", "w") as f:
+                json.dump(self.hosts, f)
+            os.replace(self.path + ".tmp", self.path)
+
+_default = None
+
+def default():
+    global _default
+    if _default is None:
+        _default = HostHealth()
+        metrics.track("host_health", _default.stats)
+    return _default
@@ -0,0 +1,104 @@
+"""Single-pass text-block extraction for menu pages.
+
+Selecting every div/span/p/li and calling get_text() re-serializes the same
+text once per ancestor, which is quadratic in DOM depth on builder-generated
+pages and yields the same line many times. This walks the lxml tree once:
+inline text is attributed to its nearest block element, each block's text is
+emitted when the block closes, and a parent only re-emits the combined text of
+its children when that adds something (e.g. name and price in sibling divs).
+Lines that already form a complete item are not merged upward again; the
+parent emits its own text plus the rest of its children's (e.g. a dish whose
+modifiers are priced in a nested list).
+"""
+import lxml.etree, lxml.html
+
+BLOCK = frozenset("""
+address article aside blockquote body caption dd details div dl dt fieldset figcaption
+figure footer form h1 h2 h3 h4 h5 h6 header hr html li main nav ol p pre section summary
+table tbody td tfoot th thead tr ul
+""".split())
+SKIP = frozenset(["head", "script", "style", "noscript", "template", "svg", "iframe", "select"])
+
+class _Frame:
+    __slots__ = ("tag", "parts", "size", "over", "own", "kids", "complete")
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.parts = []       # normalized text runs, in document order, minus complete child lines
+        self.size = 0
+        self.over = False     # longer than max_len: never emitted, neither are ancestors
+        self.own = 0          # runs that are this block's own (inline) text
+        self.kids = 0         # runs contributed by closed child blocks
+        self.complete = False # some descendant already emitted a complete item line
+
+def _parse(html):
+    """Root element, or None for a document with no elements (only comments or PIs)."""
+    try:
+        try:
+            return lxml.html.document_fromstring(html)
+        except ValueError:  # str with an <?xml encoding?> declaration
+            return lxml.html.document_fromstring(html.encode("utf-8"))
+    except lxml.etree.ParserError:  # "Document is empty"
+        return None
+
+def text_blocks(html, complete=None, min_len=3, max_len=180):
+    """Yield (text, tag) for each block, children before parents, in linear time.
+
+    `complete(text)` marks lines that already form a full item; ancestors of such
+    a block leave that text out of what they emit, so a parent with no other
+    text emits nothing."""
+    if not html or not html.strip():
+        return
+    root = _parse(html)
+    if root is None:
+        return
+    frames = [_Frame("#document")]
+
+    def add(frame, s, own):
+        if frame.over: return
+        s = " ".join(s.split())
+        if not s: return
+        frame.parts.append(s)
+        frame.size += len(s) + 1
+        if own: frame.own += 1
+        else: frame.kids += 1
+        if frame.size > max_len + 1:
+            frame.over = True
+            frame.parts = []
+
+    todo = [(root, False)]
+    while todo:
+        el, leaving = todo.pop()
+        if leaving:
+            if el.tag in BLOCK:
+                fr = frames.pop()
+                parent = frames[-1]
+                if fr.over:
+                    parent.over, parent.parts = True, []
+                elif fr.parts:
+                    text = " ".join(fr.parts)
+                    done = False
+                    # a wrapper around exactly one child block would repeat it verbatim
+                    if not (fr.own == 0 and fr.kids == 1) and min_len <= len(text):
+                        yield text, fr.tag
+                        done = complete is not None and complete(text)
+                    if done:
+                        fr.complete = True
+                    else:
+                        add(parent, text, False)
+                parent.complete = parent.complete or fr.complete
+            if el.tail:
+                add(frames[-1], el.tail, True)
+            continue
+
+        tag = el.tag if isinstance(el.tag, str) else None
+        if tag is None or tag in SKIP:   # comments, PIs, scripts: only their tail is text
+            if el.tail:
+                add(frames[-1], el.tail, True)
+            continue
+        if tag in BLOCK:
+            frames.append(_Frame(tag))
+        if el.text:
+            add(frames[-1], el.text, True)
+        todo.append((el, True))
+        todo.extend((child, False) for child in reversed(el))
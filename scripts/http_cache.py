@@ -0,0 +1,294 @@
+"""On-disk HTTP response cache shared by the fetchers.
+
+Bodies are stored content-addressed (sha256) under CACHE_DIR/objects, with a
+small SQLite index keyed by URL holding content-type, ETag/Last-Modified and
+timestamps. Fresh entries are served without touching the network; stale ones
+are revalidated with If-None-Match/If-Modified-Since so an unchanged page costs
+a 304. Downloads are streamed to the object store in chunks and responses
+read their body back lazily, so a large PDF is never held in memory just to be
+cached; `Fetched.path` lets callers hand the file itself to a parser. The
+index is trimmed least-recently-used first once it exceeds MAX_BYTES.
+Network requests go through the host circuit breaker (host_health); a URL on a
+host whose circuit is open raises HostDown without a request being made.
+"""
+import os, time, sqlite3, hashlib, threading, requests
+import host_health, metrics
+from domains import site_key
+
+CACHE_DIR = os.environ.get("FETCH_CACHE_DIR", "data/http_cache")
+MAX_BYTES = int(os.environ.get("FETCH_CACHE_MAX_MB", "2048")) * 1024 * 1024
+FRESH_TTL = float(os.environ.get("FETCH_CACHE_FRESH_S", str(6 * 3600)))       # serve w/o revalidating
+EXPIRE_TTL = float(os.environ.get("FETCH_CACHE_EXPIRE_S", str(30 * 86400)))   # drop if unused this long
+ENABLED = os.environ.get("FETCH_CACHE", "1") != "0"
+CHUNK = 64 * 1024
+
+SCHEMA = """
+create table if not exists entries (
+  url text primary key,
+  sha text not null,
+  size integer not null,
+  content_type text,
+  etag text,
+  last_modified text,
+  fetched_at real not null,
+  accessed_at real not null
+);
+create index if not exists entries_accessed on entries(accessed_at);
+create index if not exists entries_sha on entries(sha);
+"""
+
+class HostDown(requests.ConnectionError):
+    """The host's circuit is open; no request was sent."""
+
+class TooLarge(requests.RequestException):
+    """The body exceeded the caller's max_bytes; the download was abandoned."""
+
+def _check_length(r, max_bytes):
+    n = r.headers.get("content-length", "")
+    if max_bytes and n.isdigit() and int(n) > max_bytes:
+        r.close()
+        raise TooLarge(f"{r.url}: {n} bytes")
+
+def send(session, url, headers=None, timeout=25, **kw):
+    """GET through the host circuit breaker; connect failures and timeouts count against the host."""
+    health = host_health.default()
+    if not health.allow(url):
+        raise HostDown(url)
+    t0 = time.monotonic()
+    try:
+        r = session.get(url, headers=headers, timeout=timeout, allow_redirects=True, **kw)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        health.failure(url)
+        metrics.inc("fetch_errors", host=site_key(url), kind=type(e).__name__)
+        raise
+    elapsed = time.monotonic() - t0
+    health.success(url, elapsed)
+    metrics.observe("fetch_headers_seconds", elapsed, host=site_key(url))   # DNS + connect/TLS + server wait
+    return r
+
+def _download(chunks, url):
+    """Wrap a body iterator to time the transfer and count its bytes."""
+    t0 = time.monotonic()
+    n = 0
+    for chunk in chunks:
+        n += len(chunk)
+        yield chunk
+    metrics.observe("fetch_body_seconds", time.monotonic() - t0, host=site_key(url))
+    metrics.inc("bytes_in", n, host=site_key(url))
+
+class Fetched:
+    """Minimal response: what our fetchers read off a requests.Response.
+
+    A cached body is read from `path` on first access to `content`."""
+    __slots__ = ("url", "status_code", "_content", "content_type", "source", "path")
+
+    def __init__(self, url, status_code, content=b"", content_type="", source="miss", path=None):
+        self.url = url
+        self.status_code = status_code
+        self._content = content
+        self.content_type = (content_type or "").lower()
+        self.source = source   # "hit" | "revalidated" | "miss" | "error"
+        self.path = path
+
+    @property
+    def content(self):
+        if self._content is None:
+            with open(self.path, "rb") as f:
+                self._content = f.read()
+        return self._content
+
+    @property
+    def text(self):
+        enc = "utf-8"
+        for part in self.content_type.split(";"):
+            k, _, v = part.strip().partition("=")
+            if k == "charset" and v:
+                enc = v.strip('"\' ')
+        try:
+            return self.content.decode(enc, errors="replace")
+        except LookupError:
+            return self.content.decode("utf-8", errors="replace")
+
+class Entry:
+    __slots__ = ("url", "sha", "size", "content_type", "etag", "last_modified", "fetched_at")
+
+    def __init__(self, url, sha, size, content_type, etag, last_modified, fetched_at):
+        self.url, self.sha, self.size = url, sha, size
+        self.content_type, self.etag, self.last_modified = content_type, etag, last_modified
+        self.fetched_at = fetched_at
+
+    def fresh(self, ttl=FRESH_TTL):
+        return time.time() - self.fetched_at < ttl
+
+class FetchCache:
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_BYTES, fresh_ttl=FRESH_TTL, expire_ttl=EXPIRE_TTL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.fresh_ttl = fresh_ttl
+        self.expire_ttl = expire_ttl
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, "index.db"), check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.total = self.db.execute("select coalesce(sum(size),0) from entries").fetchone()[0]
+        self.stats = {"hit": 0, "revalidated": 0, "miss": 0, "error": 0}
+
+    # --- storage primitives (usable from sync or async callers) ---
+
+    def _path(self, sha):
+        return os.path.join(self.root, "objects", sha[:2], sha)
+
+    def lookup(self, url):
+        with self.lock:
+            row = self.db.execute(
+                "select url,sha,size,content_type,etag,last_modified,fetched_at from entries where url=?",
+                (url,)).fetchone()
+            if not row:
+                return None
+            e = Entry(*row)
+            if time.time() - e.fetched_at > self.expire_ttl or not os.path.exists(self._path(e.sha)):
+                self._drop(url, e.sha)
+                self.db.commit()
+                return None
+            self.db.execute("update entries set accessed_at=? where url=?", (time.time(), url))
+            self.db.commit()
+            return e
+
+    def body(self, entry):
+        with open(self._path(entry.sha), "rb") as f:
+            return f.read()
+
+    def conditional_headers(self, entry):
+        h = {}
+        if entry is None: return h
+        if entry.etag: h["If-None-Match"] = entry.etag
+        if entry.last_modified: h["If-Modified-Since"] = entry.last_modified
+        return h
+
+    def touch(self, url):
+        """Mark an entry as just revalidated (304)."""
+        now = time.time()
+        with self.lock:
+            self.db.execute("update entries set fetched_at=?, accessed_at=? where url=?", (now, now, url))
+            self.db.commit()
+
+    def store(self, url, body, content_type="", etag=None, last_modified=None):
+        return self.store_stream(url, (body,), content_type, etag, last_modified)
+
+    def store_stream(self, url, chunks, content_type="", etag=None, last_modified=None, max_bytes=None):
+        """Write an iterable of byte chunks to the object store without buffering it."""
+        tmp = os.path.join(self.root, "objects", f"{os.getpid()}.{threading.get_ident()}.tmp")
+        h = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if max_bytes and size > max_bytes:
+                        raise TooLarge(f"{url}: over {max_bytes} bytes")
+                    h.update(chunk)
+                    f.write(chunk)
+            sha = h.hexdigest()
+            path = self._path(sha)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp): os.remove(tmp)
+        return self._index(url, sha, size, content_type, etag, last_modified)
+
+    def _index(self, url, sha, size, content_type, etag, last_modified):
+        now = time.time()
+        with self.lock:
+            old = self.db.execute("select sha,size from entries where url=?", (url,)).fetchone()
+            if old:
+                self.total -= old[1]
+            self.db.execute(
+                "insert or replace into entries values (?,?,?,?,?,?,?,?)",
+                (url, sha, size, (content_type or "").lower(), etag, last_modified, now, now))
+            self.total += size
+            if old and old[0] != sha:
+                self._unlink_if_orphan(old[0])
+            if self.total > self.max_bytes:
+                self._evict()
+            self.db.commit()
+        return Entry(url, sha, size, (content_type or "").lower(), etag, last_modified, now)
+
+    def _drop(self, url, sha):
+        row = self.db.execute("select size from entries where url=?", (url,)).fetchone()
+        if row:
+            self.total -= row[0]
+            self.db.execute("delete from entries where url=?", (url,))
+            self._unlink_if_orphan(sha)
+
+    def _unlink_if_orphan(self, sha):
+        if not self.db.execute("select 1 from entries where sha=? limit 1", (sha,)).fetchone():
+            try: os.remove(self._path(sha))
+            except FileNotFoundError: pass
+
+    def _evict(self):
+        # expired first, then least recently used until we are 10% under budget
+        cutoff = time.time() - self.expire_ttl
+        for url, sha in self.db.execute("select url,sha from entries where accessed_at<?", (cutoff,)).fetchall():
+            self._drop(url, sha)
+        target = self.max_bytes * 0.9
+        cur = self.db.execute("select url,sha from entries order by accessed_at")
+        for url, sha in cur.fetchall():
+            if self.total <= target: break
+            self._drop(url, sha)
+
+    # --- requests front-end ---
+
+    def get(self, url, session=None, headers=None, timeout=25, max_bytes=None, **kw):
+        """GET through the cache. Only 200 responses are stored; errors raise like requests.
+
+        Bodies over `max_bytes` raise TooLarge instead of being downloaded."""
+        entry = self.lookup(url)
+        if entry and entry.fresh(self.fresh_ttl):
+            if max_bytes and entry.size > max_bytes:
+                raise TooLarge(f"{url}: {entry.size} bytes")
+            self.stats["hit"] += 1
+            return Fetched(url, 200, None, entry.content_type, "hit", self._path(entry.sha))
+        h = dict(headers or {})
+        h.update(self.conditional_headers(entry))
+        r = send(session or SESSION, url, headers=h, timeout=timeout, stream=True, **kw)
+        with r:
+            if r.status_code == 304 and entry:
+                self.touch(url)
+                self.stats["revalidated"] += 1
+                return Fetched(url, 200, None, entry.content_type, "revalidated", self._path(entry.sha))
+            ct = r.headers.get("content-type", "")
+            if r.status_code != 200:
+                self.stats["error"] += 1
+                return Fetched(url, r.status_code, b"", ct, "error")
+            _check_length(r, max_bytes)
+            stored = self.store_stream(url, _download(r.iter_content(CHUNK), url), ct, r.headers.get("etag"),
+                                       r.headers.get("last-modified"), max_bytes)
+        self.stats["miss"] += 1
+        return Fetched(url, 200, None, ct, "miss", self._path(stored.sha))
+
+SESSION = requests.Session()
+_default = None
+
+def default():
+    global _default
+    if _default is None:
+        _default = FetchCache()
+        metrics.track("http_cache", _default.stats)
+    return _default
+
+def get(url, headers=None, timeout=25, max_bytes=None, **kw):
+    """Module-level convenience: cached GET using the shared cache and session."""
+    if not ENABLED:
+        with send(SESSION, url, headers=headers, timeout=timeout, stream=True, **kw) as r:
+            body = b""
+            if r.status_code == 200:
+                _check_length(r, max_bytes)
+                parts, size = [], 0
+                for chunk in _download(r.iter_content(CHUNK), url):
+                    size += len(chunk)
+                    if max_bytes and size > max_bytes:
+                        raise TooLarge(f"{url}: over {max_bytes} bytes")
+                    parts.append(chunk)
+                body = b"".join(parts)
+            return Fetched(url, r.status_code, body, r.headers.get("content-type", ""), "miss")
+    return default().get(url, headers=headers, timeout=timeout, max_bytes=max_bytes, **kw)
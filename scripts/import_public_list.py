@@ -1,58 +1,122 @@
-import os, csv, time, requests
-from dotenv import load_dotenv
-
-load_dotenv(".env")
-URL = os.environ["SUPABASE_URL"].rstrip("/")
-KEY = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
+import os, csv, json
+from concurrent.futures import ThreadPoolExecutor
+import supa, domains, geocode, metrics
 
 INPUT = "data/public_list.csv"   # <- put your CSV here
-UA = "FareWare/0.1 (contact: send.ishan@gmail.com)"
-NOMINATIM = "https://nominatim.openstreetmap.org/search"
+CHECKPOINT = "data/public_list.checkpoint.json"   # last CSV row whose batch is committed
+REJECTS = "data/public_list_rejected.jsonl"
+CONFLICT = "name_norm,lat_round,lon_round"
+
+# Rows are geocoded as a stream and upserted in bounded batches; one batch uploads
+# while the next one is being geocoded. The checkpoint only moves past a batch the
+# server answered; a geocoder or Supabase outage stops the import where it is.
+BATCH_BYTES = int(os.environ.get("IMPORT_BATCH_BYTES", str(256 * 1024)))
+BATCH_ROWS  = int(os.environ.get("IMPORT_BATCH_ROWS", "500"))
 
-def geocode(addr):
-    params = {"q": addr, "format":"json", "limit":1}
-    r = requests.get(NOMINATIM, params=params, headers={"User-Agent":UA}, timeout=30)
-    r.raise_for_status()
-    j = r.json()
-    if not j: return None, None
-    return float(j[0]["lat"]), float(j[0]["lon"])
+class Stopped(Exception):
+    """The import cannot go on without losing rows; the checkpoint stays before them."""
 
 def clean(s): return (s or "").strip() or None
 
-def main():
-    rows=[]
+def full_address(rec):
+    return " ".join([p for p in [rec["addr"], rec["city"], rec["state"], rec["postcode"]] if p])
+
+def read_rows(skip_through=0):
+    """Lazily yield (csv_row_no, record), skipping rows already committed."""
     with open(INPUT, newline="") as f:
-        r=csv.DictReader(f)
-        for row in r:
+        for n, row in enumerate(csv.DictReader(f), 1):
+            if n <= skip_through:
+                continue
             name=clean(row.get("name"))
             address=clean(row.get("address"))
             city=clean(row.get("city"))
-            state=clean(row.get("state"))
-            postcode=clean(row.get("postcode"))
-            phone=clean(row.get("phone"))
-            website=clean(row.get("website"))
             if not (name and (address or city)):
                 continue
-            full = " ".join([p for p in [address, city, state, postcode] if p])
-            lat, lon = geocode(full)  # polite throttle
-            time.sleep(1.1)
-            rows.append({
-                "name": name, "addr": address, "city": city, "state": state,
-                "postcode": postcode, "phone": phone, "website": website,
-                "lat": lat, "lon": lon,
+            yield n, {
+                "name": name, "addr": address, "city": city, "state": clean(row.get("state")),
+                "postcode": clean(row.get("postcode")), "phone": clean(row.get("phone")),
+                "website": clean(row.get("website")),
+                "lat": None, "lon": None,
                 "source": "license", "source_ref": "public_list",
                 "status": "active"
-            })
-
-    print(f"Prepared {len(rows)} rows; upserting...")
-    res = requests.post(
-        f"{URL}/rest/v1/restaurants?on_conflict=name_norm,lat_round,lon_round",
-        headers={"apikey":KEY,"Authorization":f"Bearer {KEY}","Content-Type":"application/json",
-                 "Prefer":"resolution=merge-duplicates"},
-        json=rows, timeout=120
-    )
-    print(res.status_code, res.text[:400])
-    res.raise_for_status()
+            }
+
+def input_id():
+    st = os.stat(INPUT)
+    return [os.path.abspath(INPUT), st.st_size, int(st.st_mtime)]
+
+def load_checkpoint():
+    try:
+        with open(CHECKPOINT) as f:
+            ck = json.load(f)
+        return ck["done_through"] if ck.get("input") == input_id() else 0
+    except (OSError, ValueError, KeyError):
+        return 0
+
+def save_checkpoint(done_through):
+    with open(CHECKPOINT + ".tmp", "w") as f:
+        json.dump({"input": input_id(), "done_through": done_through}, f)
+    os.replace(CHECKPOINT + ".tmp", CHECKPOINT)
+
+def batches(geocoded):
+    """Pack geocoded records into (last_row_no, [json bytes]) batches."""
+    parts=[]; size=2; last=0
+    for (n, rec), (lat, lon) in geocoded:
+        rec["lat"], rec["lon"] = lat, lon
+        b = json.dumps(rec, separators=(",", ":")).encode()
+        if parts and (size + len(b) + 1 > BATCH_BYTES or len(parts) >= BATCH_ROWS):
+            yield last, parts
+            parts=[]; size=2
+        parts.append(b); size += len(b) + 1; last = n
+    if parts:
+        yield last, parts
+
+def main():
+    metrics.start("import_public_list")
+    done = load_checkpoint()
+    if done:
+        print(f"Resuming after CSV row {done} (checkpoint {CHECKPOINT})")
+    geo = geocode.Geocoder()
+    db = supa.client()
+    pairs = ((item, full_address(item[1])) for item in read_rows(done))
+
+    totals = {"rows": 0, "ok": 0, "rejected": 0, "batches": 0, "requests": 0}
+    with open(REJECTS, "a" if done else "w") as rej_f:
+        def finish(last_row, parts):
+            with metrics.timer("upsert_batch"):
+                ok, rejects, nreq = db.upsert_parts("restaurants", parts, CONFLICT)
+            failed = [(status, err) for status, err, _ in rejects if supa.transient(status)]
+            if failed:
+                status, err = failed[0]
+                raise Stopped(f"Supabase failed on the batch through CSV row {last_row} ({status}: {err})")
+            for status, err, part in rejects:
+                rej_f.write(json.dumps({"status": status, "error": err, "row": json.loads(part)}) + "\n")
+            rej_f.flush()
+            save_checkpoint(last_row)
+            totals["rows"] += len(parts); totals["ok"] += ok; totals["rejected"] += len(rejects)
+            totals["batches"] += 1; totals["requests"] += nreq
+            print(f"batch {totals['batches']}: {ok}/{len(parts)} rows upserted (through CSV row {last_row})")
+
+        with ThreadPoolExecutor(1) as uploader:
+            pending = None
+            try:
+                try:
+                    for last_row, parts in batches(geo.stream(pairs, strict=True)):
+                        if pending: pending.result()   # keep one upload in flight, in order
+                        pending = uploader.submit(finish, last_row, parts)
+                finally:
+                    if pending: pending.result()   # the batch before a geocoder failure still lands
+            except (Stopped, geocode.LookupFailed) as e:
+                print(f"Stopped: {e}")
+                print(f"Upserted {totals['ok']}/{totals['rows']} rows; rerun to resume from {CHECKPOINT}")
+                raise SystemExit(1)
+
+    print("geocode:", geo.stats)
+    print(f"Upserted {totals['ok']}/{totals['rows']} rows in {totals['batches']} batches "
+          f"({totals['requests']} requests); {totals['rejected']} rejected → {REJECTS}")
+    if os.path.exists(CHECKPOINT):
+        os.remove(CHECKPOINT)
+    domains.invalidate_index()
     print("Done.")
 
 if __name__ == "__main__":
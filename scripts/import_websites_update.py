@@ -1,13 +1,9 @@
-import csv, os, requests
+import csv
 from urllib.parse import urlparse
-from dotenv import load_dotenv
-
-load_dotenv(".env")
-URL = os.environ["SUPABASE_URL"].rstrip("/")
-KEY = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
+import metrics, supa, domains
 
 INFILE = "data/missing_websites.csv"
-REST = f"{URL}/rest/v1/restaurants"
+metrics.start("import_websites_update")
 
 def clean_url(u:str)->str:
     if not u: return ""
@@ -28,12 +24,8 @@ if not updates:
     print("No website updates found.")
     raise SystemExit(0)
 
-res=requests.post(
-    REST+"?on_conflict=id",
-    headers={"apikey":KEY,"Authorization":f"Bearer {KEY}","Content-Type":"application/json",
-             "Prefer":"resolution=merge-duplicates"},
-    json=updates, timeout=60
-)
+res=supa.client().upsert("restaurants", updates, "id", timeout=60)
 print(res.status_code, res.text[:300])
 res.raise_for_status()
+domains.invalidate_index()   # websites changed: host → restaurant index must be rebuilt
 print(f"Updated {len(updates)} websites.")
@@ -0,0 +1,75 @@
+"""One-pass price/calorie scanner for candidate menu lines.
+
+The extractor used to run PRICE_RX.findall, PRICE_RX.split, CAL_PAIR_RX.search
+and two re.sub passes over every line. Here a single compiled alternation is
+iterated once per line: price matches and the first calorie mention come out
+of the same finditer, and the name is the slice in front of the first price.
+The calorie branch only consumes the word (its number is captured in a
+lookahead), so a number after "cal" can still be read as a price exactly like
+the separate regexes did.
+"""
+import re
+
+PRICE_PATTERN = r"\$\s*\d{1,3}(?:\.\d{1,2})?|\b\d{1,3}\.\d{2}\b"
+CAL_PATTERN = r"\b(cal(?:ories)?|kcal)\b[:\s]*([0-9]{2,4})"
+
+PRICE_RX = re.compile(PRICE_PATTERN)
+CAL_PAIR_RX = re.compile(CAL_PATTERN, re.I)
+SCAN_RX = re.compile(
+    r"(?P<price>\$\s*\d{1,3}(?:\.\d{1,2})?|\b\d{1,3}\.\d{2}\b)"
+    r"|(?P<cal>(?i:\b(?:cal(?:ories)?|kcal)\b)[:\s]*)(?=(?P<kcal>[0-9]{2,4}))"
+)
+
+NAME_STRIP = ":-•–— "
+_DASHES = str.maketrans({c: " " for c in "-–—•·"})
+
+def norm_name(s):
+    """Bullets/dashes to spaces, collapse whitespace, cap length (calories are kept)."""
+    if not s: return s
+    return " ".join(s.translate(_DASHES).split())[:160]
+
+def scan(line):
+    """Return (name, prices, kcal, kcal_text) for a line with a price, else None.
+
+    `prices` are the raw matched strings in order; `name` is normalized and may
+    be empty."""
+    for _line, *rest in scan_lines((line,)):
+        return tuple(rest)
+    return None
+
+def scan_lines(lines):
+    """Batch form: yield (line, name, prices, kcal, kcal_text) for priced lines."""
+    finditer = SCAN_RX.finditer
+    for line in lines:
+        if "$" not in line and "." not in line:   # cheap reject: no price can match
+            continue
+        first = None
+        prices = []
+        kcal = kcal_txt = None
+        for m in finditer(line):
+            if m.lastgroup == "price":
+                if first is None: first = m.start()
+                prices.append(m.group())
+            elif kcal_txt is None:
+                num = m.group("kcal")
+                kcal_txt = line[m.start():m.end() + len(num)]
+                kcal = int(num)
+        if first is not None:
+            yield line, norm_name(line[:first].strip(NAME_STRIP)), prices, kcal, kcal_txt
+
+def price_value(raw):
+    return float(raw.replace("$", ""))
+
+def items_from_lines(lines, url):
+    """Menu item rows for every line that has a name in front of a non-zero price."""
+    for _line, name, prices, kcal, kcal_txt in scan_lines(lines):
+        p = price_value(prices[0])
+        if name and p:
+            yield {
+                "item_name": name,
+                "item_desc": None,
+                "price": p,
+                "calories_kcal": kcal,
+                "calories_text": kcal_txt,
+                "source_url": url
+            }
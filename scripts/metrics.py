@@ -0,0 +1,188 @@
+"""Lightweight run metrics shared by the pipeline scripts.
+
+Counters and fixed-bucket histograms keyed by name plus labels (stage, host,
+table, ...), kept in memory and written once per run as one JSON line to
+METRICS_FILE. Set METRICS_PROM to also write the same numbers in Prometheus
+text format (e.g. for a node_exporter textfile collector). Subsystems that
+already keep a stats dict (cache, REST client, circuit breaker, geocoder)
+register it with track() and it is copied in at flush time.
+
+    metrics.start("extract_menu_items")          # flushes at exit
+    with metrics.timer("parse", kind="pdf"):
+        ...
+    metrics.inc("bytes_in", len(body), host=h)
+
+Per-host series are capped at TOP_HOSTS by total time/volume when written; the
+rest are summed under host="other". PROFILE_URL=<url> runs that URL's fetch
+and parse under cProfile (see profiled()); stats land next to the metrics file.
+"""
+import os, sys, json, time, atexit, hashlib, resource, threading
+from contextlib import contextmanager
+
+METRICS_FILE = os.environ.get("METRICS_FILE", "data/metrics.jsonl")
+PROM_FILE = os.environ.get("METRICS_PROM", "")
+PROFILE_URL = os.environ.get("PROFILE_URL", "")
+TOP_HOSTS = int(os.environ.get("METRICS_TOP_HOSTS", "50"))
+ENABLED = os.environ.get("METRICS", "1") != "0"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+
+_lock = threading.Lock()
+_counters = {}     # (name, labels) -> number
+_hists = {}        # (name, labels) -> [count, sum, max, bucket counts]
+_tracked = {}      # prefix -> live stats dict
+_run = {"script": None, "started": None}
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+def inc(name, n=1, **labels):
+    if not ENABLED: return
+    k = _key(name, labels)
+    with _lock:
+        _counters[k] = _counters.get(k, 0) + n
+
+def observe(name, value, **labels):
+    if not ENABLED: return
+    k = _key(name, labels)
+    with _lock:
+        h = _hists.get(k)
+        if h is None:
+            h = _hists[k] = [0, 0.0, 0.0, [0] * len(BUCKETS)]
+        h[0] += 1; h[1] += value; h[2] = max(h[2], value)
+        for i, b in enumerate(BUCKETS):
+            if value <= b:
+                h[3][i] += 1
+                break
+
+@contextmanager
+def timer(stage, **labels):
+    """Observe the block's wall time as stage_seconds{stage=...}."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_seconds", time.perf_counter() - t0, stage=stage, **labels)
+
+def track(prefix, stats):
+    """Copy a subsystem's stats dict into the counters when flushing."""
+    _tracked[prefix] = stats
+
+def quantile(h, q):
+    """Upper bucket bound holding the q-th observation (the max for the last bucket)."""
+    want, seen = q * h[0], 0
+    for b, n in zip(BUCKETS, h[3]):
+        seen += n
+        if seen >= want and n:
+            return min(b, h[2])
+    return h[2]
+
+def _cap_hosts(series, weight):
+    """Keep the TOP_HOSTS heaviest host label values per metric name; fold the rest into host=other."""
+    by_name = {}
+    for (name, labels), v in series.items():
+        host = dict(labels).get("host")
+        if host is not None:
+            by_name.setdefault(name, {}).setdefault(host, 0.0)
+            by_name[name][host] += weight(v)
+    keep = {name: set(sorted(hosts, key=hosts.get, reverse=True)[:TOP_HOSTS]) for name, hosts in by_name.items()}
+    out = {}
+    for (name, labels), v in series.items():
+        d = dict(labels)
+        if "host" in d and d["host"] not in keep[name]:
+            d["host"] = "other"
+            k = _key(name, d)
+            if k in out:
+                out[k] = _merge(out[k], v)
+                continue
+            out[k] = _copy(v)
+        else:
+            out[(name, labels)] = _copy(v)
+    return out
+
+def _copy(v):
+    return [v[0], v[1], v[2], list(v[3])] if isinstance(v, list) else v
+
+def _merge(a, b):
+    if not isinstance(a, list): return a + b
+    return [a[0] + b[0], a[1] + b[1], max(a[2], b[2]), [x + y for x, y in zip(a[3], b[3])]]
+
+def _fmt(name, labels):
+    return name + ("{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else "")
+
+def snapshot():
+    with _lock:
+        counters = _cap_hosts(dict(_counters), lambda v: v)
+        hists = _cap_hosts({k: _copy(v) for k, v in _hists.items()}, lambda v: v[1])
+    for prefix, stats in _tracked.items():
+        for k, v in stats.items():
+            if isinstance(v, (int, float)):
+                counters[_key(f"{prefix}_{k}", {})] = v
+    return counters, hists
+
+def to_json(counters, hists):
+    return {
+        "counters": {_fmt(*k): v for k, v in sorted(counters.items())},
+        "histograms": {_fmt(*k): {"count": h[0], "sum": round(h[1], 6), "max": round(h[2], 6),
+                                  **{f"p{int(q * 100)}": round(quantile(h, q), 6) for q in (.5, .9, .99)}}
+                       for k, h in sorted(hists.items())},
+    }
+
+def to_prometheus(counters, hists, prefix="fareware_"):
+    lines, typed = [], set()
+    def declare(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+    for (name, labels), v in sorted(counters.items()):
+        declare(prefix + name, "counter")
+        lines.append(f"{_fmt(prefix + name, labels)} {v}")
+    for (name, labels), h in sorted(hists.items()):
+        declare(prefix + name, "histogram")
+        cum = 0
+        for b, n in zip(BUCKETS, h[3]):
+            cum += n
+            le = "+Inf" if b == float("inf") else repr(b)
+            lines.append(f"{_fmt(prefix + name + '_bucket', labels + (('le', le),))} {cum}")
+        lines.append(f"{_fmt(prefix + name + '_sum', labels)} {h[1]}")
+        lines.append(f"{_fmt(prefix + name + '_count', labels)} {h[0]}")
+    return "\n".join(lines) + "\n"
+
+def flush(**extra):
+    """Append this run's metrics as one JSON line (and rewrite the Prometheus dump)."""
+    if not ENABLED or not _run["script"]: return
+    counters, hists = snapshot()
+    rec = {"ts": time.time(), "script": _run["script"], "wall_s": round(time.time() - _run["started"], 3),
+           "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+           **extra, **to_json(counters, hists)}
+    os.makedirs(os.path.dirname(METRICS_FILE) or ".", exist_ok=True)
+    with open(METRICS_FILE, "a") as f:
+        f.write(json.dumps(rec) + "\n")
+    if PROM_FILE:
+        with open(PROM_FILE + ".tmp", "w") as f:
+            f.write(to_prometheus(counters, hists))
+        os.replace(PROM_FILE + ".tmp", PROM_FILE)
+    _run["script"] = None   # once per run
+
+def start(script):
+    """Name the run and flush its metrics at interpreter exit."""
+    _run["script"], _run["started"] = script, time.time()
+    atexit.register(flush)
+
+@contextmanager
+def profiled(url, stage=""):
+    """cProfile the block when url == PROFILE_URL; stats go to <metrics dir>/profile-<hash>-<stage>.prof."""
+    if not PROFILE_URL or url != PROFILE_URL:
+        yield
+        return
+    import cProfile, pstats
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        out = os.path.join(os.path.dirname(METRICS_FILE) or ".",
+                           f"profile-{hashlib.sha1(url.encode()).hexdigest()[:10]}-{stage}.prof")
+        prof.dump_stats(out)
+        print(f"profile for {url} → {out}", file=sys.stderr)
+        pstats.Stats(prof, stream=sys.stderr).sort_stats("cumulative").print_stats(15)
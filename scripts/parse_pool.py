@@ -0,0 +1,63 @@
+"""Bounded process-pool stage for CPU-bound parsing.
+
+Jobs are pulled lazily from a generator (usually one that is fetching pages), so
+when MAX_PENDING jobs are queued the producer simply stops being advanced, and
+results come back either in submission order or as soon as they finish.
+"""
+import os, signal
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
+
+WORKERS = int(os.environ.get("PARSE_WORKERS", str(os.cpu_count() or 1)))
+ORDERED = os.environ.get("PARSE_ORDERED", "1") != "0"
+
+class Timeout(Exception):
+    pass
+
+def _raise_timeout(signum, frame):
+    raise Timeout()
+
+@contextmanager
+def time_limit(seconds):
+    """Wall-clock limit for the enclosed block (main thread of a worker; no-op where SIGALRM is missing)."""
+    if not seconds or not hasattr(signal, "setitimer"):
+        yield
+        return
+    old = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old)
+
+def imap(fn, jobs, workers=WORKERS, ordered=ORDERED, max_pending=None):
+    """Yield fn(*job) for each job in `jobs`, running up to `workers` processes.
+
+    At most `max_pending` jobs are submitted but not yet yielded; with workers<=1
+    everything runs inline in this process."""
+    if workers <= 1:
+        for job in jobs:
+            yield fn(*job)
+        return
+    max_pending = max_pending or workers * 4
+    with ProcessPoolExecutor(workers) as ex:
+        pending = deque()
+        for job in jobs:
+            pending.append(ex.submit(fn, *job))
+            if ordered:
+                while pending and (len(pending) >= max_pending or pending[0].done()):
+                    yield pending.popleft().result()
+            else:
+                if len(pending) >= max_pending:
+                    wait(pending, return_when=FIRST_COMPLETED)
+                for fut in [f for f in pending if f.done()]:
+                    pending.remove(fut)
+                    yield fut.result()
+        if ordered:
+            while pending:
+                yield pending.popleft().result()
+        else:
+            for fut in as_completed(pending):
+                yield fut.result()
@@ -0,0 +1,76 @@
+"""Page-at-a-time, layout-aware text lines from PDF menus.
+
+pdfminer's extract_text lays out the whole document into one string and emits
+text boxes in reading order, so a name in the left box and its right-aligned
+price in another box end up on different lines. Here pages are laid out one
+at a time (extract_pages is lazy), text lines on a page are grouped into rows
+by vertical overlap, and each row is read left to right. A segment that is only
+a price is joined onto the text to its left, so two-column rows ("Soup 6.00
+Salad 8.00") still come out as two lines. Documents are read from a path or
+file object so a cached download is parsed straight off disk. Only the first
+MAX_PAGES pages are read, and files over MAX_BYTES are skipped.
+"""
+import os, io
+from pdfminer.high_level import extract_pages
+from pdfminer.layout import LAParams, LTContainer, LTTextLine
+from line_scan import PRICE_RX
+
+MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES", "12"))
+MAX_BYTES = int(os.environ.get("PDF_MAX_MB", "20")) * 1024 * 1024
+LAPARAMS = LAParams()
+
+def text_lines(layout):
+    """(x0, y0, x1, y1, text) for every non-empty text line under a layout object."""
+    stack = [layout]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, LTTextLine):
+            t = " ".join(obj.get_text().split())
+            if t: yield obj.x0, obj.y0, obj.x1, obj.y1, t
+        elif isinstance(obj, LTContainer):
+            stack.extend(obj)
+
+def rows(lines):
+    """Group text lines into visual rows, top to bottom; each row sorted left to right."""
+    out = []
+    for ln in sorted(lines, key=lambda l: -l[3]):
+        if out:
+            top, bottom = out[-1][0]
+            overlap = min(top, ln[3]) - max(bottom, ln[1])
+            if overlap > 0.5 * min(top - bottom, ln[3] - ln[1]):
+                out[-1][1].append(ln)
+                continue
+        out.append(((ln[3], ln[1]), [ln]))
+    return [sorted(r, key=lambda l: l[0]) for _band, r in out]
+
+def row_lines(row):
+    """Join each price-only segment onto the unpriced text before it."""
+    cur = None
+    for *_box, t in row:
+        only_price = PRICE_RX.fullmatch(t.strip(" .·-")) is not None
+        if cur is not None and only_price and not PRICE_RX.search(cur):
+            cur = f"{cur} {t}"
+            continue
+        if cur is not None: yield cur
+        cur = t
+    if cur is not None: yield cur
+
+def page_lines(page):
+    for row in rows(list(text_lines(page))):
+        yield from row_lines(row)
+
+def pdf_lines(source, max_pages=MAX_PAGES, max_bytes=MAX_BYTES):
+    """Yield text lines page by page from a path, file object or bytes."""
+    if isinstance(source, (bytes, bytearray)):
+        if max_bytes and len(source) > max_bytes: return
+        source = io.BytesIO(source)
+    elif isinstance(source, str):
+        if max_bytes and os.path.getsize(source) > max_bytes: return
+        with open(source, "rb") as f:
+            yield from pdf_lines(f, max_pages, None)
+        return
+    for page in extract_pages(source, laparams=LAPARAMS, maxpages=max_pages or 0):
+        yield from page_lines(page)
+
+def pdf_text(source, max_pages=MAX_PAGES, max_bytes=MAX_BYTES):
+    return "\n".join(pdf_lines(source, max_pages, max_bytes))
@@ -0,0 +1,180 @@
+"""Per-page and per-host price distributions over the whole menu_items snapshot.
+
+    python scripts/price_stats.py
+
+One vectorized (NumPy) pass: items are coded by page and by registrable host,
+sorted once by (group, price), and every statistic is index arithmetic on the
+sorted array — count, median, Q1/Q3/IQR and a TRIM-trimmed mean per group.
+
+Outliers: prices outside [PRICE_MIN, PRICE_MAX] are dropped, then within each
+group of at least FENCE_MIN_N items a Tukey fence on the log scale (keep
+Q1 / r .. Q3 * r with r = (Q3/Q1)^FENCE_K, log r at least FENCE_K x
+FENCE_MIN_IQR) removes stray numbers such as a $1.50 add-on among
+entrées or a phone/year fragment read as a price. Page stats are computed
+first; host stats pool the items that survived their page's fence and fence
+again at the host level. The same rule, per page, gives median_price() used
+by extract_menu_items.
+
+Writes data/page_price_stats.jsonl and data/host_price_stats.jsonl (Parquet
+twins too under INTERMEDIATE_FORMAT, see columnar). host_buckets() returns the
+host buckets, recomputing them when the items snapshot is newer, so buckets
+change in seconds without a re-crawl.
+"""
+import os, math, time
+import columnar, domains, metrics
+
+ITEMS_IN = "data/menu_items.jsonl"
+PAGE_OUT = "data/page_price_stats.jsonl"
+HOST_OUT = "data/host_price_stats.jsonl"
+
+PRICE_MIN     = float(os.environ.get("PRICE_MIN", "1"))        # below: add-ons, "0.5 oz", list numbering
+PRICE_MAX     = float(os.environ.get("PRICE_MAX", "500"))      # above: years, phone fragments, catering totals
+FENCE_K       = float(os.environ.get("PRICE_FENCE_K", "1.5"))
+FENCE_MIN_IQR = float(os.environ.get("PRICE_FENCE_MIN_IQR", "0.7"))   # log units; pages of equal prices keep the rest
+FENCE_MIN_N   = int(os.environ.get("PRICE_FENCE_MIN_N", "5"))  # smaller groups keep every in-range price
+TRIM          = float(os.environ.get("PRICE_TRIM", "0.1"))     # share cut from each end for the trimmed mean
+
+STATS = {"count": "int64", "median": "float64", "q1": "float64", "q3": "float64", "iqr": "float64",
+         "trimmed_mean": "float64", "price_bucket": "string"}
+PAGE_STATS = {"menu_url": "string", "host": "string", **STATS}
+HOST_STATS = {"host": "string", "pages": "int64", **STATS}
+
+def bucket(m):
+    if m < 10:  return "$"
+    if m < 20:  return "$$"
+    if m < 35:  return "$$$"
+    return "$$$$"
+
+# --- one page, plain Python (called per parsed page) ---
+
+def _q(xs, q):
+    """Linear-interpolated quantile of a sorted list (NumPy's default method)."""
+    pos = q * (len(xs) - 1)
+    lo = int(pos)
+    hi = min(lo + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (pos - lo)
+
+def clean(prices):
+    """One page's prices, sorted, with out-of-range values and fence outliers removed."""
+    xs = sorted(p for p in prices if p is not None and PRICE_MIN <= p <= PRICE_MAX)
+    if len(xs) >= FENCE_MIN_N:
+        q1, q3 = _q(xs, .25), _q(xs, .75)
+        w = math.exp(FENCE_K * max(math.log(q3 / q1), FENCE_MIN_IQR))
+        lo, hi = q1 / w, q3 * w
+        xs = [p for p in xs if lo <= p <= hi]
+    return xs
+
+def page_stats(prices):
+    """Stats dict for one page's prices after outlier filtering, or None if nothing is left."""
+    xs = clean(prices)
+    if not xs:
+        return None
+    t = int(TRIM * len(xs))
+    q1, med, q3 = _q(xs, .25), _q(xs, .5), _q(xs, .75)
+    return {"count": len(xs), "median": med, "q1": q1, "q3": q3, "iqr": q3 - q1,
+            "trimmed_mean": sum(xs[t:len(xs) - t]) / (len(xs) - 2 * t), "price_bucket": bucket(med)}
+
+def median_price(items):
+    xs = clean([it.get("price") for it in items])
+    return _q(xs, .5) if xs else None
+
+# --- all groups at once ---
+
+def _quantile(xs, starts, counts, q):
+    """_q() for every group at once; xs sorted by (group, value)."""
+    pos = starts + q * (counts - 1)
+    lo = pos.astype("int64")
+    hi = (lo + 1).clip(max=starts + counts - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (pos - lo)
+
+def group_stats(codes, prices):
+    """Vectorized page_stats() for every group: (kept mask over the inputs, {stat: array}, group ids)."""
+    import numpy as np
+    codes = np.asarray(codes, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.float64)
+    idx = np.flatnonzero(np.isfinite(prices) & (prices >= PRICE_MIN) & (prices <= PRICE_MAX))
+    idx = idx[np.lexsort((prices[idx], codes[idx]))]
+    c, xs = codes[idx], prices[idx]
+    if len(xs):
+        _, starts, counts = np.unique(c, return_index=True, return_counts=True)
+        q1, q3 = _quantile(xs, starts, counts, .25), _quantile(xs, starts, counts, .75)
+        w = np.exp(FENCE_K * np.maximum(np.log(q3 / q1), FENCE_MIN_IQR))
+        lo, hi = q1 / w, q3 * w
+        small = counts < FENCE_MIN_N
+        inside = (xs >= np.repeat(lo, counts)) & (xs <= np.repeat(hi, counts)) | np.repeat(small, counts)
+        idx, c, xs = idx[inside], c[inside], xs[inside]   # still sorted by (group, price)
+    kept = np.zeros(len(prices), dtype=bool)
+    kept[idx] = True
+    groups, starts, counts = np.unique(c, return_index=True, return_counts=True)
+    q1, med, q3 = (_quantile(xs, starts, counts, q) for q in (.25, .5, .75))
+    t = (TRIM * counts).astype(np.int64)
+    cs = np.concatenate(([0.0], np.cumsum(xs)))
+    trimmed = (cs[starts + counts - t] - cs[starts + t]) / (counts - 2 * t)
+    return kept, {"count": counts, "median": med, "q1": q1, "q3": q3, "iqr": q3 - q1, "trimmed_mean": trimmed}, groups
+
+def _records(stats, i):
+    rec = {k: (int(v[i]) if k == "count" else round(float(v[i]), 4)) for k, v in stats.items()}
+    rec["price_bucket"] = bucket(rec["median"])
+    return rec
+
+def compute(path=ITEMS_IN):
+    """(page records, host records) for the items snapshot at `path`."""
+    import numpy as np
+    urls = {}
+    page_codes, prices = [], []
+    for chunk in columnar.batches(path, ["source_url", "price"]):
+        page_codes.extend(urls.setdefault(u, len(urls)) for u in chunk["source_url"])
+        prices.extend(chunk["price"])
+    page_codes = np.array(page_codes, dtype=np.int64)
+    prices = np.array([math.nan if p is None else p for p in prices], dtype=np.float64)
+    url_list = list(urls)
+    hosts = {}
+    page_host = np.array([hosts.setdefault(domains.site_key(u), len(hosts)) for u in url_list], dtype=np.int64)
+    host_list = list(hosts)
+
+    with metrics.timer("price_stats", level="page"):
+        kept, pstats, pages = group_stats(page_codes, prices)
+    with metrics.timer("price_stats", level="host"):
+        _, hstats, host_ids = group_stats(page_host[page_codes][kept], prices[kept])
+        pages_per_host = np.bincount(page_host[pages], minlength=len(host_list))
+
+    page_recs = [{"menu_url": url_list[g], "host": host_list[page_host[g]], **_records(pstats, i)}
+                 for i, g in enumerate(pages)]
+    host_recs = [{"host": host_list[g], "pages": int(pages_per_host[g]), **_records(hstats, i)}
+                 for i, g in enumerate(host_ids)]
+    metrics.inc("prices_in", len(prices))
+    metrics.inc("prices_dropped", int(len(prices) - kept.sum()))
+    return page_recs, host_recs
+
+def write(page_recs, host_recs):
+    with columnar.Writer(PAGE_OUT, PAGE_STATS) as w:
+        for r in page_recs: w.write(r)
+    with columnar.Writer(HOST_OUT, HOST_STATS) as w:
+        for r in host_recs: w.write(r)
+
+def host_buckets():
+    """{registrable host: price bucket}; recomputed when the items snapshot is newer than HOST_OUT."""
+    src = columnar.source(HOST_OUT)
+    if not os.path.exists(src) or os.path.getmtime(src) < os.path.getmtime(columnar.source(ITEMS_IN)):
+        page_recs, host_recs = compute()
+        write(page_recs, host_recs)
+        return {r["host"]: r["price_bucket"] for r in host_recs if r["host"]}
+    return {r["host"]: r["price_bucket"] for r in columnar.rows(HOST_OUT, ["host", "price_bucket"]) if r["host"]}
+
+def main():
+    metrics.start("price_stats")
+    if not columnar.exists(ITEMS_IN):
+        print("Missing data/menu_items.jsonl (or .parquet). Run extract_menu_items.py first.")
+        return
+    t0 = time.perf_counter()
+    page_recs, host_recs = compute()
+    write(page_recs, host_recs)
+    by_bucket = {}
+    for r in host_recs:
+        by_bucket[r["price_bucket"]] = by_bucket.get(r["price_bucket"], 0) + 1
+    print(f"{len(page_recs)} pages, {len(host_recs)} hosts in {time.perf_counter() - t0:.2f}s | "
+          f"host buckets {dict(sorted(by_bucket.items()))}")
+    print(f"Wrote: {PAGE_OUT}, {HOST_OUT}")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,9 @@
-from dotenv import load_dotenv
-import os, requests, pathlib, json, sys
-
-load_dotenv(".env")
-URL = os.environ["SUPABASE_URL"].rstrip("/")
-KEY = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
-HDR = {"apikey": KEY, "Authorization": f"Bearer {KEY}", "Prefer": "count=exact"}
+import pathlib
+import metrics, supa
 
+metrics.start("quick_checks")
 print("Checking websites in DB …")
-r = requests.get(f"{URL}/rest/v1/restaurants",
-                 headers=HDR,
-                 params={"select":"id","website":"not.is.null"},
-                 timeout=30)
-r.raise_for_status()
-print("websites in DB (content-range):", r.headers.get("content-range","0/0"))
+print("websites in DB (exact count):", supa.client().count("restaurants", website="not.is.null"))
 
 root = pathlib.Path(".")
 seed = root / "data/menu_seed.txt"
@@ -0,0 +1,190 @@
+"""Optional headless-browser rendering for menus built client-side.
+
+Off unless RENDER=1. extract_menu_items submits a page here only when the
+static HTML parsed to zero items; the rendered DOM then goes through the same
+HTML extractor.
+
+One Chromium (Playwright, async API) runs on a background event loop with
+RENDER_POOL reusable browser contexts; a render borrows a context, opens a
+page, waits for DOMContentLoaded and then up to RENDER_SETTLE_MS for the
+network to go idle, takes page.content() and returns the context (cookies
+cleared). RENDER_TIMEOUT_S bounds each page. Images, media, fonts,
+stylesheets and known analytics/ads hosts are aborted at the route level.
+
+Rendered DOMs are cached under RENDER_CACHE_DIR keyed by URL and the static
+body's fingerprint, for RENDER_CACHE_TTL_H, so each page version is rendered
+once. Stats (rendered, cached, timeouts, errors, blocked) are tracked through
+metrics; render time is the render_seconds histogram.
+
+Needs `pip install playwright && playwright install chromium` (or an existing
+Chrome/Chromium binary in RENDER_CHROMIUM); when that is missing the pool logs
+once and every render returns None.
+"""
+import os, time, asyncio, hashlib, threading
+from contextlib import suppress
+from concurrent.futures import Future
+from urllib.parse import urlparse
+import metrics
+
+ENABLED = os.environ.get("RENDER", "0") == "1"
+POOL = int(os.environ.get("RENDER_POOL", "4"))                  # browser contexts (pages rendered at once)
+TIMEOUT = float(os.environ.get("RENDER_TIMEOUT_S", "20"))        # per page, navigation included
+SETTLE_MS = int(os.environ.get("RENDER_SETTLE_MS", "2500"))      # max wait for network idle after DOMContentLoaded
+CHROMIUM = os.environ.get("RENDER_CHROMIUM") or None           # browser executable; default: Playwright's own
+CACHE_DIR = os.environ.get("RENDER_CACHE_DIR", "data/render_cache")
+CACHE_TTL = float(os.environ.get("RENDER_CACHE_TTL_H", "168")) * 3600
+
+BLOCK_TYPES = frozenset(["image", "media", "font", "stylesheet"])
+BLOCK_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "facebook.net", "connect.facebook.com", "hotjar.com", "segment.com", "segment.io",
+    "mixpanel.com", "clarity.ms", "newrelic.com", "nr-data.net", "fullstory.com", "tiktok.com",
+)
+
+class RenderPool:
+    def __init__(self, size=POOL, timeout=TIMEOUT, cache_dir=CACHE_DIR, user_agent=None):
+        self.size, self.timeout, self.cache_dir, self.user_agent = size, timeout, cache_dir, user_agent
+        self.stats = {"rendered": 0, "cached": 0, "timeouts": 0, "errors": 0, "blocked": 0, "pool_size": size}
+        self.loop = None
+        self.lock = threading.Lock()
+        self.failed = None   # reason the browser could not start
+
+    # --- cache ---
+
+    def _cache_path(self, url, key):
+        return os.path.join(self.cache_dir, hashlib.sha256(f"{url}\n{key}".encode()).hexdigest() + ".html")
+
+    def cached(self, url, key=""):
+        path = self._cache_path(url, key)
+        try:
+            if time.time() - os.path.getmtime(path) < CACHE_TTL:
+                with open(path, encoding="utf-8") as f:
+                    return f.read()
+        except OSError:
+            pass
+        return None
+
+    def _store(self, url, key, html):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(url, key)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(html)
+        os.replace(path + ".tmp", path)
+
+    # --- browser ---
+
+    def _ensure_started(self):
+        """Start the event loop thread and the browser on first use; False if that is impossible."""
+        with self.lock:
+            if self.failed:
+                return False
+            if self.loop:
+                return True
+            self.loop = asyncio.new_event_loop()
+            threading.Thread(target=self.loop.run_forever, name="render-pool", daemon=True).start()
+            try:
+                asyncio.run_coroutine_threadsafe(self._start(), self.loop).result(timeout=60)
+            except Exception as e:
+                self.failed = repr(e)
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                print(f"headless rendering unavailable, continuing without it: {str(e).splitlines()[0]}")
+                return False
+            return True
+
+    async def _start(self):
+        from playwright.async_api import async_playwright
+        self.pw = await async_playwright().start()
+        self.browser = await self.pw.chromium.launch(headless=True, executable_path=CHROMIUM,
+                                                   args=["--disable-dev-shm-usage"])
+        self.contexts = asyncio.Queue()
+        for _ in range(self.size):
+            ctx = await self.browser.new_context(user_agent=self.user_agent, service_workers="block")
+            await ctx.route("**/*", self._route)
+            self.contexts.put_nowait(ctx)
+
+    async def _route(self, route):
+        req = route.request
+        host = (urlparse(req.url).hostname or "").lower()
+        if req.resource_type in BLOCK_TYPES or any(host == h or host.endswith("." + h) for h in BLOCK_HOSTS):
+            self.stats["blocked"] += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _render(self, ctx, url):
+        from playwright.async_api import TimeoutError as PlaywrightTimeout
+        page = await ctx.new_page()
+        try:
+            await page.goto(url, wait_until="domcontentloaded", timeout=self.timeout * 1000)
+            try:
+                await page.wait_for_load_state("networkidle", timeout=SETTLE_MS)
+            except PlaywrightTimeout:
+                pass   # long-polling / analytics that slipped through: take the DOM as it is
+            return await page.content()
+        finally:
+            await page.close()
+
+    async def _timed(self, url, key):
+        from playwright.async_api import TimeoutError as PlaywrightTimeout
+        ctx = await self.contexts.get()   # queueing for a context does not count against the timeout
+        t0 = time.perf_counter()
+        outcome, html = "ok", None
+        try:
+            html = await asyncio.wait_for(self._render(ctx, url), self.timeout + SETTLE_MS / 1000)
+            self.stats["rendered"] += 1
+            self._store(url, key, html)
+        except (asyncio.TimeoutError, PlaywrightTimeout):
+            outcome = "timeout"
+            self.stats["timeouts"] += 1
+        except Exception as e:
+            outcome = "error"
+            self.stats["errors"] += 1
+            print(f"render failed {url}: {e!r}")
+        finally:
+            with suppress(Exception):
+                await ctx.clear_cookies()
+            self.contexts.put_nowait(ctx)
+        metrics.observe("render_seconds", time.perf_counter() - t0, outcome=outcome)
+        return html
+
+    # --- public ---
+
+    def submit(self, url, key=""):
+        """Future of the rendered HTML (None on failure); served from the cache when possible."""
+        html = self.cached(url, key)
+        if html is not None or not self._ensure_started():
+            if html is not None:
+                self.stats["cached"] += 1
+            fut = Future()
+            fut.set_result(html)
+            return fut
+        return asyncio.run_coroutine_threadsafe(self._timed(url, key), self.loop)
+
+    def render(self, url, key=""):
+        return self.submit(url, key).result()
+
+    def close(self):
+        if not self.loop or self.failed:
+            return
+        async def stop():
+            await self.browser.close()
+            await self.pw.stop()
+        try:
+            asyncio.run_coroutine_threadsafe(stop(), self.loop).result(timeout=30)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.loop = None
+
+    def summary(self):
+        st = self.stats
+        return (f"render: {st['rendered']} rendered, {st['cached']} from cache, {st['timeouts']} timeouts, "
+                f"{st['errors']} errors, {st['blocked']} requests blocked (pool {st['pool_size']})")
+
+_default = None
+
+def default(user_agent=None):
+    global _default
+    if _default is None:
+        _default = RenderPool(user_agent=user_agent)
+        metrics.track("render", _default.stats)
+    return _default
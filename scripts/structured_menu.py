@@ -0,0 +1,155 @@
+"""schema.org Menu/MenuItem extraction from JSON-LD and microdata.
+
+Restaurant CMSes (Squarespace, Wix, BentoBox, Popmenu, WordPress menu
+plugins, ...) often embed the menu as structured data. When they do, it has
+exact names, prices, descriptions and calories, so extract_menu_items tries
+this first and skips the heuristic line scan for the page.
+
+A regex sniff over the raw markup decides whether there is anything to read:
+JSON-LD blocks are cut out with a regex and json-decoded without building a
+DOM; only pages that declare a MenuItem itemtype are parsed with lxml for
+microdata. items() returns (rows, "jsonld" | "microdata") or ([], None), the
+latter also when a price's thousands/decimal marks are ambiguous ("1,250").
+"""
+import re, json, html as htmllib
+import lxml.html
+from line_scan import norm_name
+
+LD_RX = re.compile(r"<script[^>]*?type\s*=\s*[\"']?application/ld\+json[\"']?[^>]*>(.*?)</script\s*>", re.I | re.S)
+LD_SNIFF_RX = re.compile(r"ld\+json", re.I)   # cheap pre-check before LD_RX
+MICRODATA_RX = re.compile(r"itemtype\s*=\s*[\"']?https?://schema\.org/MenuItem", re.I)
+NUMBER_RX = re.compile(r"\d(?:[\d.,]|[ \u00a0\u202f](?=\d{3}))*")   # digits with any grouping/decimal marks
+KCAL_RX = re.compile(r"\d{2,4}")
+
+def _types(node):
+    t = node.get("@type")
+    return {x for x in (t if isinstance(t, list) else [t]) if isinstance(x, str)}   # malformed: dicts, numbers
+
+def _text(v):
+    if isinstance(v, list):
+        v = v[0] if v else None
+    if isinstance(v, dict):
+        v = v.get("name") or v.get("@value")
+    if v is None:
+        return None
+    return " ".join(htmllib.unescape(str(v)).split()) or None
+
+class Ambiguous(ValueError):
+    """A price like "1,250" or "1.250": thousands or decimals can't be told apart."""
+
+def _number(text):
+    """"9.50", "9,50", "1,250.00", "1.250,00", "1 250" → float; raises Ambiguous."""
+    t = "".join(text.split()).rstrip(".,")
+    marks = [c for c in t if c in ".,"]
+    if len(set(marks)) == 2:                        # both: the last one is the decimal mark
+        dec = marks[-1]
+        t = t.replace("," if dec == "." else ".", "").replace(dec, ".")
+    elif len(marks) > 1:                            # one mark, repeated: grouping
+        t = t.replace(marks[0], "")
+    elif marks:
+        frac = len(t) - t.index(marks[0]) - 1
+        if frac == 3:
+            raise Ambiguous(text)
+        t = t.replace(",", ".")
+    return float(t)
+
+def _price(v):
+    """First number in a price value ("$9.50", "9,50", "1,250.00", 9.5, ["12", "16"])."""
+    if isinstance(v, list):
+        v = v[0] if v else None
+    if isinstance(v, (int, float)):
+        return float(v) if v > 0 else None
+    m = NUMBER_RX.search(str(v or ""))
+    if not m:
+        return None
+    p = _number(m.group())
+    return p if p > 0 else None
+
+def _offer_price(offers):
+    if isinstance(offers, list):
+        for o in offers:
+            p = _offer_price(o)
+            if p: return p
+        return None
+    if isinstance(offers, dict):
+        return _price(offers.get("price") if offers.get("price") not in (None, "") else offers.get("lowPrice"))
+    return _price(offers)
+
+def _calories(nutrition):
+    if isinstance(nutrition, dict):
+        nutrition = nutrition.get("calories")
+    text = _text(nutrition)
+    m = KCAL_RX.search(text or "")
+    return (int(m.group()), text) if m else (None, None)
+
+def _row(name, desc, price, nutrition, url):
+    name = norm_name(name)
+    if not name or not price:
+        return None
+    kcal, kcal_txt = _calories(nutrition)
+    return {"item_name": name, "item_desc": desc, "price": price,
+            "calories_kcal": kcal, "calories_text": kcal_txt, "source_url": url}
+
+def _walk(node, out, url):
+    if isinstance(node, list):
+        for n in node:
+            _walk(n, out, url)
+        return
+    if not isinstance(node, dict):
+        return
+    if "MenuItem" in _types(node):
+        row = _row(_text(node.get("name")), _text(node.get("description")),
+                   _offer_price(node.get("offers")), node.get("nutrition"), url)
+        if row:
+            out.append(row)
+    for k, v in node.items():   # Restaurant.hasMenu, Menu.hasMenuSection, @graph, ...
+        if isinstance(v, (dict, list)) and k not in ("offers", "nutrition"):
+            _walk(v, out, url)
+
+def jsonld_items(html, url):
+    out = []
+    for block in LD_RX.findall(html):
+        try:
+            data = json.loads(block.strip().strip(";"), strict=False)
+        except ValueError:
+            continue
+        _walk(data, out, url)
+    return out
+
+def _prop(el, name):
+    """Text of the first itemprop=name under el (content/value attribute first)."""
+    for p in el.iterdescendants():
+        if name in (p.get("itemprop") or "").split():
+            v = p.get("content") or p.get("value")
+            return v if v is not None else p.text_content()
+    return None
+
+def microdata_items(html, url):
+    try:
+        doc = lxml.html.document_fromstring(html)
+    except ValueError:
+        doc = lxml.html.document_fromstring(html.encode("utf-8"))
+    out = []
+    for el in doc.xpath("//*[@itemscope][contains(@itemtype, 'schema.org/MenuItem')]"):
+        row = _row(_text(_prop(el, "name")), _text(_prop(el, "description")),
+                   _price(_prop(el, "price") or _prop(el, "lowPrice")), _prop(el, "calories"), url)
+        if row:
+            out.append(row)
+    return out
+
+def items(html, url):
+    """(item rows, path) from structured data, or ([], None) when the page has none.
+
+    A page with an ambiguous price is left to the line scan rather than trusted."""
+    try:
+        if LD_SNIFF_RX.search(html):
+            rows = jsonld_items(html, url)
+            if rows:
+                return rows, "jsonld"
+        if MICRODATA_RX.search(html):
+            rows = microdata_items(html, url)
+            if rows:
+                return rows, "microdata"
+    except Ambiguous:
+        pass
+    return [], None
@@ -0,0 +1,154 @@
+"""Shared Supabase/PostgREST client for the pipeline scripts.
+
+One keep-alive requests.Session per process (pooled, gzip), retry with
+backoff on 429/5xx and connection errors, and paginated reads streamed as a
+generator so large tables never exceed PostgREST's max-rows or sit in memory:
+
+    for row in supa.client().select("restaurants", "id,website", website="not.is.null"):
+        ...
+
+Without an `order`, pages are fetched by keyset (`id=gt.<last>`); with one,
+by Range offsets.
+"""
+import os, time, random, requests
+import metrics
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv(".env")
+
+PAGE_SIZE = int(os.environ.get("SUPABASE_PAGE_SIZE", "1000"))   # <= PostgREST max-rows
+RETRIES = int(os.environ.get("SUPABASE_RETRIES", "5"))
+RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+
+def transient(status):
+    """True for a reject status that says the server failed, not the rows (None: transport error)."""
+    return status is None or status in RETRY_STATUS or status >= 500
+
+def in_list(values):
+    """PostgREST `in.(…)` filter value; each value is double-quoted so commas, dots and parens stay literal."""
+    return "in.(" + ",".join('"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"' for v in values) + ")"
+
+class Supa:
+    def __init__(self, url=None, key=None, pool=16, retries=RETRIES):
+        self.url = (url or os.environ["SUPABASE_URL"]).rstrip("/")
+        key = key or os.environ["SUPABASE_SERVICE_ROLE_KEY"]
+        self.rest = f"{self.url}/rest/v1"
+        self.retries = retries
+        self.session = requests.Session()
+        self.session.headers.update({
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Accept-Encoding": "gzip",
+        })
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.stats = {"requests": 0, "retries": 0}
+        metrics.track("supabase", self.stats)
+
+    def request(self, method, table, params=None, json=None, headers=None, timeout=60, data=None):
+        """Send with retry/backoff; returns the last response (callers check the status)."""
+        url = f"{self.rest}/{table}"
+        for attempt in range(self.retries + 1):
+            self.stats["requests"] += 1
+            t0 = time.perf_counter()
+            try:
+                resp = self.session.request(method, url, params=params, json=json, data=data,
+                                            headers=headers, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                metrics.inc("rest_errors", table=table, method=method)
+                if attempt == self.retries: raise
+                resp = None
+            else:
+                metrics.observe("rest_seconds", time.perf_counter() - t0, table=table, method=method)
+                metrics.inc("rest_bytes_out", len(data or b""), table=table)
+                metrics.inc("rest_bytes_in", len(resp.content), table=table)
+            if resp is not None and (resp.status_code not in RETRY_STATUS or attempt == self.retries):
+                return resp
+            self.stats["retries"] += 1
+            delay = min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random() / 2)
+            if resp is not None and resp.headers.get("retry-after", "").isdigit():
+                delay = max(delay, float(resp.headers["retry-after"]))
+            time.sleep(delay)
+
+    def select(self, table, columns="*", order=None, key="id", page_size=PAGE_SIZE, **filters):
+        """Stream rows matching PostgREST filters (e.g. website="not.is.null")."""
+        params = {"select": columns, **filters}
+        if order:
+            # offset pages via Range; fine for ordered exports
+            start = 0
+            while True:
+                resp = self.request("GET", table, params={**params, "order": order}, headers={
+                    "Range-Unit": "items", "Range": f"{start}-{start + page_size - 1}"})
+                resp.raise_for_status()
+                rows = resp.json()
+                yield from rows
+                if len(rows) < page_size: return
+                start += len(rows)
+        # keyset pages: constant cost per page no matter how deep we are
+        if columns != "*" and key not in columns.split(","):
+            params["select"] = f"{columns},{key}"
+        last = None
+        while True:
+            p = {**params, "order": f"{key}.asc", "limit": page_size}
+            if last is not None:
+                p[key] = f"gt.{last}"
+            resp = self.request("GET", table, params=p)
+            resp.raise_for_status()
+            rows = resp.json()
+            yield from rows
+            if len(rows) < page_size: return
+            last = rows[-1][key]
+
+    def count(self, table, **filters):
+        resp = self.request("GET", table, params={"select": "id", "limit": 1, **filters},
+                            headers={"Prefer": "count=exact"})
+        resp.raise_for_status()
+        total = resp.headers.get("content-range", "*/0").split("/")[-1]
+        return int(total) if total.isdigit() else None
+
+    def upsert(self, table, rows, on_conflict, timeout=120, returning="minimal", body=None):
+        """POST rows with merge-duplicates; pass `body` (JSON array bytes) to skip re-serializing."""
+        headers = {"Prefer": f"resolution=merge-duplicates,return={returning}"}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        return self.request("POST", table, params={"on_conflict": on_conflict}, json=None if body else rows,
+                            data=body, timeout=timeout, headers=headers)
+
+    def upsert_parts(self, table, parts, on_conflict, timeout=120):
+        """Upsert pre-serialized JSON rows; a batch rejected for its data is bisected down to the bad rows.
+
+        Returns (rows_ok, rejects, requests_made); rejects are (status, error, part).
+        A status of None or one in RETRY_STATUS means the server, not the rows, failed."""
+        try:
+            res = self.upsert(table, None, on_conflict, timeout=timeout, body=b"[" + b",".join(parts) + b"]")
+        except requests.RequestException as e:
+            # retries are exhausted: bisecting would only multiply requests to a dead endpoint
+            return 0, [(None, repr(e)[:300], p) for p in parts], 1
+        if res.status_code in (200, 201, 204):
+            return len(parts), [], 1
+        if transient(res.status_code):
+            # still failing after retries: same as a transport error, the whole batch is rejected
+            return 0, [(res.status_code, res.text[:300], p) for p in parts], 1
+        if len(parts) == 1:
+            return 0, [(res.status_code, res.text[:300], parts[0])], 1
+        mid = len(parts) // 2
+        ok_a, rej_a, n_a = self.upsert_parts(table, parts[:mid], on_conflict, timeout)
+        ok_b, rej_b, n_b = self.upsert_parts(table, parts[mid:], on_conflict, timeout)
+        return ok_a + ok_b, rej_a + rej_b, 1 + n_a + n_b
+
+    def patch(self, table, body, timeout=60, **filters):
+        return self.request("PATCH", table, params=filters, json=body, timeout=timeout,
+                            headers={"Prefer": "return=minimal"})
+
+    def delete(self, table, timeout=60, **filters):
+        return self.request("DELETE", table, params=filters, timeout=timeout, headers={"Prefer": "return=minimal"})
+
+_client = None
+
+def client():
+    global _client
+    if _client is None:
+        _client = Supa()
+    return _client
@@ -1,88 +1,212 @@
-import os, json, requests, tldextract
-from urllib.parse import urlparse
-from dotenv import load_dotenv
-
-load_dotenv(".env")
-URL = os.environ["SUPABASE_URL"].rstrip("/")
-KEY = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
-HDR = {
-  "apikey": KEY,
-  "Authorization": f"Bearer {KEY}",
-  "Content-Type": "application/json",
-  "Prefer": "resolution=merge-duplicates"
-}
+import os, json, time
+from urllib.parse import quote_plus, urlencode
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import supa, domains, metrics, columnar, dedup
 
 IN = "data/menu_items.jsonl"
-BATCH = 500
+DELTA = "data/menu_items_delta.jsonl"        # extract_menu_items' add/remove ops; removed once applied
+REJECTS = "data/menu_items_rejected.jsonl"   # rows the server refused even on their own
+CONFLICT = "restaurant_id,item_name,price,source_url"
+COLUMNS = ["item_name", "item_desc", "price", "source_url", "calories_kcal", "calories_text"]
 
-def registrable(host:str)->str:
-    ex=tldextract.extract(host or "")
-    return ".".join([p for p in [ex.domain, ex.suffix] if p])
+# Batches are packed across hosts and bounded by serialized size, not per host
+MAX_BYTES = int(os.environ.get("UPSERT_MAX_BYTES", str(512 * 1024)))
+MAX_ROWS  = int(os.environ.get("UPSERT_MAX_ROWS", "2000"))
+IN_FLIGHT = int(os.environ.get("UPSERT_IN_FLIGHT", "4"))
+MAX_URL   = int(os.environ.get("UPSERT_MAX_URL", "6000"))   # DELETE filters stay under common 8 KB proxy URL limits
+# Incremental by default: only hosts the delta touches are re-sent (all their kept items, so dedup
+# decides exactly as in a full run) and removed items are deleted. UPSERT_FULL=1 re-sends every host.
+FULL = os.environ.get("UPSERT_FULL") == "1"
 
-def host_of(u:str)->str:
-    try: return urlparse(u).netloc
-    except: return ""
+def to_row(rid, it):
+    return {
+        "restaurant_id": rid,
+        "item_name": it.get("item_name"),
+        "item_desc": it.get("item_desc"),
+        "price": it.get("price"),
+        "currency": "USD",
+        "category": None,
+        "source_url": it.get("source_url"),
+        "calories_kcal": it.get("calories_kcal"),
+        "calories_text": it.get("calories_text"),
+    }
 
-def main():
-    if not os.path.exists(IN):
-        print("Missing data/menu_items.jsonl. Run extract_menu_items.py first.")
-        return
+def packed_batches(rows, counts):
+    """Group serialized rows into batches of <= MAX_BYTES / MAX_ROWS.
 
-    # host -> [rows]
-    by_host={}
-    with open(IN) as f:
+    A conflict key may appear only once per batch (PostgREST rejects a batch
+    that would update the same row twice); later repeats are dropped."""
+    parts=[]; keys=set(); size=2
+    for row in rows:
+        key=(row["restaurant_id"], row["item_name"], row["price"], row["source_url"])
+        if key in keys:
+            counts["dups"]+=1
+            continue
+        b=json.dumps(row, separators=(",", ":")).encode()
+        if parts and (size + len(b) + 1 > MAX_BYTES or len(parts) >= MAX_ROWS):
+            yield parts
+            parts=[]; keys=set(); size=2
+        parts.append(b); keys.add(key); size += len(b) + 1
+    if parts:
+        yield parts
+
+def read_delta():
+    """(hosts touched, removed (item_name, price, source_url) keys) with the last op per key winning."""
+    last = {}
+    with open(DELTA) as f:
         for line in f:
-            j=json.loads(line)
-            host = registrable(host_of(j["source_url"]))
-            by_host.setdefault(host,[]).append(j)
-
-    # fetch restaurants with website to map host -> ids
-    ids_by_host={}
-    r=requests.get(f"{URL}/rest/v1/restaurants",
-                   headers=HDR,
-                   params={"select":"id,website","website":"not.is.null"},
-                   timeout=120)
-    r.raise_for_status()
-    for row in r.json():
-        h=registrable(host_of(row.get("website","")))
-        if h: ids_by_host.setdefault(h,[]).append(row["id"])
-
-    total=0; inserted=0
-    for host, items in by_host.items():
-        ids=ids_by_host.get(host,[])
-        if not ids: 
+            try: op = json.loads(line)
+            except ValueError: continue   # a torn last line from an interrupted extract
+            last[(op.get("item_name"), op.get("price"), op.get("source_url"))] = op["op"]
+    hosts = {domains.site_key(url or "") for _, _, url in last}
+    return hosts, [k for k, op in last.items() if op == "remove"]
+
+def delete_batches(removed, present, ids_by_host, room):
+    """(restaurant ids, source_url, names | None, removed keys) per DELETE, grouped by page.
+
+    A page with no items left in the snapshot (`present`: source_urls that still have items) is one
+    whole-page DELETE (names None); otherwise its removed names go out as `item_name=in.(…)` chunks
+    that fit in `room` characters once URL-encoded."""
+    by_url = {}
+    for name, _price, url in removed:
+        names = by_url.setdefault(url, {})
+        names[name] = names.get(name, 0) + 1
+    for url, names in by_url.items():
+        rids = ids_by_host.get(domains.site_key(url or ""))
+        if not rids:
+            continue
+        if url not in present:
+            yield rids, url, None, sum(names.values())
             continue
-        # assign each item to all matching restaurants on that host (usually 1)
-        rows=[]
-        for rid in ids:
-            for it in items:
-                rows.append({
-                    "restaurant_id": rid,
-                    "item_name": it.get("item_name"),
-                    "item_desc": it.get("item_desc"),
-                    "price": it.get("price"),
-                    "currency": "USD",
-                    "category": None,
-                    "source_url": it.get("source_url"),
-                    "calories_kcal": it.get("calories_kcal"),
-                    "calories_text": it.get("calories_text"),
-                    
-                })
-        # send in batches (uses unique constraint to drop dupes)
-        for i in range(0, len(rows), BATCH):
-            chunk = rows[i:i+BATCH]
-            res=requests.post(
-                f"{URL}/rest/v1/menu_items_v2?on_conflict=restaurant_id,item_name,price,source_url",
-                headers=HDR,
-                json=chunk,
-                timeout=120
-            )
-            if res.status_code not in (200,201,204):
-                print("Insert error", host, res.status_code, res.text[:200])
+        fixed = len(urlencode({"restaurant_id": f"in.({','.join(map(str, rids))})", "source_url": f"eq.{url}",
+                               "item_name": "in.()"})) + 2   # the "&"s
+        chunk = []; n = 0; size = fixed
+        for name, keys in names.items():
+            if name is None:   # never stored: item_name is part of the conflict key
                 continue
-            inserted += len(chunk)
-        total += len(rows)
-    print(f"Prepared {total} rows | attempted insert {inserted} (duplicates are ignored by on_conflict)")
+            cost = len(quote_plus(supa.in_list([name])[4:-1])) + 3   # the quoted name plus its "%2C"
+            if chunk and size + cost > room:
+                yield rids, url, chunk, n
+                chunk = []; n = 0; size = fixed
+            chunk.append(name); n += keys; size += cost
+        if chunk:
+            yield rids, url, chunk, n
+
+def delete_rows(db, rids, url, names):
+    """DELETE a page's rows (names None) or its rows with these names; returns the reject status
+    (None: ok, 0: transport error)."""
+    filters = {"restaurant_id": f"in.({','.join(map(str, rids))})", "source_url": f"eq.{url}"}
+    if names is not None:
+        filters["item_name"] = supa.in_list(names)
+    what = "page" if names is None else f"{len(names)} names"
+    try:
+        with metrics.timer("delete_batch"):
+            resp = db.delete("menu_items_v2", **filters)
+    except Exception as e:
+        print(f"DELETE error {url} ({what}): {e!r}")
+        return 0
+    if resp.status_code not in (200, 204):
+        print(f"DELETE failed {url} ({what}): {resp.status_code} {resp.text[:160]}")
+        return resp.status_code
+    return None
+
+def send_batch(db, parts):
+    """POST a batch; a rejected batch is bisected until the bad rows are isolated."""
+    with metrics.timer("upsert_batch"):
+        ok, rejects, n = db.upsert_parts("menu_items_v2", parts, CONFLICT)
+    metrics.inc("rows_upserted", ok)
+    metrics.inc("rows_rejected", len(rejects))
+    return ok, n, [{"status": st, "error": err, "row": json.loads(p)} for st, err, p in rejects]
+
+def main():
+    metrics.start("upsert_menu_items")
+    if not columnar.exists(IN):
+        print("Missing data/menu_items.jsonl (or .parquet). Run extract_menu_items.py first.")
+        return
+
+    # host -> restaurant ids (the only thing held in memory); reused from disk if restaurants is unchanged
+    db=supa.Supa(pool=IN_FLIGHT)
+    with metrics.timer("restaurant_index"):
+        ids_by_host=domains.restaurant_index(db)
+
+    if os.path.exists(DELTA):
+        touched, removed = read_delta()
+    elif FULL:
+        touched, removed = None, []
+    else:
+        print(f"No changes to apply ({DELTA} is absent: nothing extracted since the last upsert). "
+              "UPSERT_FULL=1 re-sends the whole snapshot.")
+        return
+    if FULL:
+        touched = None
+    print(f"Upserting {'all hosts' if touched is None else f'{len(touched)} changed hosts'}, "
+          f"deleting {len(removed)} removed items …")
+
+    counts={"items":0, "rows":0, "dups":0}
+    dd=dedup.Dedup(expected=columnar.count(IN) if dedup.INDEX == "bloom" else 0)
+    metrics.track("dedup", dd.stats)
+    def items():
+        for it in columnar.rows(IN, COLUMNS):
+            if touched is None or domains.site_key(it["source_url"]) in touched:
+                yield it
+    def rows():
+        # stream items (Parquet when present: only these columns are decoded), drop mirror pages and
+        # near-duplicate items per host, then assign each to all matching restaurants on that host (usually 1)
+        for it in dd.filter(items()):
+            counts["items"]+=1
+            for rid in ids_by_host.get(domains.site_key(it["source_url"]), ()):
+                counts["rows"]+=1
+                yield to_row(rid, it)
+
+    sent=0; batches=0; reqs=0; rejected=0; unsent=0
+    t0=time.perf_counter()
+    with ThreadPoolExecutor(IN_FLIGHT) as ex, open(REJECTS, "w") as rej_f:
+        # removed items first, one DELETE per page (or per chunk of its names) across every restaurant
+        # on the host. A name-level delete also drops a kept row with the same name at another price;
+        # the upserts below re-send every kept item of the host and put it back.
+        pages={url for _, _, url in removed}
+        present=set()
+        if pages:
+            present={it["source_url"] for it in columnar.rows(IN, ["source_url"]) if it["source_url"] in pages}
+        dels=list(delete_batches(removed, present, ids_by_host, MAX_URL - len(f"{db.rest}/menu_items_v2?")))
+        statuses=list(ex.map(lambda d: delete_rows(db, *d[:3]), dels))
+        deleted=sum(d[3] for d, st in zip(dels, statuses) if st is None)
+        undeleted=sum(d[3] for d, st in zip(dels, statuses) if st is not None and (st == 0 or supa.transient(st)))
+        metrics.inc("rows_deleted", deleted)
+
+        inflight=set()
+        def collect(done):
+            nonlocal sent, reqs, rejected, unsent
+            for fut in done:
+                ok, n, rejects = fut.result()
+                sent += ok; reqs += n; rejected += len(rejects)
+                unsent += sum(supa.transient(r["status"]) for r in rejects)
+                for r in rejects:
+                    rej_f.write(json.dumps(r)+"\n")
+        for parts in packed_batches(rows(), counts):
+            if len(inflight) >= IN_FLIGHT:
+                done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                collect(done)
+            inflight.add(ex.submit(send_batch, db, parts))
+            batches+=1
+            if batches%50==0:
+                print(f"{batches} batches queued, {sent} rows upserted…")
+        done, _ = wait(inflight)
+        collect(done)
+    wall=time.perf_counter()-t0
+    print(f"Read {dd.stats['items_in']} items from {columnar.source(IN)}, {counts['items']} after dedup → "
+          f"{counts['rows']} rows ({counts['dups']} in-batch duplicates) | "
+          f"upserted {sent} in {batches} batches ({reqs} requests, {db.stats['retries']} retries) | "
+          f"{sent/max(wall, 1e-9):.0f} rows/s")
+    print(f"Deleted {deleted}/{sum(d[3] for d in dels)} removed items in {len(dels)} requests "
+          f"({sum(d[2] is None for d in dels)} whole pages)")
+    print(dd.summary())
+    if rejected:
+        print(f"{rejected} rows rejected by the server → {REJECTS}")
+    if unsent or undeleted:
+        print(f"{unsent} rows and {undeleted} deletes failed on the server side; {DELTA} is kept for the next run")
+    elif os.path.exists(DELTA):
+        os.remove(DELTA)   # applied; extract_menu_items starts a new one
 
 if __name__=="__main__":
     main()
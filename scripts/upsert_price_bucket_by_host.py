@@ -1,82 +1,96 @@
-import os, json, requests, tldextract
-from urllib.parse import urlparse
-from dotenv import load_dotenv
+import os, time, requests
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+import supa, domains, metrics, columnar, price_stats
 
-load_dotenv(".env")
-URL = os.environ["SUPABASE_URL"].rstrip("/")
-KEY = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
-HDR = {"apikey": KEY, "Authorization": f"Bearer {KEY}", "Content-Type": "application/json"}
+# Bulk PATCH: one request per (bucket, chunk of ids) instead of one per id
+MODE     = os.environ.get("PATCH_MODE", "bulk")           # "bulk" | "single" (one id per request)
+MAX_URL  = int(os.environ.get("PATCH_MAX_URL", "6000"))   # stay under common 8 KB proxy URL limits
+WORKERS  = int(os.environ.get("PATCH_WORKERS", "8"))      # requests in flight
+VERBOSE  = os.environ.get("PATCH_VERBOSE") == "1"
 
-IN = "data/menu_prices.jsonl"
+EMPTY = len("id=in.%28%29")   # requests percent-encodes "(", ")" and ","
 
-def registrable(host: str) -> str:
-    ex = tldextract.extract(host or "")
-    return ".".join([p for p in [ex.domain, ex.suffix] if p])
+def id_chunks(ids, room):
+    """Split ids so each `id=in.(…)` filter fits in `room` characters once URL-encoded."""
+    chunk=[]; size=EMPTY
+    for rid in ids:
+        rid=str(rid)
+        n=len(quote(rid, safe="")) + 3   # the id plus its "%2C"
+        if chunk and (MODE == "single" or size + n > room):
+            yield chunk
+            chunk=[]; size=EMPTY
+        chunk.append(rid); size += n
+    if chunk:
+        yield chunk
 
-def host_of(url: str) -> str:
+def patch_batch(db, bucket, ids):
+    """PATCH one chunk (the client retries 429/5xx); returns (ok, n_ids, seconds)."""
+    t0=time.perf_counter()
     try:
-        return urlparse(url).netloc
-    except Exception:
-        return ""
+        resp=db.patch("restaurants", {"price_bucket": bucket}, id=f"in.({','.join(ids)})")
+    except requests.RequestException as e:
+        print(f"PATCH error bucket={bucket} ids={len(ids)} {e!r}")
+        return False, len(ids), time.perf_counter() - t0
+    if resp.status_code not in (200, 204):
+        print(f"PATCH failed bucket={bucket} ids={len(ids)} {resp.status_code} {resp.text[:160]}")
+        return False, len(ids), time.perf_counter() - t0
+    return True, len(ids), time.perf_counter() - t0
+
+def pct(xs, q):
+    return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else 0.0
 
 def main():
-    if not os.path.exists(IN):
-        print("Missing data/menu_prices.jsonl — run import_menu_prices.py first.")
+    metrics.start("upsert_price_bucket_by_host")
+    if not columnar.exists(price_stats.ITEMS_IN):
+        print("Missing data/menu_items.jsonl (or .parquet) — run extract_menu_items.py first.")
         return
 
-    # 1) Build host -> bucket (majority vote if multiple)
-    agg = {}
-    with open(IN) as f:
-        for line in f:
-            j = json.loads(line)
-            host = registrable(host_of(j.get("menu_url", "")))
-            b = j.get("price_bucket")
-            if not host or not b: 
-                continue
-            agg.setdefault(host, {}).setdefault(b, 0)
-            agg[host][b] += 1
-
-    host_bucket = {h: max(counts.items(), key=lambda kv: kv[1])[0] for h, counts in agg.items()}
+    # 1) host -> bucket from the pooled, outlier-filtered item prices of each host
+    with metrics.timer("host_buckets"):
+        host_bucket = price_stats.host_buckets()
     if not host_bucket:
-        print("No buckets to upsert (menu_prices.jsonl empty or invalid).")
+        print("No buckets to upsert (no plausible item prices).")
         return
     print(f"Hosts with buckets: {len(host_bucket)}")
 
-    # 2) Fetch restaurant ids + website hosts
-    ids_by_host = {}
-    r = requests.get(
-        f"{URL}/rest/v1/restaurants",
-        headers=HDR,
-        params={"select": "id,website", "website": "not.is.null"},
-        timeout=90
-    )
-    r.raise_for_status()
-    for row in r.json():
-        host = registrable(host_of(row.get("website","")))
-        if host:
-            ids_by_host.setdefault(host, []).append(row["id"])
+    # 2) Restaurant ids by website host (cached index, rebuilt when restaurants changes)
+    db = supa.Supa(pool=WORKERS)
+    with metrics.timer("restaurant_index"):
+        ids_by_host = domains.restaurant_index(db)
 
-    # 3) PATCH rows by id (no insert possible)
-    total = 0
-    touched = 0
+    # 3) PATCH grouped by bucket: id=in.(…) chunks, pooled session, bounded parallelism
+    ids_by_bucket = {}
     for host, bucket in host_bucket.items():
-        ids = ids_by_host.get(host, [])
-        if not ids:
-            continue
-        for rid in ids:
-            total += 1
-            resp = requests.patch(
-                f"{URL}/rest/v1/restaurants?id=eq.{rid}",
-                headers=HDR,
-                json={"price_bucket": bucket},
-                timeout=30
-            )
-            if resp.status_code in (200, 204):
-                touched += 1
-            else:
-                # noisy but useful for now
-                print(f"PATCH failed id={rid} host={host} {resp.status_code} {resp.text[:160]}")
-    print(f"Updated {touched}/{total} rows via PATCH")
+        ids_by_bucket.setdefault(bucket, []).extend(ids_by_host.get(host, []))
+    room = MAX_URL - len(f"{db.rest}/restaurants?")
+    batches = [(b, chunk) for b, ids in ids_by_bucket.items() for chunk in id_chunks(ids, room)]
+    total = sum(len(c) for _, c in batches)
+    if not batches:
+        print("No restaurants matched the bucketed hosts.")
+        return
+    print(f"Patching {total} rows in {len(batches)} batches ({MODE}, {WORKERS} in flight) …")
+
+    touched = 0; failed = 0; lat = []
+    retries0 = db.stats["retries"]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(WORKERS) as ex:
+        futs = [ex.submit(patch_batch, db, b, chunk) for b, chunk in batches]
+        for (b, _), fut in zip(batches, futs):
+            ok, n, secs = fut.result()
+            lat.append(secs)
+            metrics.observe("stage_seconds", secs, stage="patch_batch")
+            metrics.inc("rows_patched" if ok else "rows_failed", n)
+            if ok: touched += n
+            else: failed += 1
+            if VERBOSE:
+                print(f"batch bucket={b} ids={n} {'ok' if ok else 'FAILED'} {secs*1000:.0f} ms")
+    retries = db.stats["retries"] - retries0
+    wall = time.perf_counter() - t0
+    lat.sort()
+    print(f"Updated {touched}/{total} rows via {len(batches)} PATCH batches ({failed} failed, {retries} retries)")
+    print(f"batch latency p50={pct(lat, .5)*1000:.0f} ms p95={pct(lat, .95)*1000:.0f} ms max={lat[-1]*1000:.0f} ms | "
+          f"{total/wall:.0f} rows/s, {len(batches)/wall:.1f} batches/s over {wall:.1f}s")
 
 if __name__ == "__main__":
     main()